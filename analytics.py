@@ -1,8 +1,21 @@
 from nose.tools import set_trace
 import importlib
+import atexit
 import contextlib
 import datetime
+import errno
+import json
+import logging
+import os
+import Queue
+import time
+import uuid
 from collections import defaultdict
+from threading import (
+    Event,
+    Lock,
+    Thread,
+)
 from model import ExternalIntegration
 from config import CannotLoadConfiguration
 
@@ -42,3 +55,311 @@ class Analytics(object):
             providers.extend(self.library_providers[library.id])
         for provider in providers:
             provider.collect_event(library, license_pool, event_type, time, **kwargs)
+
+
+class EventBuffer(object):
+    """Hold analytics events and write them to the database in
+    batches, from a background thread, instead of writing each one
+    as it happens.
+
+    By default events are kept in memory, and any events that can't
+    be written are lost. If a spool directory is given, events are
+    appended to a file in that directory instead, and a file is only
+    removed once all of its events have been written. Leftover files
+    from a process that died are picked up by the next flush.
+
+    The buffer has a maximum size. If it fills up because events
+    can't be written quickly enough, add() returns False and the
+    caller should write the event itself.
+    """
+
+    BATCH_SIZE = 500
+    MAX_SIZE = 10000
+
+    # The background thread writes a batch at least this often, in
+    # seconds, even if it isn't full.
+    FLUSH_INTERVAL = 5
+
+    # How long, in seconds, add() will wait for room in a full buffer.
+    BLOCK_TIMEOUT = 1
+
+    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+    DATE_KEYS = ['start', 'end']
+
+    SPOOL_EXTENSION = ".spool"
+    BATCH_EXTENSION = ".batch"
+    CLAIMED_EXTENSION = ".claimed"
+
+    log = logging.getLogger("Analytics event buffer")
+
+    def __init__(self, write_batch, max_size=None, batch_size=None,
+                 flush_interval=None, spool_directory=None):
+        """Constructor.
+
+        :param write_batch: A function that takes a list of events,
+            writes them to the database and commits. It's called
+            from the background thread, so it must use its own
+            database session.
+
+        :param spool_directory: If this is provided, events will
+            be kept in files in this directory rather than in memory.
+        """
+        self.write_batch = write_batch
+        self.max_size = max_size or self.MAX_SIZE
+        self.batch_size = batch_size or self.BATCH_SIZE
+        if flush_interval is None:
+            flush_interval = self.FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self.queue = Queue.Queue(self.max_size)
+
+        self.spool_directory = spool_directory
+        self.spool_lock = Lock()
+        self.spool_file = None
+        self.pending = 0
+        if spool_directory and not os.path.exists(spool_directory):
+            os.makedirs(spool_directory)
+
+        self.stopped = Event()
+        self.thread = None
+
+    @property
+    def spool_path(self):
+        return os.path.join(
+            self.spool_directory, "%d%s" % (os.getpid(), self.SPOOL_EXTENSION)
+        )
+
+    def start(self):
+        """Start writing events in the background.
+
+        Whatever is left in the buffer when the process exits will be
+        written then.
+        """
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, name="Analytics event buffer")
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread and write any remaining events."""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        try:
+            self.flush()
+        except Exception, e:
+            self.log.error("Could not write buffered events.", exc_info=e)
+
+    def add(self, event):
+        """Add an event to the buffer.
+
+        :param event: A dictionary suitable for passing to write_batch.
+        :return: True if the event was buffered, False if the buffer is
+            full and the event must be written some other way.
+        """
+        if self.spool_directory:
+            return self._spool(event)
+        try:
+            self.queue.put(event, timeout=self.BLOCK_TIMEOUT)
+            return True
+        except Queue.Full:
+            self.log.warn(
+                "Event buffer is full; writing event synchronously."
+            )
+            return False
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                if self.spool_directory:
+                    self.stopped.wait(self.flush_interval)
+                    self.flush_spool()
+                else:
+                    batch = self._take_batch(self.flush_interval)
+                    if batch:
+                        self._write_from_memory(batch)
+            except Exception, e:
+                self.log.error("Could not write buffered events.", exc_info=e)
+
+    def flush(self):
+        """Write every buffered event right away.
+
+        :return: The number of events written.
+        """
+        if self.spool_directory:
+            return self.flush_spool()
+        count = 0
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                break
+            count += self._write_from_memory(batch)
+        return count
+
+    def _take_batch(self, timeout):
+        """Take up to batch_size events from the in-memory queue,
+        waiting no more than `timeout` seconds for them to show up.
+        """
+        batch = []
+        deadline = time.time() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0 and not self.stopped.is_set():
+                    # Check for a stop every so often.
+                    batch.append(self.queue.get(
+                        timeout=min(remaining, self.BLOCK_TIMEOUT)
+                    ))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except Queue.Empty:
+                if remaining <= 0 or self.stopped.is_set():
+                    break
+        return batch
+
+    def _write_from_memory(self, batch):
+        try:
+            self.write_batch(batch)
+        except Exception, e:
+            self.log.error(
+                "Could not write %d buffered events; they are lost.",
+                len(batch), exc_info=e
+            )
+            return 0
+        return len(batch)
+
+    # Spool files.
+
+    def _spool(self, event):
+        line = json.dumps(self._serialize(event)) + "\n"
+        with self.spool_lock:
+            if self.pending >= self.max_size:
+                self.log.warn(
+                    "Event spool is full; writing event synchronously."
+                )
+                return False
+            if not self.spool_file:
+                self.spool_file = open(self.spool_path, 'a')
+            self.spool_file.write(line)
+            self.spool_file.flush()
+            self.pending += 1
+        return True
+
+    def _rotate(self):
+        """Close the current spool file and turn it into a batch file,
+        so events can keep being spooled while it's written.
+        """
+        with self.spool_lock:
+            if self.spool_file:
+                self.spool_file.close()
+                self.spool_file = None
+            if os.path.exists(self.spool_path):
+                self._rename_to_batch(self.spool_path)
+
+    def _rename_to_batch(self, path):
+        batch_path = os.path.join(
+            self.spool_directory, "%d-%s%s" % (
+                os.getpid(), uuid.uuid4().hex, self.BATCH_EXTENSION
+            )
+        )
+        os.rename(path, batch_path)
+        return batch_path
+
+    def flush_spool(self):
+        """Write the events in every batch file in the spool directory,
+        including the current spool file.
+
+        :return: The number of events written.
+        """
+        self._rotate()
+        self._recover_abandoned_files()
+        count = 0
+        for filename in sorted(os.listdir(self.spool_directory)):
+            if filename.endswith(self.BATCH_EXTENSION):
+                count += self._write_batch_file(
+                    os.path.join(self.spool_directory, filename)
+                )
+        return count
+
+    def _write_batch_file(self, path):
+        # Claim the file so no other process will write it too.
+        claimed = "%s.%d%s" % (path, os.getpid(), self.CLAIMED_EXTENSION)
+        try:
+            os.rename(path, claimed)
+        except OSError, e:
+            if e.errno == errno.ENOENT:
+                # Another process got to it first.
+                return 0
+            raise
+
+        with open(claimed) as fh:
+            events = [self._deserialize(json.loads(line))
+                      for line in fh if line.strip()]
+        try:
+            for i in range(0, len(events), self.batch_size):
+                self.write_batch(events[i:i+self.batch_size])
+        except Exception, e:
+            # Leave the file to be tried again. Any events that were
+            # already written won't be written twice.
+            os.rename(claimed, path)
+            self.log.error(
+                "Could not write events from %s; will try again.", path,
+                exc_info=e
+            )
+            return 0
+        os.remove(claimed)
+        with self.spool_lock:
+            self.pending = max(self.pending - len(events), 0)
+        return len(events)
+
+    def _recover_abandoned_files(self):
+        """Turn the spool files and claimed batch files of processes
+        that are no longer running back into batch files.
+        """
+        for filename in os.listdir(self.spool_directory):
+            if filename.endswith(self.SPOOL_EXTENSION):
+                pid = filename[:-len(self.SPOOL_EXTENSION)]
+            elif filename.endswith(self.CLAIMED_EXTENSION):
+                pid = filename[:-len(self.CLAIMED_EXTENSION)].rsplit('.', 1)[-1]
+            else:
+                continue
+            try:
+                pid = int(pid)
+            except ValueError:
+                continue
+            if pid == os.getpid() or self._is_running(pid):
+                continue
+            path = os.path.join(self.spool_directory, filename)
+            try:
+                self._rename_to_batch(path)
+            except OSError, e:
+                # Another process recovered it first.
+                pass
+
+    @classmethod
+    def _is_running(cls, pid):
+        try:
+            os.kill(pid, 0)
+        except OSError, e:
+            return e.errno == errno.EPERM
+        return True
+
+    @classmethod
+    def _serialize(cls, event):
+        event = dict(event)
+        for key in cls.DATE_KEYS:
+            if event.get(key):
+                event[key] = event[key].strftime(cls.DATE_FORMAT)
+        return event
+
+    @classmethod
+    def _deserialize(cls, event):
+        for key in cls.DATE_KEYS:
+            if event.get(key):
+                event[key] = datetime.datetime.strptime(
+                    event[key], cls.DATE_FORMAT
+                )
+        return event
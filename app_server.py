@@ -10,7 +10,10 @@ from lxml import etree
 from functools import wraps
 from flask import url_for, make_response
 from flask_babel import lazy_gettext as _
+from util import metrics
+from util.read_replica import read_replica
 from util.flask_util import problem
+from util.query_profiler import QueryProfiler
 from util.problem_detail import ProblemDetail
 import traceback
 import logging
@@ -23,6 +26,7 @@ from util.opds_writer import (
     OPDSFeed,
     OPDSMessage,
 )
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import (
     NoResultFound,
@@ -30,7 +34,9 @@ from sqlalchemy.orm.exc import (
 from model import (
     get_one,
     Complaint,
+    ConfigurationSetting,
     Identifier,
+    LicensePool,
     Patron,
 )
 from cdn import cdnify
@@ -228,6 +234,67 @@ class HeartbeatController(object):
         return make_response(data, 200, {"Content-Type": self.HEALTH_CHECK_TYPE})
 
 
+class RequestQueryProfiler(object):
+    """Profile the database queries run while a Flask app handles each
+    request, if the sitewide SQL_PROFILER setting says to.
+    """
+
+    log = logging.getLogger("SQL profiler")
+
+    def __init__(self, app, _db):
+        self.app = app
+        self._db = _db
+        self.profiler = QueryProfiler.for_bind(_db.get_bind())
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.teardown)
+
+    @property
+    def mode(self):
+        return ConfigurationSetting.sitewide(
+            self._db, Configuration.SQL_PROFILER, snapshot=True
+        ).value
+
+    def start(self):
+        if self.mode:
+            flask.g.query_profile = self.profiler.start()
+
+    def finish(self, response):
+        profile = getattr(flask.g, 'query_profile', None)
+        if not profile:
+            return response
+        self.profiler.stop(profile)
+        flask.g.query_profile = None
+
+        if self.mode == Configuration.SQL_PROFILER_HEADERS:
+            for header, value in profile.headers.items():
+                response.headers[header] = value
+        else:
+            self.log.info(profile.report(flask.request.path))
+        return response
+
+    def teardown(self, exception=None):
+        # If the request failed, finish() was never called.
+        profile = getattr(flask.g, 'query_profile', None)
+        if profile:
+            self.profiler.stop(profile)
+
+
+class MetricsController(object):
+    """Export this process's timers, counters and histograms in the
+    Prometheus text format.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or metrics.registry
+
+    def metrics(self):
+        return make_response(
+            self.registry.prometheus_text(), 200,
+            {"Content-Type": self.registry.PROMETHEUS_CONTENT_TYPE}
+        )
+
+
 class URNLookupController(object):
     """A generic controller that takes URNs as input and looks up their
     OPDS entries.
@@ -255,10 +322,13 @@ class URNLookupController(object):
             # In a subclass, self.process_urns may return a ProblemDetail
             return response
 
-        opds_feed = LookupAcquisitionFeed(
-            self._db, "Lookup results", this_url, self.works, annotator,
-            precomposed_entries=self.precomposed_entries,
-        )
+        # Building the feed mostly means reading what's already known
+        # about the works, which can be done from a read replica.
+        with read_replica(self._db):
+            opds_feed = LookupAcquisitionFeed(
+                self._db, "Lookup results", this_url, self.works, annotator,
+                precomposed_entries=self.precomposed_entries,
+            )
         return feed_response(opds_feed)
 
     def permalink(self, urn, annotator, route_name='work'):
@@ -271,10 +341,11 @@ class URNLookupController(object):
         # work) tuples, but an AcquisitionFeed's .works is just a
         # list of works.
         works = [work for (identifier, work) in self.works]
-        opds_feed = AcquisitionFeed(
-            self._db, urn, this_url, works, annotator,
-            precomposed_entries=self.precomposed_entries
-        )
+        with read_replica(self._db):
+            opds_feed = AcquisitionFeed(
+                self._db, urn, this_url, works, annotator,
+                precomposed_entries=self.precomposed_entries
+            )
 
         return feed_response(opds_feed)
 
@@ -286,10 +357,29 @@ class URNLookupController(object):
         """
         identifiers_by_urn, failures = Identifier.parse_urns(self._db, urns)
         self.add_urn_failure_messages(failures)
+        self.load_works_and_editions(identifiers_by_urn.values())
 
         for urn, identifier in identifiers_by_urn.items():
             self.process_identifier(identifier, urn, **process_urn_kwargs)
 
+    def load_works_and_editions(self, identifiers):
+        """Load the Work and presentation Edition of every LicensePool
+        for `identifiers` in a single query, rather than one at a time
+        while each Identifier is processed.
+        """
+        pool_ids = [
+            pool.id for identifier in identifiers
+            for pool in identifier.licensed_through
+        ]
+        if not pool_ids:
+            return
+        self._db.query(LicensePool).filter(
+            LicensePool.id.in_(pool_ids)
+        ).options(
+            joinedload(LicensePool.work),
+            joinedload(LicensePool.presentation_edition),
+        ).all()
+
     def add_urn_failure_messages(self, failures):
         for urn in failures:
             self.add_message(urn, 400, INVALID_URN.detail)
@@ -0,0 +1,195 @@
+from nose.tools import set_trace
+import hashlib
+import logging
+import os
+import tempfile
+
+from config import (
+    CannotLoadConfiguration,
+    Configuration,
+)
+from mirror import MirrorUploader
+
+
+class BlobStore(object):
+    """Keeps large documents, such as the content of Representations,
+    outside of the database.
+
+    Each document is addressed by the SHA-256 hash of its content, so
+    storing the same document twice takes up no extra space.
+    """
+
+    # If this is set, Representation content is kept in this
+    # BlobStore instead of in the database.
+    instance = None
+
+    # Documents are read in chunks of this many bytes.
+    CHUNK_SIZE = 64 * 1024
+
+    log = logging.getLogger("Blob store")
+
+    @classmethod
+    def from_configuration(cls, _db):
+        """Find the BlobStore configured for this site.
+
+        A sitewide S3 storage integration with a blob store bucket
+        takes precedence over a local directory named in the
+        configuration file.
+
+        :return: A BlobStore, or None if no blob store is configured.
+        """
+        # Importing s3 registers S3Uploader with MirrorUploader.
+        import s3
+        try:
+            uploader = MirrorUploader.sitewide(_db)
+        except CannotLoadConfiguration, e:
+            uploader = None
+        if (isinstance(uploader, s3.S3Uploader)
+            and uploader.get_bucket(uploader.BLOB_STORE_BUCKET_KEY)):
+            return S3BlobStore(uploader)
+
+        directory = Configuration.get(Configuration.BLOB_STORE_DIRECTORY)
+        if directory:
+            return LocalBlobStore(directory)
+        return None
+
+    @classmethod
+    def initialize(cls, _db):
+        """Configure the BlobStore for this process.
+
+        :return: The BlobStore, or None if none is configured.
+        """
+        cls.instance = cls.from_configuration(_db)
+        return cls.instance
+
+    @classmethod
+    def key_for(cls, content):
+        """The key under which the given content would be stored."""
+        return unicode(hashlib.sha256(content).hexdigest())
+
+    @classmethod
+    def shard(cls, key):
+        """Split a key into path components, so that no single directory
+        (or S3 prefix) ends up holding every document.
+        """
+        return [key[0:2], key[2:4], key]
+
+    def put(self, content):
+        """Store a document.
+
+        :return: The key under which the document was stored.
+        """
+        key = self.key_for(content)
+        if not self.exists(key):
+            self._put(key, content)
+        return key
+
+    def read(self, key):
+        """Load an entire document into memory."""
+        fh = self.open(key)
+        try:
+            return fh.read()
+        finally:
+            fh.close()
+
+    def open(self, key):
+        """Return a filehandle from which the document can be read
+        a chunk at a time.
+        """
+        raise NotImplementedError()
+
+    def exists(self, key):
+        raise NotImplementedError()
+
+    def _put(self, key, content):
+        raise NotImplementedError()
+
+
+class LocalBlobStore(BlobStore):
+    """Keeps documents in a directory on local disk."""
+
+    # Documents are written by scripts but read by the web server,
+    # which may run as a different user.
+    FILE_MODE = 0644
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *self.shard(key))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def _put(self, key, content):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError, e:
+                # Another process created the directory first.
+                if not os.path.isdir(directory):
+                    raise
+
+        # Write to a temporary file and move it into place, so that no
+        # one ever sees a partially written document.
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for start in range(0, len(content), self.CHUNK_SIZE):
+                    out.write(content[start:start+self.CHUNK_SIZE])
+            # mkstemp() makes a file only its owner can read.
+            os.chmod(temp_path, self.FILE_MODE)
+            os.rename(temp_path, path)
+        except Exception, e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class S3BlobStore(BlobStore):
+    """Keeps documents in an S3 bucket, using the client of an
+    S3Uploader.
+    """
+
+    # All documents are stored beneath this prefix.
+    PREFIX = u'blobs'
+
+    def __init__(self, uploader, bucket=None):
+        self.client = uploader.client
+        self.bucket = bucket or uploader.get_bucket(
+            uploader.BLOB_STORE_BUCKET_KEY
+        )
+        if not self.bucket:
+            raise CannotLoadConfiguration(
+                "No S3 bucket is configured for the blob store."
+            )
+
+    def s3_key(self, key):
+        return u"/".join([self.PREFIX] + self.shard(key))
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.s3_key(key))
+            return True
+        except ClientError, e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    def open(self, key):
+        # The body of the response is streamed from S3 as it is read.
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.s3_key(key)
+        )
+        return response['Body']
+
+    def _put(self, key, content):
+        self.client.put_object(
+            Bucket=self.bucket, Key=self.s3_key(key), Body=content
+        )
@@ -61,6 +61,7 @@ class Configuration(object):
     # Environment variables that contain URLs to the database
     DATABASE_TEST_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_TEST_DATABASE'
     DATABASE_PRODUCTION_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_PRODUCTION_DATABASE'
+    DATABASE_REPLICA_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_REPLICA_DATABASE'
 
     # The version of the app.
     APP_VERSION = 'app_version'
@@ -82,6 +83,10 @@ class Configuration(object):
 
     DATA_DIRECTORY = "data_directory"
 
+    # If this is set, the content of Representations is kept in this
+    # directory rather than in the database.
+    BLOB_STORE_DIRECTORY = "blob_store_directory"
+
     # ConfigurationSetting key for the base url of the app.
     BASE_URL_KEY = u'base_url'
 
@@ -105,6 +110,38 @@ class Configuration(object):
     DATABASE_PRODUCTION_URL = "production_url"
     DATABASE_TEST_URL = "test_url"
 
+    # A read replica of the production database. Some read-only
+    # queries can be sent here instead.
+    DATABASE_REPLICA_URL = "replica_url"
+
+    # These keys in the database integration tune the connection
+    # pool. Each one can also be set with an environment variable.
+    DATABASE_POOL_SIZE = "pool_size"
+    DATABASE_MAX_OVERFLOW = "max_overflow"
+    DATABASE_POOL_TIMEOUT = "pool_timeout"
+    DATABASE_POOL_RECYCLE = "pool_recycle"
+    DATABASE_POOL_PRE_PING = "pool_pre_ping"
+    DATABASE_POOL_ENVIRONMENT_VARIABLES = {
+        DATABASE_POOL_SIZE : 'SIMPLIFIED_DATABASE_POOL_SIZE',
+        DATABASE_MAX_OVERFLOW : 'SIMPLIFIED_DATABASE_MAX_OVERFLOW',
+        DATABASE_POOL_TIMEOUT : 'SIMPLIFIED_DATABASE_POOL_TIMEOUT',
+        DATABASE_POOL_RECYCLE : 'SIMPLIFIED_DATABASE_POOL_RECYCLE',
+        DATABASE_POOL_PRE_PING : 'SIMPLIFIED_DATABASE_POOL_PRE_PING',
+    }
+
+    # Outgoing HTTP requests are pooled and retried as configured by
+    # these keys in this integration. Each one can also be set with an
+    # environment variable.
+    HTTP_INTEGRATION = u"HTTP"
+    HTTP_POOL_MAXSIZE = "pool_maxsize"
+    HTTP_MAX_RETRIES = "max_retries"
+    HTTP_RETRY_BACKOFF_FACTOR = "backoff_factor"
+    HTTP_ENVIRONMENT_VARIABLES = {
+        HTTP_POOL_MAXSIZE : 'SIMPLIFIED_HTTP_POOL_MAXSIZE',
+        HTTP_MAX_RETRIES : 'SIMPLIFIED_HTTP_MAX_RETRIES',
+        HTTP_RETRY_BACKOFF_FACTOR : 'SIMPLIFIED_HTTP_RETRY_BACKOFF_FACTOR',
+    }
+
     CONTENT_SERVER_INTEGRATION = u"Content Server"
 
     AXIS_INTEGRATION = "Axis 360"
@@ -160,6 +197,11 @@ class Configuration(object):
     LOG_LEVEL = 'log_level'
     LOG_APP_NAME = 'log_app'
     DATABASE_LOG_LEVEL = 'database_log_level'
+    LOG_QUEUE = 'log_queue'
+    SQL_PROFILER = 'sql_profiler'
+    SQL_PROFILER_HEADERS = 'headers'
+    SQL_PROFILER_LOG = 'log'
+    LOG_SAMPLING = 'log_sampling'
     LOG_LEVEL_UI = [
         { "key": DEBUG, "label": _("Debug") },
         { "key": INFO, "label": _("Info") },
@@ -195,6 +237,30 @@ class Configuration(object):
             "description": _("Database logs are extremely verbose, so unless you're diagnosing a database-related problem, it's a good idea to set a higher log level for database messages."),
             "default": WARN,
         },
+        {
+            "key": LOG_QUEUE, "label": _("Log from a background thread"),
+            "type": "select", "default": "false",
+            "options": [
+                { "key": "false", "label": _("No") },
+                { "key": "true", "label": _("Yes") },
+            ],
+            "description": _("If this is set, log messages are sent in batches from a background thread, so that a slow log service doesn't slow down the application. If messages come in faster than they can be sent, some will be dropped."),
+        },
+        {
+            "key": LOG_SAMPLING, "label": _("Log sampling"),
+            "optional": True,
+            "description": _("A JSON object mapping logger names to numbers, e.g. {\"Work presentation calculator\": 10}. Only one in that many messages below the WARN level from that logger will be kept. This only applies when logging from a background thread."),
+        },
+        {
+            "key": SQL_PROFILER, "label": _("Profile database queries"),
+            "type": "select", "default": "",
+            "options": [
+                { "key": "", "label": _("No") },
+                { "key": SQL_PROFILER_HEADERS, "label": _("Yes, and report the results in HTTP response headers") },
+                { "key": SQL_PROFILER_LOG, "label": _("Yes, and log the results") },
+            ],
+            "description": _("Count and time the database queries run while handling each request. Logged results include the slowest queries and the code that ran them."),
+        },
     ]
 
     LIBRARY_SETTINGS = [
@@ -382,6 +448,103 @@ class Configuration(object):
         logging.info("Connecting to database: %s" % url_obj.__to_string__())
         return url
 
+    @classmethod
+    def database_replica_url(cls):
+        """Find the URL to a read replica of the production database,
+        if one is configured, in the same places database_url() looks.
+
+        :return: A URL, or None.
+        """
+        database_integration = cls.integration(cls.DATABASE_INTEGRATION)
+        url = database_integration.get(cls.DATABASE_REPLICA_URL)
+        if not url:
+            url = os.environ.get(cls.DATABASE_REPLICA_ENVIRONMENT_VARIABLE)
+        if not url:
+            return None
+        try:
+            url_obj = make_url(url)
+        except ArgumentError, e:
+            raise ArgumentError(
+                "Bad format for database replica URL (%s)." % url
+            )
+        logging.info(
+            "Connecting to database replica: %s" % url_obj.__to_string__()
+        )
+        return url
+
+    @classmethod
+    def database_engine_options(cls):
+        """Find the connection pool settings configured for this site.
+
+        Like the database URL, each setting is looked for in the site
+        configuration first, then in an environment variable.
+
+        :return: A dictionary of keyword arguments for
+            create_engine(). Settings that aren't configured are left
+            out, so SQLAlchemy's defaults apply.
+        """
+        options = cls._integration_settings(
+            cls.DATABASE_INTEGRATION, cls.DATABASE_POOL_ENVIRONMENT_VARIABLES
+        )
+        for key, value in options.items():
+            if key == cls.DATABASE_POOL_PRE_PING:
+                options[key] = unicode(value).lower() in ('true', 'yes', '1')
+            else:
+                options[key] = cls._number_setting("Database", key, value)
+        return options
+
+    @classmethod
+    def http_session_options(cls):
+        """Find the settings for pooling and retrying outgoing HTTP
+        requests, in the site configuration or in environment variables.
+
+        :return: A dictionary of keyword arguments for
+            HTTP.configure_sessions(). Settings that aren't configured
+            are left out, so the defaults apply.
+        """
+        options = cls._integration_settings(
+            cls.HTTP_INTEGRATION, cls.HTTP_ENVIRONMENT_VARIABLES
+        )
+        for key, value in options.items():
+            if key == cls.HTTP_RETRY_BACKOFF_FACTOR:
+                type = float
+            else:
+                type = int
+            options[key] = cls._number_setting("HTTP", key, value, type)
+        return options
+
+    @classmethod
+    def _integration_settings(cls, name, environment_variables):
+        """Look up some settings in the site configuration for an
+        integration, falling back to environment variables.
+
+        :param environment_variables: Maps each setting to the
+            environment variable it can also be set with.
+        :return: A dictionary containing the settings that were set.
+        """
+        integration = cls.integration(name)
+        settings = dict()
+        for key, environment_variable in sorted(
+                environment_variables.items()):
+            value = integration.get(key)
+            if value is None:
+                value = os.environ.get(environment_variable)
+            if value is None or value == '':
+                continue
+            settings[key] = value
+        return settings
+
+    @classmethod
+    def _number_setting(cls, description, key, value, type=int):
+        try:
+            return type(value)
+        except ValueError, e:
+            raise CannotLoadConfiguration(
+                "%s setting %s must be a number, not %r." % (
+                    description, key, value
+                )
+            )
+
     @classmethod
     def app_version(cls):
         """Returns the git version of the app, if a .version file exists."""
@@ -436,6 +599,12 @@ class Configuration(object):
     # whether the database configuration has changed.
     SITE_CONFIGURATION_TIMEOUT = 'site_configuration_timeout'
 
+    # Set to the ID of the process that is being told about
+    # configuration changes as they happen (by the
+    # CacheInvalidationListener in model.py), so there's no need for it
+    # to check the database.
+    SITE_CONFIGURATION_CHANGES_PUSHED = "site_configuration_changes_pushed"
+
     # The name of the service associated with a Timestamp that tracks
     # the last time the site's configuration changed in the database.
     SITE_CONFIGURATION_CHANGED = "Site Configuration Changed"
@@ -449,6 +618,16 @@ class Configuration(object):
             cls.LAST_CHECKED_FOR_SITE_CONFIGURATION_UPDATE, None
         )
 
+    @classmethod
+    def site_configuration_changes_pushed(cls):
+        """Is this process told about configuration changes as they
+        happen?
+        """
+        return (
+            cls.instance.get(cls.SITE_CONFIGURATION_CHANGES_PUSHED)
+            == os.getpid()
+        )
+
     @classmethod
     def site_configuration_last_update(cls, _db, known_value=None,
                                        timeout=None):
@@ -471,10 +650,15 @@ class Configuration(object):
         """
         now = datetime.datetime.utcnow()
 
+        if (not known_value
+            and cls.site_configuration_changes_pushed()):
+            # We'll be told about any change as soon as it happens.
+            return cls._site_configuration_last_update()
+
         if _db and timeout is None:
             from model import ConfigurationSetting
             timeout = ConfigurationSetting.sitewide(
-                _db, cls.SITE_CONFIGURATION_TIMEOUT
+                _db, cls.SITE_CONFIGURATION_TIMEOUT, snapshot=True
             ).value
         if timeout is None:
             timeout = 600
@@ -24,6 +24,7 @@ from model import (
 from metadata_layer import (
     ReplacementPolicy
 )
+from util import metrics
 from util.worker_pools import DatabaseJob
 
 import log # This sets the appropriate log format.
@@ -195,6 +196,7 @@ class BaseCoverageProvider(object):
         Timestamp.stamp(self._db, self.service_name, self.collection)
         self._db.commit()
 
+    @metrics.timed("BaseCoverageProvider.run_once")
     def run_once(self, offset, count_as_covered=None):
         count_as_covered = count_as_covered or BaseCoverageRecord.DEFAULT_COUNT_AS_COVERED
         # Make it clear which class of items we're covering on this
@@ -1,6 +1,4 @@
 from nose.tools import set_trace
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk as elasticsearch_bulk
 from flask_babel import lazy_gettext as _
 from config import (
     Configuration,
@@ -17,6 +15,7 @@ from model import (
     WorkCoverageRecord,
 )
 from monitor import WorkSweepMonitor
+from util import metrics
 from coverage import (
     CoverageFailure,
     WorkCoverageProvider,
@@ -123,6 +122,10 @@ class ExternalSearchIndex(object):
                 "No URL configured to Elasticsearch server."
             )
 
+        # The Elasticsearch client is imported here, rather than at
+        # the top of the module, because most processes never use it.
+        from elasticsearch import Elasticsearch
+        from elasticsearch.helpers import bulk as elasticsearch_bulk
         if not ExternalSearchIndex.__client:
             use_ssl = url.startswith('https://')
             self.log.info(
@@ -262,6 +265,7 @@ class ExternalSearchIndex(object):
 
         return base_works_index
 
+    @metrics.timed("ExternalSearchIndex.query_works")
     def query_works(self, library, query_string, media, languages, fiction, audiences,
                     target_age, in_any_of_these_genres=[], on_any_of_these_lists=None, fields=None, size=30, offset=0):
         if not self.works_alias:
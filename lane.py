@@ -77,9 +77,9 @@ from util import (
     fast_query_count,
     LanguageCodes,
 )
+from util import metrics
 from util.problem_detail import ProblemDetail
-
-import elasticsearch
+from util.read_replica import read_replica
 
 from sqlalchemy import (
     event,
@@ -928,6 +928,7 @@ class WorkList(object):
             key += ','.join(audiences)
         return key
 
+    @metrics.timed("WorkList.groups")
     def groups(self, _db, include_sublanes=True, facets=None):
         """Extract a list of samples from each child of this WorkList.  This
         can be used to create a grouped acquisition feed for the WorkList.
@@ -1013,7 +1014,11 @@ class WorkList(object):
 
         work_ids = set()
         works = []
-        for work in self.random_sample(query, target_size)[:target_size]:
+        # works() only builds the query, so the time is measured here,
+        # where it's run.
+        with metrics.timer("WorkList.works"):
+            sample = self.random_sample(query, target_size)
+        for work in sample[:target_size]:
             if isinstance(work, tuple):
                 # This is a (work, score) 2-tuple.
                 work = work[0]
@@ -1083,6 +1088,9 @@ class WorkList(object):
                 # would be a little faster. (But right now there is no one
                 # else who uses this.)
 
+                # Every entry needs the LicensePool's Identifier.
+                joinedload("license_pool", "identifier"),
+
                 # These speed up the process of generating acquisition links.
                 joinedload("license_pool", "delivery_mechanisms"),
                 joinedload("license_pool", "delivery_mechanisms", "delivery_mechanism"),
@@ -1113,7 +1121,8 @@ class WorkList(object):
         qu = qu.distinct(mw.works_id)
         work_by_id = dict()
         a = time.time()
-        works = qu.all()
+        with read_replica(_db):
+            works = qu.all()
 
         # Put the MaterializedWork objects in the same order as their
         # work_ids were.
@@ -1277,7 +1286,8 @@ class WorkList(object):
             offset = random.randint(0, max_offset)
         else:
             offset = 0
-        items = query.offset(offset).limit(target_size).all()
+        with read_replica(query.session):
+            items = query.offset(offset).limit(target_size).all()
         random.shuffle(items)
         return items
 
@@ -1370,9 +1380,10 @@ class WorkList(object):
                 )
             )
 
+            from elasticsearch.exceptions import ConnectionError
             try:
                 docs = search_client.query_works(**kwargs)
-            except elasticsearch.exceptions.ConnectionError, e:
+            except ConnectionError, e:
                 logging.error(
                     "Could not connect to ElasticSearch. Returning empty list of search results."
                 )
@@ -1487,9 +1498,9 @@ class WorkList(object):
 
         # Pull a window of works for every lane we were given.
         for lane in lanes:
-            for mw, quality_tier in lane.works_in_window(
-                    _db, facets, target_size
-            ):
+            with read_replica(_db), metrics.timer("WorkList.works"):
+                works = list(lane.works_in_window(_db, facets, target_size))
+            for mw, quality_tier in works:
                 yield mw, quality_tier, lane
 
     def works_in_window(self, _db, facets, target_size):
@@ -2102,6 +2113,7 @@ class Lane(Base, WorkList):
             end = start + 0.001
         return start, end
 
+    @metrics.timed("Lane.groups")
     def groups(self, _db, include_sublanes=True, facets=None):
         """Return a list of (MaterializedWorkWithGenre, Lane) 2-tuples
         describing a sequence of featured items for this lane and
@@ -1,14 +1,45 @@
+import datetime
+from threading import Lock
 from flask_babel import lazy_gettext as _
-from model import Session, CirculationEvent
+from analytics import EventBuffer
+from model import (
+    CirculationEvent,
+    Session,
+    SessionManager,
+)
 
 class LocalAnalyticsProvider(object):
     NAME = _("Local Analytics")
 
     DESCRIPTION = _("Store analytics events in the 'circulationevents' database table.")
 
+    BUFFERED = "buffered"
+    SPOOL_DIRECTORY = "spool_directory"
+
+    SETTINGS = [
+        {
+            "key": BUFFERED, "label": _("Write events in batches"),
+            "type": "select", "default": "false",
+            "options": [
+                { "key": "false", "label": _("No, write each event as it happens") },
+                { "key": "true", "label": _("Yes, write events in the background") },
+            ],
+            "description": _("Events written in the background may take a few seconds to show up."),
+        },
+        {
+            "key": SPOOL_DIRECTORY, "label": _("Spool directory"),
+            "optional": True,
+            "description": _("If events are written in batches, keep them in files in this directory until they're written, so they aren't lost if the database is unavailable or the process is killed."),
+        },
+    ]
+
     # A given site can only have one analytics provider.
     CARDINALITY = 1
 
+    # Every provider in a process shares one EventBuffer.
+    event_buffer = None
+    event_buffer_lock = Lock()
+
     def __init__(self, integration, library=None):
         self.integration_id = integration.id
         if library:
@@ -16,6 +47,44 @@ class LocalAnalyticsProvider(object):
         else:
             self.library_id = None
 
+        self.buffer = None
+        if integration.setting(self.BUFFERED).bool_value:
+            self.buffer = self.shared_event_buffer(
+                Session.object_session(integration),
+                integration.setting(self.SPOOL_DIRECTORY).value
+            )
+
+    @classmethod
+    def shared_event_buffer(cls, _db, spool_directory=None):
+        """Find or start the EventBuffer for this process."""
+        with cls.event_buffer_lock:
+            if not cls.event_buffer:
+                buffer = EventBuffer(
+                    cls.batch_writer(SessionManager.sessionmaker(session=_db)),
+                    spool_directory=spool_directory
+                )
+                buffer.start()
+                cls.event_buffer = buffer
+        return cls.event_buffer
+
+    @classmethod
+    def batch_writer(cls, session_factory):
+        """Create a function that writes a batch of events in a
+        database session of its own.
+        """
+        def write_batch(events):
+            _db = session_factory()
+            try:
+                count = CirculationEvent.log_batch(_db, events)
+                _db.commit()
+                return count
+            except Exception, e:
+                _db.rollback()
+                raise
+            finally:
+                _db.close()
+        return write_batch
+
     def collect_event(self, library, license_pool, event_type, time, 
         old_value=None, new_value=None, **kwargs):
         if not library and not license_pool:
@@ -26,7 +95,18 @@ class LocalAnalyticsProvider(object):
             _db = Session.object_session(license_pool)
         if library and self.library_id and library.id != self.library_id:
             return
-        
+
+        # A LicensePool that hasn't been written to the database yet
+        # can't be referred to from another session.
+        if self.buffer and (not license_pool or license_pool.id):
+            event = dict(
+                license_pool_id=license_pool.id if license_pool else None,
+                type=event_type, start=time or datetime.datetime.utcnow(),
+                old_value=old_value, new_value=new_value,
+            )
+            if self.buffer.add(event):
+                return
+
         CirculationEvent.log(
           _db, license_pool, event_type, old_value, new_value, start=time)
 
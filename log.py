@@ -1,13 +1,27 @@
 from nose.tools import set_trace
+import atexit
 import datetime
 import logging
 import json
 import os
+import Queue
 import socket
+import time
+from threading import (
+    Event,
+    Lock,
+    Thread,
+)
 from flask_babel import lazy_gettext as _
-from config import Configuration
+from config import (
+    CannotLoadConfiguration,
+    Configuration,
+)
 from StringIO import StringIO
-from loggly.handlers import HTTPSHandler as LogglyHandler
+from loggly.handlers import (
+    HTTPSHandler as LogglyHandler,
+    session as loggly_session,
+)
 
 if not Configuration.instance:
     Configuration.load()
@@ -36,10 +50,17 @@ class JSONFormatter(logging.Formatter):
             level=record.levelname,
             filename=record.filename,
             message=message,
-            timestamp=datetime.datetime.utcnow().isoformat()
+            # The record may be formatted some time after it was
+            # created, by a QueueHandler.
+            timestamp=datetime.datetime.utcfromtimestamp(
+                record.created
+            ).isoformat()
         )
         if record.exc_info:
             data['traceback'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # A QueueHandler already formatted the traceback.
+            data['traceback'] = record.exc_text
         return json.dumps(data)
 
 class UTF8Formatter(logging.Formatter):
@@ -53,6 +74,222 @@ class UTF8Formatter(logging.Formatter):
             data = data.encode("utf8")
         return data
 
+class LogglyBatchHandler(LogglyHandler):
+    """A Loggly handler that can send many records in one request,
+    using Loggly's bulk endpoint.
+    """
+
+    def __init__(self, url, *args, **kwargs):
+        super(LogglyBatchHandler, self).__init__(url, *args, **kwargs)
+        if '/inputs/' in url:
+            self.bulk_url = url.replace('/inputs/', '/bulk/', 1)
+        else:
+            self.bulk_url = None
+
+    def emit_batch(self, records):
+        if not self.bulk_url:
+            for record in records:
+                self.emit(record)
+            return
+        try:
+            payload = "\n".join(self.format(record) for record in records)
+            if isinstance(payload, unicode):
+                payload = payload.encode("utf-8")
+            loggly_session.post(self.bulk_url, data=payload)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(records[0])
+
+
+class QueueHandler(logging.Handler):
+    """Hand log records off to a background thread, which formats them
+    and passes them on to other handlers a batch at a time.
+
+    Logging never blocks the caller. If the queue fills up, records
+    are dropped and counted, and a warning about the dropped records
+    is logged once there's room again.
+
+    Records below WARN from loggers named in `sample_rates` can be
+    sampled, so that only one in every N of them is kept.
+    """
+
+    MAX_SIZE = 10000
+    BATCH_SIZE = 100
+
+    # How long, in seconds, to wait for a batch to fill up.
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, handlers, max_size=None, batch_size=None,
+                 sample_rates=None, start=True):
+        """Constructor.
+
+        :param handlers: The handlers that will actually deal with the
+            log records.
+
+        :param sample_rates: A dictionary mapping logger names to
+            integers. Only one in every N records from a logger (or
+            its children) will be kept.
+
+        :param start: If this is False, no background thread will be
+            started and records will only be handled when flush() is
+            called.
+        """
+        super(QueueHandler, self).__init__()
+        self.handlers = list(handlers)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.queue = Queue.Queue(max_size or self.MAX_SIZE)
+        self.sample_rates = dict(sample_rates or {})
+        self.sample_counts = dict()
+
+        self.counter_lock = Lock()
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.sampled_out = 0
+
+        self.stopped = Event()
+        self.thread = None
+        if start:
+            self.thread = Thread(target=self.run, name="Log queue")
+            self.thread.daemon = True
+            self.thread.start()
+            atexit.register(self.close)
+
+    def sample_rate(self, record):
+        """How many records from this record's logger are represented
+        by each record that's kept?
+        """
+        if record.levelno >= logging.WARN or not self.sample_rates:
+            return 1
+        name = record.name
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            if '.' not in name:
+                break
+            name = name.rsplit('.', 1)[0]
+        return 1
+
+    def keep(self, record):
+        rate = self.sample_rate(record)
+        if rate <= 1:
+            return True
+        with self.counter_lock:
+            count = self.sample_counts.get(record.name, 0)
+            self.sample_counts[record.name] = count + 1
+            if count % rate == 0:
+                return True
+            self.sampled_out += 1
+        return False
+
+    def prepare(self, record):
+        """Do the parts of formatting that have to happen in the
+        caller's thread.
+
+        The message arguments may be database objects, which can't be
+        used from another thread, so they're turned into a string
+        here. Everything else happens in the background.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging._defaultFormatter.formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            if not self.keep(record):
+                return
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            with self.counter_lock:
+                self.dropped += 1
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = self._take_batch(self.FLUSH_INTERVAL)
+            if batch:
+                self.handle_batch(batch)
+
+    def flush(self):
+        """Handle every queued record in this thread."""
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                break
+            self.handle_batch(batch)
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        """Stop the background thread, handle any queued records, and
+        close the underlying handlers.
+        """
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        for handler in self.handlers:
+            handler.close()
+        super(QueueHandler, self).close()
+
+    def _take_batch(self, timeout):
+        batch = []
+        deadline = time.time() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0 and not self.stopped.is_set():
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def handle_batch(self, records):
+        """Pass a batch of records on to the underlying handlers."""
+        report = self.dropped_report()
+        if report:
+            records = records + [report]
+        for handler in self.handlers:
+            handled = [x for x in records if x.levelno >= handler.level]
+            if not handled:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.acquire()
+                try:
+                    handler.emit_batch(handled)
+                finally:
+                    handler.release()
+            else:
+                for record in handled:
+                    handler.handle(record)
+
+    def dropped_report(self):
+        """Create a log record about any records that were dropped
+        since the last report.
+        """
+        with self.counter_lock:
+            newly_dropped = self.dropped - self.reported_dropped
+            self.reported_dropped = self.dropped
+        if not newly_dropped:
+            return None
+        return logging.LogRecord(
+            self.__class__.__name__, logging.WARN, __file__, 0,
+            "Dropped %d log messages because the log queue was full.",
+            (newly_dropped,), None
+        )
+
+
 class Logger(object):
 
     DEBUG = "DEBUG"
@@ -205,7 +442,7 @@ class Loggly(Logger):
                     token, url,
                 )
             )
-        return LogglyHandler(url)
+        return LogglyBatchHandler(url)
 
     @classmethod
     def _interpolate_loggly_url(cls, url, token):
@@ -289,6 +526,9 @@ class LogConfiguration(object):
             handler.setLevel(log_level)
         for handler in old_handlers:
             logger.removeHandler(handler)
+            if isinstance(handler, QueueHandler):
+                # Stop its background thread.
+                handler.close()
 
         # Set the loggers for various verbose libraries to the database
         # log level, which is probably higher than the normal log level.
@@ -339,4 +579,33 @@ class LogConfiguration(object):
         if loggly:
             handlers.append(loggly)
 
+        use_queue, sample_rates = cls.queue_configuration(_db, testing)
+        if use_queue:
+            handlers = [QueueHandler(handlers, sample_rates=sample_rates)]
+
         return internal_log_level, database_log_level, handlers
+
+    @classmethod
+    def queue_configuration(cls, _db, testing=False):
+        """Find out whether log records should be handled by a
+        QueueHandler, and how they should be sampled.
+
+        :return: A 2-tuple (use_queue, sample_rates).
+        """
+        if not _db or testing:
+            return False, None
+        from model import ConfigurationSetting
+        use_queue = ConfigurationSetting.sitewide(
+            _db, Configuration.LOG_QUEUE
+        ).bool_value
+        if not use_queue:
+            return False, None
+        try:
+            sample_rates = ConfigurationSetting.sitewide(
+                _db, Configuration.LOG_SAMPLING
+            ).json_value
+        except ValueError, e:
+            raise CannotLoadConfiguration(
+                "Log sampling configuration is not valid JSON."
+            )
+        return True, sample_rates
@@ -8,10 +8,11 @@ the information into this format.
 """
 
 from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.session import Session
 from nose.tools import set_trace
 from dateutil.parser import parse
-from sqlalchemy.sql.expression import and_, or_
+from sqlalchemy.sql.expression import and_, or_, tuple_
 from sqlalchemy.orm.exc import (
     NoResultFound,
 )
@@ -31,7 +32,9 @@ from model import (
     get_one,
     get_one_or_create,
     CirculationEvent,
+    Classification,
     Contributor,
+    ContributorCache,
     CoverageRecord,
     DataSource,
     DeliveryMechanism,
@@ -43,6 +46,7 @@ from model import (
     LicensePoolDeliveryMechanism,
     Subject,
     Hyperlink,
+    PreloadedLookups,
     PresentationCalculationPolicy,
     RightsStatus,
     Representation,
@@ -334,10 +338,30 @@ class ContributorData(object):
         If we have a copy of this book in our collection (the only
         time an external list item is relevant), this will probably be
         easy.
+
+        Display names are compared after normalization, so "J.R.R.
+        Tolkien" matches "J.R.R. TOLKIEN", but a contributor with
+        exactly the same display name is preferred.
         """
-        contributors = _db.query(Contributor).filter(
-            Contributor.display_name==display_name).filter(
-                Contributor.sort_name != None).all()
+        normalized_name = Contributor.normalize_name(display_name)
+        if not normalized_name:
+            return None
+        key = ContributorCache.normalized_name_key(normalized_name)
+        cache = ContributorCache.for_session(_db)
+        contributors = None
+        if cache:
+            contributors = cache.get(_db, key)
+        if contributors is None:
+            contributors = _db.query(Contributor).filter(
+                Contributor.normalized_name==normalized_name).filter(
+                    Contributor.sort_name != None).order_by(
+                        Contributor.id).all()
+            if cache:
+                # Even finding nothing is worth remembering -- the
+                # same unknown author tends to show up again and again.
+                cache.put(key, contributors)
+        exact = [x for x in contributors if x.display_name == display_name]
+        contributors = exact or contributors
         if contributors:
             log = logging.getLogger("Abstract metadata layer")
             log.debug(
@@ -509,6 +533,188 @@ class MetaToModelUtility(object):
 
     log = logging.getLogger("Abstract metadata layer - mirror code")
 
+    @classmethod
+    def preload(cls, _db, metadatas=None, circulations=None, collection=None):
+        """Look up, in bulk, the database objects apply() will need for a
+        batch of Metadata and CirculationData objects.
+
+        Identifiers that don't exist yet are created with a single
+        INSERT.
+
+        :return: A PreloadedLookups, ready to be installed in `_db`.
+        """
+        metadatas = list(metadatas or [])
+        circulations = list(circulations or [])
+        circulations.extend(x.circulation for x in metadatas if x.circulation)
+        lookups = PreloadedLookups()
+
+        def covers(index, values):
+            return lambda key: key[index] in values
+
+        # Find or create every Identifier mentioned in the batch.
+        identifier_keys = set()
+        def prepare(identifier_data):
+            if not identifier_data:
+                return None
+            try:
+                key = Identifier.prepare_foreign_type_and_identifier(
+                    identifier_data.type, identifier_data.identifier
+                )
+            except ValueError, e:
+                # apply() will raise this error when it gets to this
+                # identifier.
+                return None
+            if not all(key):
+                return None
+            return key
+
+        def add_identifier(identifier_data):
+            key = prepare(identifier_data)
+            if key:
+                identifier_keys.add(key)
+        for metadata in metadatas:
+            add_identifier(metadata.primary_identifier)
+            for identifier_data in metadata.identifiers or []:
+                add_identifier(identifier_data)
+        for circulation in circulations:
+            add_identifier(circulation._primary_identifier)
+        if not identifier_keys:
+            return lookups
+        identifiers = cls._find_or_create_identifiers(_db, identifier_keys)
+        lookups.load(
+            Identifier, ['type', 'identifier'], identifiers.values(),
+            covers=lambda key: (key[1], key[0]) in identifier_keys
+        )
+
+        def primary_identifier(identifier_data):
+            return identifiers.get(prepare(identifier_data))
+
+        metadata_identifiers = set()
+        for metadata in metadatas:
+            identifier = primary_identifier(metadata.primary_identifier)
+            if identifier:
+                metadata_identifiers.add(identifier)
+        circulation_identifiers = set()
+        for circulation in circulations:
+            identifier = primary_identifier(circulation._primary_identifier)
+            if identifier:
+                circulation_identifiers.add(identifier)
+        primary_identifiers = metadata_identifiers | circulation_identifiers
+        primary_identifier_ids = [x.id for x in primary_identifiers]
+
+        # Editions, and the CoverageRecords, Equivalencies and
+        # Classifications associated with their Identifiers.
+        if metadata_identifiers:
+            ids = [x.id for x in metadata_identifiers]
+            qu = _db.query(Edition).filter(Edition.primary_identifier_id.in_(ids))
+            lookups.load(
+                Edition, ['data_source', 'primary_identifier'], qu,
+                covers=covers(1, metadata_identifiers)
+            )
+
+            qu = _db.query(CoverageRecord).filter(
+                CoverageRecord.identifier_id.in_(ids)
+            ).filter(CoverageRecord.collection_id==None)
+            lookups.load(
+                CoverageRecord,
+                ['identifier', 'data_source', 'operation', 'collection'], qu,
+                covers=lambda key: (key[0] is None
+                                    and key[2] in metadata_identifiers)
+            )
+
+            qu = _db.query(Equivalency).filter(Equivalency.input_id.in_(ids))
+            lookups.load(
+                Equivalency, ['data_source', 'input', 'output'], qu,
+                covers=covers(1, metadata_identifiers)
+            )
+
+            qu = _db.query(Classification).filter(
+                Classification.identifier_id.in_(ids)
+            )
+            lookups.load(
+                Classification, ['identifier', 'subject', 'data_source'], qu,
+                covers=covers(1, metadata_identifiers)
+            )
+
+        # Subjects that are identified by type and identifier.
+        subject_keys = set()
+        for metadata in metadatas:
+            for subject in metadata.subjects or []:
+                if subject.type and subject.identifier:
+                    subject_keys.add((subject.type, subject.identifier))
+        if subject_keys:
+            qu = _db.query(Subject).filter(
+                tuple_(Subject.type, Subject.identifier).in_(list(subject_keys))
+            )
+            lookups.load(
+                Subject, ['type', 'identifier'], qu,
+                covers=lambda key: (key[1], key[0]) in subject_keys
+            )
+
+        # Resources and Hyperlinks.
+        urls = set()
+        for item in metadatas + circulations:
+            for link in item.links or []:
+                for l in (link, link.thumbnail, link.original):
+                    if l and l.href:
+                        urls.add(l.href)
+        if urls:
+            qu = _db.query(Resource).filter(Resource.url.in_(list(urls)))
+            lookups.load(Resource, ['url'], qu, covers=covers(0, urls))
+        qu = _db.query(Hyperlink).filter(
+            Hyperlink.identifier_id.in_(primary_identifier_ids)
+        )
+        lookups.load(
+            Hyperlink, ['rel', 'data_source', 'identifier', 'resource'], qu,
+            covers=covers(1, primary_identifiers)
+        )
+
+        # LicensePools in the Collection.
+        if collection and circulation_identifiers:
+            qu = _db.query(LicensePool).filter(
+                LicensePool.identifier_id.in_(
+                    [x.id for x in circulation_identifiers]
+                )
+            ).filter(LicensePool.collection_id==collection.id)
+            lookups.load(
+                LicensePool, ['data_source', 'identifier', 'collection'], qu,
+                covers=lambda key: (key[0] is collection
+                                    and key[2] in circulation_identifiers)
+            )
+        return lookups
+
+    @classmethod
+    def _find_or_create_identifiers(cls, _db, keys):
+        """Find or create Identifiers for a set of (type, identifier) 2-tuples.
+
+        :return: A dictionary mapping (type, identifier) to Identifier.
+        """
+        def find(keys):
+            qu = _db.query(Identifier).filter(
+                tuple_(Identifier.type, Identifier.identifier).in_(list(keys))
+            )
+            return dict(((x.type, x.identifier), x) for x in qu)
+
+        found = find(keys)
+        missing = set(keys) - set(found)
+        if missing:
+            # Create all the missing Identifiers with one INSERT. If
+            # another process created one in the meantime, give up;
+            # apply() will create them one at a time.
+            _db.flush()
+            transaction = _db.begin_nested()
+            try:
+                _db.execute(
+                    Identifier.__table__.insert(),
+                    [dict(type=type, identifier=identifier)
+                     for type, identifier in missing]
+                )
+                transaction.commit()
+            except IntegrityError, e:
+                transaction.rollback()
+            found.update(find(missing))
+        return found
+
     def mirror_link(self, model_object, data_source, link, link_obj, policy):
         """Retrieve a copy of the given link and make sure it gets
         mirrored. If it's a full-size image, create a thumbnail and
@@ -1056,6 +1262,28 @@ class CirculationData(MetaToModelUtility):
 
         return pool, made_changes
 
+    @classmethod
+    def apply_batch(cls, _db, circulations, collection, replace=None):
+        """Apply a batch of CirculationData objects.
+
+        This does the same thing as calling apply() on each one, but
+        the database objects they refer to are looked up in bulk.
+
+        :return: A list of (LicensePool, made_changes) 2-tuples, one
+            for each CirculationData.
+        """
+        lookups = cls.preload(
+            _db, circulations=circulations, collection=collection
+        )
+        lookups.install(_db)
+        try:
+            return [
+                circulation.apply(_db, collection, replace=replace)
+                for circulation in circulations
+            ]
+        finally:
+            PreloadedLookups.uninstall(_db)
+
     def _availability_needs_update(self, pool):
         """Does this CirculationData represent information more recent than 
         what we have for the given LicensePool?
@@ -1130,6 +1358,13 @@ class Metadata(MetaToModelUtility):
         self.issued = issued
         self.published = published
 
+        if isinstance(primary_identifier, Identifier):
+            self.primary_identifier_obj = primary_identifier
+            primary_identifier = IdentifierData(
+                primary_identifier.type, primary_identifier.identifier
+            )
+        else:
+            self.primary_identifier_obj = None
         self.primary_identifier=primary_identifier
         self.identifiers = identifiers or []
         self.permanent_work_id = None
@@ -1295,7 +1530,9 @@ class Metadata(MetaToModelUtility):
             # to associate it with other items of the same type.
             return
 
-        primary_identifier_obj, ignore = self.primary_identifier.load(_db)
+        primary_identifier_obj = self._primary_identifier_obj()
+        if not primary_identifier_obj:
+            primary_identifier_obj, ignore = self.primary_identifier.load(_db)
 
         # Try to find the primary identifiers of other Editions with
         # the same permanent work ID and the same medium, representing
@@ -1329,6 +1566,17 @@ class Metadata(MetaToModelUtility):
             raise ValueError("Data source %s not found!" % self._data_source)
         return self.data_source_obj
 
+    def _primary_identifier_obj(self):
+        """The Identifier this Metadata was created with, if it's still
+        the primary identifier.
+        """
+        obj = self.primary_identifier_obj
+        if (obj and self.primary_identifier
+            and obj.type == self.primary_identifier.type
+            and obj.identifier == self.primary_identifier.identifier):
+            return obj
+        return None
+
     def edition(self, _db, create_if_not_exists=True):
         """ Find or create the edition described by this Metadata object.
         """
@@ -1339,6 +1587,19 @@ class Metadata(MetaToModelUtility):
 
         data_source = self.data_source(_db)
 
+        primary_identifier_obj = self._primary_identifier_obj()
+        if primary_identifier_obj:
+            # The Identifier has already been looked up.
+            if create_if_not_exists:
+                return get_one_or_create(
+                    _db, Edition, data_source=data_source,
+                    primary_identifier=primary_identifier_obj
+                )
+            return get_one(
+                _db, Edition, data_source=data_source,
+                primary_identifier=primary_identifier_obj
+            )
+
         return Edition.for_foreign_id(
             _db, data_source, self.primary_identifier.type,
             self.primary_identifier.identifier,
@@ -1713,7 +1974,35 @@ class Metadata(MetaToModelUtility):
         )
         return edition, made_core_changes
 
-        
+    @classmethod
+    def apply_batch(cls, _db, metadatas, collection, metadata_client=None,
+                    replace=None):
+        """Find or create the Edition for each of a batch of Metadata
+        objects, and apply the Metadata to it.
+
+        This does the same thing as calling edition() and apply() on
+        each one, but the database objects they refer to are looked
+        up in bulk.
+
+        :return: A list of (Edition, made_core_changes) 2-tuples, one
+            for each Metadata.
+        """
+        lookups = cls.preload(_db, metadatas=metadatas, collection=collection)
+        lookups.install(_db)
+        try:
+            results = []
+            for metadata in metadatas:
+                edition, is_new = metadata.edition(_db)
+                results.append(
+                    metadata.apply(
+                        edition, collection, metadata_client=metadata_client,
+                        replace=replace
+                    )
+                )
+            return results
+        finally:
+            PreloadedLookups.uninstall(_db)
+
     def make_thumbnail(self, data_source, link, link_obj):
         """Make sure a Hyperlink representing an image is connected
         to its thumbnail.
@@ -0,0 +1,11 @@
+DO $$
+  BEGIN
+    BEGIN
+      ALTER TABLE representations ADD COLUMN content_hash varchar;
+    EXCEPTION
+      WHEN duplicate_column THEN RAISE NOTICE 'column representations.content_hash already exists, not creating it.';
+    END;
+  END;
+$$;
+
+create index if not exists "ix_representations_content_hash" on representations (content_hash);
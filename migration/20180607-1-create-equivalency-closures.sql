@@ -0,0 +1,9 @@
+create table if not exists equivalencyclosures (
+    identifier_id integer references identifiers(id) on delete cascade,
+    equivalent_id integer references identifiers(id) on delete cascade,
+    depth integer,
+    strength double precision,
+    primary key (identifier_id, equivalent_id, depth)
+);
+
+create index if not exists "ix_equivalencyclosures_equivalent_id" on equivalencyclosures (equivalent_id);
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+"""Fill in the new equivalencyclosures table from the existing
+equivalencies.
+"""
+import os
+import sys
+bin_dir = os.path.split(__file__)[0]
+package_dir = os.path.join(bin_dir, "..")
+sys.path.append(os.path.abspath(package_dir))
+from scripts import RebuildEquivalencyClosureScript
+RebuildEquivalencyClosureScript().run()
@@ -0,0 +1,11 @@
+DO $$
+  BEGIN
+    BEGIN
+      ALTER TABLE contributors ADD COLUMN normalized_name varchar;
+    EXCEPTION
+      WHEN duplicate_column THEN RAISE NOTICE 'column contributors.normalized_name already exists, not creating it.';
+    END;
+  END;
+$$;
+
+create index if not exists "ix_contributors_normalized_name" on contributors (normalized_name);
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Fill in Contributor.normalized_name for existing contributors."""
+import os
+import sys
+import logging
+from nose.tools import set_trace
+
+bin_dir = os.path.split(__file__)[0]
+package_dir = os.path.join(bin_dir, "..")
+sys.path.append(os.path.abspath(package_dir))
+
+from model import (
+    production_session,
+    Contributor,
+)
+
+_db = production_session()
+log = logging.getLogger(name="Contributor normalized name migration")
+try:
+    qu = _db.query(Contributor).filter(
+        Contributor.display_name != None).filter(
+            Contributor.normalized_name == None).order_by(Contributor.id)
+    batch_size = 1000
+    done = 0
+    while True:
+        # Each batch drops out of the query once it's committed.
+        contributors = qu.limit(batch_size).all()
+        if not contributors:
+            break
+        for contributor in contributors:
+            normalized_name = Contributor.normalize_name(
+                contributor.display_name
+            )
+            # A name that normalizes to nothing still needs a value,
+            # or it would be picked up again by the next batch.
+            contributor.normalized_name = normalized_name or u''
+        _db.commit()
+        done += len(contributors)
+        log.info("Normalized %d contributor names.", done)
+    _db.close()
+except Exception as e:
+    _db.close()
+    raise e
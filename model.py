@@ -2,13 +2,13 @@
 from cStringIO import StringIO
 from collections import (
     Counter,
+    OrderedDict,
     defaultdict,
 )
 from lxml import etree
 from nose.tools import set_trace
 import base64
 import bisect
-import cairosvg
 import datetime
 import isbnlib
 import json
@@ -19,7 +19,17 @@ import os
 import random
 import re
 import requests
-from threading import RLock
+import select as select_module
+from Queue import (
+    Empty,
+    Queue,
+)
+from threading import (
+    BoundedSemaphore,
+    Event,
+    RLock,
+    Thread,
+)
 import time
 import traceback
 import urllib
@@ -28,10 +38,6 @@ import uuid
 import warnings
 import bcrypt
 
-from PIL import (
-    Image,
-)
-
 from psycopg2.extras import NumericRange
 from sqlalchemy.engine.base import Connection
 from sqlalchemy import exc as sa_exc
@@ -40,6 +46,7 @@ from sqlalchemy import (
     event,
     exists,
     func,
+    inspect,
     MetaData,
     Table,
     text,
@@ -52,9 +59,11 @@ from sqlalchemy.orm import (
     lazyload,
     mapper,
     relationship,
+    selectinload,
     sessionmaker,
     synonym,
 )
+from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.orm.base import NO_VALUE
 from sqlalchemy.orm.exc import (
     NoResultFound,
@@ -127,12 +136,18 @@ from util import (
     TitleProcessor,
 )
 from mirror import MirrorUploader
+from blob_store import BlobStore
 from util.http import (
     HTTP,
     RemoteIntegrationException,
 )
+from util import metrics
 from util.permanent_work_id import WorkIDCalculator
-from util.personal_names import display_name_to_sort_name
+from util.personal_names import (
+    display_name_to_sort_name,
+    normalize_contributor_name_for_matching,
+)
+from util.read_replica import ReplicaRoutingSession
 from util.summary import SummaryEvaluator
 
 from sqlalchemy.orm.session import Session
@@ -151,7 +166,8 @@ def production_session():
     if url.startswith('"'):
         url = url[1:]
     logging.debug("Database url: %s", url)
-    _db = SessionManager.session(url)
+    replica_url = Configuration.database_replica_url()
+    _db = SessionManager.session(url, replica_url=replica_url)
 
     # The first thing to do after getting a database connection is to
     # set up the logging configuration.
@@ -162,6 +178,14 @@ def production_session():
     # with the right arguments.
     from log import LogConfiguration
     LogConfiguration.initialize(_db)
+
+    # Representations may keep their content in a blob store, so
+    # every process needs to know where it is.
+    BlobStore.initialize(_db)
+
+    # Outgoing HTTP requests are pooled and retried as the site is
+    # configured to.
+    HTTP.configure_sessions(**Configuration.http_session_options())
     return _db
 
 class PolicyException(Exception):
@@ -179,6 +203,62 @@ class BaseMaterializedWork(object):
     pass
 
 
+class CacheSnapshot(object):
+    """A lightweight, read-only copy of some of the fields of an
+    object kept in a HasFullTableCache.
+
+    Unlike the object itself, a snapshot isn't tied to a database
+    session, so it can be handed to any session without being merged
+    into it. A snapshot reflects the database as of the last time the
+    object was flushed.
+    """
+
+    # Subclasses should list the fields they copy, and use the same
+    # list as __slots__.
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, values.get(field))
+
+    @classmethod
+    def from_object(cls, obj):
+        return cls(**dict((field, getattr(obj, field)) for field in cls.FIELDS))
+
+    def replace(self, **values):
+        """Make a copy of this snapshot with some of the fields changed."""
+        new_values = dict((field, getattr(self, field)) for field in self.FIELDS)
+        new_values.update(values)
+        return self.__class__(**new_values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __eq__(self, other):
+        return (self.__class__ == other.__class__
+                and self._values() == other._values())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.__class__, self._values()))
+
+    def __repr__(self):
+        return "<%s %s>" % (
+            self.__class__.__name__,
+            " ".join("%s=%r" % (field, getattr(self, field))
+                     for field in self.FIELDS)
+        )
+
+
 class HasFullTableCache(object):
     """A mixin class for ORM classes that maintain an in-memory cache of
     (hopefully) every item in the database table for performance reasons.
@@ -186,27 +266,229 @@ class HasFullTableCache(object):
 
     RESET = object()
 
+    # A CacheSnapshot subclass. If this is set, a snapshot is taken of
+    # every object as it's cached, and snapshot_by_cache_key() and
+    # snapshot_by_id() can be used for read-only lookups.
+    SNAPSHOT_CLASS = None
+
+    # Changes to these tables are announced on this Postgres channel,
+    # so that other processes can evict the changed objects from
+    # their caches.
+    NOTIFY_CHANNEL = 'full_table_cache'
+
+    # Identifies notifications sent by this process, which can be
+    # ignored because the caches have already been updated. A process
+    # forked from this one shares this value, so process_token() adds
+    # the process ID.
+    PROCESS_TOKEN = uuid.uuid4().hex
+
     # You MUST define your own class-specific '_cache' and '_id_cache'
     # variables, like so:
     #
     # _cache = HasFullTableCache.RESET
     # _id_cache = HasFullTableCache.RESET
 
+    # How many lookups were answered from the cache, how many had to
+    # go to the database, and how many times the whole table was
+    # loaded. Each class keeps its own counts.
+    _cache_hits = 0
+    _cache_misses = 0
+    _cache_reloads = 0
+
+    # Objects that were changed during a database session are kept in
+    # Session.info under these keys until the session's transaction
+    # is committed. See cached_object_changed().
+    PENDING_UPSERTS_KEY = 'full_table_cache_upserts'
+    UNCOMMITTED_UPSERTS_KEY = 'full_table_cache_uncommitted_upserts'
+    CHANGED_CLASSES_KEY = 'full_table_cache_changed_classes'
+
     @classmethod
     def reset_cache(cls):
         cls._cache = cls.RESET
         cls._id_cache = cls.RESET
 
+    @classmethod
+    def cache_stats(cls):
+        """Report on the size and effectiveness of this class's cache.
+
+        :return: A dictionary.
+        """
+        id_cache = cls._id_cache
+        if id_cache == cls.RESET:
+            size = 0
+        else:
+            size = len(id_cache)
+        hits = cls._cache_hits
+        lookups = hits + cls._cache_misses
+        if lookups:
+            hit_rate = float(hits) / lookups
+        else:
+            hit_rate = None
+        return dict(
+            size=size, hits=hits, misses=cls._cache_misses,
+            hit_rate=hit_rate, reloads=cls._cache_reloads,
+        )
+
+    @classmethod
+    def all_cache_stats(cls):
+        """Report on the cache of every HasFullTableCache class."""
+        return dict(
+            (name, subclass.cache_stats())
+            for name, subclass in cls.cached_classes().items()
+        )
+
+    @classmethod
+    def cached_classes(cls):
+        """Map the name of every HasFullTableCache class to the class."""
+        classes = dict()
+        subclasses = list(HasFullTableCache.__subclasses__())
+        while subclasses:
+            subclass = subclasses.pop()
+            classes[subclass.__name__] = subclass
+            subclasses.extend(subclass.__subclasses__())
+        return classes
+
+    @classmethod
+    def reset_all_caches(cls):
+        for subclass in cls.cached_classes().values():
+            subclass.reset_cache()
+
+    @classmethod
+    def process_token(cls):
+        """Identify notifications sent by the current process."""
+        return "%s-%d" % (cls.PROCESS_TOKEN, os.getpid())
+
+    @classmethod
+    def notify(cls, connection, obj):
+        """Tell other processes that `obj` was created, changed or
+        deleted.
+
+        Postgres holds on to the notification until the current
+        transaction is committed, and drops it if the transaction is
+        rolled back.
+        """
+        if connection.dialect.name != 'postgresql':
+            return
+        payload = "%s %s %s" % (cls.process_token(), obj.__class__.__name__,
+                                obj.id)
+        connection.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            channel=cls.NOTIFY_CHANNEL, payload=payload
+        )
+
+    @classmethod
+    def _cache_evict(cls, id):
+        """Remove one object from the in-memory caches, leaving the
+        rest of the cached objects alone.
+        """
+        cache = cls._cache
+        id_cache = cls._id_cache
+        if cache == cls.RESET or id_cache == cls.RESET:
+            # The caches were reset, or one of them was reset and the
+            # two are out of step. Either way, a reset is the only
+            # safe option.
+            cls.reset_cache()
+            return
+        obj = id_cache.pop(id, None)
+        if obj is None:
+            return
+        # The object's cache key may have changed since it was
+        # cached, so look for it by identity.
+        for key, value in cache.items():
+            if value is obj:
+                cache.pop(key, None)
+
+    @classmethod
+    def _cache_upsert(cls, obj, key=None, snapshot=None):
+        """Put a new or changed object into the in-memory caches,
+        replacing any older version of it, without reloading the rest
+        of the table.
+        """
+        cls._cache_evict(obj.id)
+        try:
+            cls._cache_insert(
+                obj, cls._cache, cls._id_cache, key=key, snapshot=snapshot
+            )
+        except Exception, e:
+            # The object isn't complete enough to have a cache key
+            # yet. It'll be cached when it's updated, or the next
+            # time it's looked up.
+            pass
+
+    @classmethod
+    def _upsert_on_commit(cls, _db, obj):
+        """Put an object that's been written to the database into the
+        in-memory caches once `_db`'s transaction is committed.
+
+        The caches are shared by every session in the process, so
+        other sessions mustn't see the object before then. Its cache
+        key and snapshot are calculated now, while it can still be
+        loaded from the database.
+        """
+        try:
+            key = obj.cache_key()
+            snapshot = None
+            if cls.SNAPSHOT_CLASS:
+                snapshot = cls.SNAPSHOT_CLASS.from_object(obj)
+        except Exception, e:
+            # As with _cache_upsert(), the object will be cached
+            # later.
+            return
+        _db.info.setdefault(cls.UNCOMMITTED_UPSERTS_KEY, []).append(
+            (obj, key, snapshot)
+        )
+
+    @classmethod
+    def _changed_in_transaction(cls, _db):
+        """Has `_db` changed any objects of this class that haven't
+        been committed yet?
+        """
+        info = getattr(_db, 'info', None)
+        if not info:
+            return False
+        return cls in info.get(cls.CHANGED_CLASSES_KEY, ())
+
+    @classmethod
+    def cached_object_changed(cls, target, deleted=False):
+        """Keep the in-memory caches up to date when an object is
+        inserted, updated or deleted in this process.
+
+        The old version of the object is evicted immediately. The new
+        version is put into the caches once the transaction is
+        committed.
+        """
+        target.__class__._cache_evict(target.id)
+        _db = Session.object_session(target)
+        if not _db:
+            return
+        _db.info.setdefault(cls.CHANGED_CLASSES_KEY, set()).add(
+            target.__class__
+        )
+        if not deleted:
+            _db.info.setdefault(cls.PENDING_UPSERTS_KEY, []).append(target)
+
     def cache_key(self):
         raise NotImplementedError()
 
     @classmethod
-    def _cache_insert(cls, obj, cache, id_cache):
+    def _cache_insert(cls, obj, cache, id_cache, key=None, snapshot=None):
         """Cache an object for later retrieval, possibly by a different
         database session.
+
+        :param key: The object's cache key, if it's already known.
+        :param snapshot: A snapshot of the object, if one was
+            already taken.
         """
-        key = obj.cache_key()
+        if key is None:
+            key = obj.cache_key()
         id = obj.id
+        if cls.SNAPSHOT_CLASS:
+            # Take the snapshot now, while the object is known to be
+            # usable. Once it's cached it may be detached from its
+            # session.
+            if snapshot is None:
+                snapshot = cls.SNAPSHOT_CLASS.from_object(obj)
+            obj._cache_snapshot = snapshot
         try:
             if cache != cls.RESET:
                 cache[key] = obj
@@ -229,6 +511,7 @@ class HasFullTableCache(object):
             cls._cache_insert(obj, cache, id_cache)
         cls._cache = cache
         cls._id_cache = id_cache
+        cls._cache_reloads += 1
 
     @classmethod
     def _cache_lookup(cls, _db, cache, cache_name, cache_key, lookup_hook):
@@ -237,8 +520,81 @@ class HasFullTableCache(object):
         Looks up `cache_key` in `cache` and calls `lookup_hook`
         to find/create it if it's not in there.
         """
+        obj, new = cls._cached_object(
+            _db, cache, cache_name, cache_key, lookup_hook
+        )
+        if obj and obj not in _db:
+            try:
+                obj = _db.merge(obj, load=False)
+            except Exception, e:
+                logging.error(
+                    "Unable to merge cached object %r into database session",
+                    obj, exc_info=e
+                )
+                # Try to look up a fresh copy of the object.
+                obj, new = lookup_hook()
+                if obj and obj in _db:
+                    logging.error("Was able to look up a fresh copy of %r", obj)
+                    return obj, new
+
+                # That didn't work. Re-raise the original exception.
+                logging.error("Unable to look up a fresh copy of %r", obj)
+                raise e
+        return obj, new
+
+    @classmethod
+    def _snapshot_lookup(cls, _db, cache, cache_name, cache_key, lookup_hook):
+        """Helper method used by both snapshot_by_id and
+        snapshot_by_cache_key.
+
+        Like _cache_lookup, but returns a CacheSnapshot of the object
+        instead of merging it into `_db`.
+        """
+        obj, new = cls._cached_object(
+            _db, cache, cache_name, cache_key, lookup_hook
+        )
+        if not obj:
+            return obj, new
+        snapshot = getattr(obj, '_cache_snapshot', None)
+        if obj in _db or snapshot is None:
+            # The object belongs to this session, and may have
+            # changed since it was last flushed. Take a fresh
+            # snapshot.
+            snapshot = cls.SNAPSHOT_CLASS.from_object(obj)
+        else:
+            # The cached object belongs to some other session, but
+            # this session may have its own copy of the same row. If
+            # that copy has unflushed changes, snapshot it instead.
+            # (Once it's flushed, it replaces the cached object.)
+            key = inspect(obj).key
+            local = None
+            if key is not None:
+                local = _db.identity_map.get(key)
+            if local is not None and inspect(local).modified:
+                snapshot = cls.SNAPSHOT_CLASS.from_object(local)
+        return snapshot, new
+
+    @classmethod
+    def _cached_object(cls, _db, cache, cache_name, cache_key, lookup_hook):
+        """Find an object in `cache`, or look it up with `lookup_hook`
+        and cache it.
+
+        The object may belong to some other database session.
+        """
         new = False
         obj = None
+        if cls._changed_in_transaction(_db):
+            # This session has uncommitted changes to objects of this
+            # class. It has to see its own versions of them, and
+            # other sessions mustn't, so the caches aren't used until
+            # the changes are committed.
+            cls._cache_misses += 1
+            if lookup_hook:
+                obj, new = lookup_hook()
+            if obj:
+                obj.__class__._upsert_on_commit(_db, obj)
+            return obj, new
+
         if cache == cls.RESET:
             # The cache has been reset. Populate it with the contents
             # of the table.
@@ -257,13 +613,16 @@ class HasFullTableCache(object):
                 # cache which passed the 'cache != cls.RESET' test.
                 pass
 
-        if not obj:
+        if obj:
+            cls._cache_hits += 1
+        else:
             # Either this object didn't exist when the cache was
             # populated, or the cache was reset while we were trying
             # to look it up.
             #
             # Give up on the cache and go direct to the database,
             # creating the object if necessary.
+            cls._cache_misses += 1
             if lookup_hook:
                 obj, new = lookup_hook()
             else:
@@ -275,24 +634,6 @@ class HasFullTableCache(object):
             # Stick the object in the caches, assuming they're not
             # currently in a reset state.
             cls._cache_insert(obj, cls._cache, cls._id_cache)
-
-        if obj and obj not in _db:
-            try:
-                obj = _db.merge(obj, load=False)
-            except Exception, e:
-                logging.error(
-                    "Unable to merge cached object %r into database session",
-                    obj, exc_info=e
-                )
-                # Try to look up a fresh copy of the object.
-                obj, new = lookup_hook()
-                if obj and obj in _db:
-                    logging.error("Was able to look up a fresh copy of %r", obj)
-                    return obj, new
-
-                # That didn't work. Re-raise the original exception.
-                logging.error("Unable to look up a fresh copy of %r", obj)
-                raise e
         return obj, new
 
     @classmethod
@@ -311,6 +652,194 @@ class HasFullTableCache(object):
             _db, cls._cache, '_cache', cache_key, lookup_hook
         )
 
+    @classmethod
+    def snapshot_by_id(cls, _db, id):
+        """Look up a read-only snapshot of an item by its unique
+        database ID.
+        """
+        def lookup_hook():
+            return get_one(_db, cls, id=id), False
+        snapshot, is_new = cls._snapshot_lookup(
+            _db, cls._id_cache, '_id_cache', id, lookup_hook
+        )
+        return snapshot
+
+    @classmethod
+    def snapshot_by_cache_key(cls, _db, cache_key, lookup_hook):
+        return cls._snapshot_lookup(
+            _db, cls._cache, '_cache', cache_key, lookup_hook
+        )
+
+    @classmethod
+    def collect_metrics(cls, registry):
+        """Copy the statistics for every full-table cache into a
+        MetricsRegistry.
+        """
+        for name, stats in cls.all_cache_stats().items():
+            for stat, description in (
+                    ('size', "The number of objects in a full-table cache."),
+                    ('hits', "Lookups answered by a full-table cache."),
+                    ('misses', "Lookups that missed a full-table cache."),
+                    ('reloads', "How often a full-table cache was reloaded."),
+            ):
+                registry.gauge(
+                    "full_table_cache_" + stat, description
+                ).set(stats[stat], table=name)
+
+metrics.registry.add_collector(HasFullTableCache.collect_metrics)
+
+class CacheInvalidationListener(Thread):
+    """Listens for notifications that another process changed an
+    object in a HasFullTableCache table, and evicts that object from
+    this process's caches.
+
+    While this is running, this process is also told when the site
+    configuration changes, so there's no need to poll the database
+    to find out.
+    """
+
+    # The payload that announces a change to the site configuration.
+    SITE_CONFIGURATION = 'site_configuration'
+    TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+    # How often, in seconds, to stop waiting for a notification and
+    # check whether the thread has been stopped.
+    POLL_INTERVAL = 5
+
+    # How long, in seconds, to wait before reconnecting after the
+    # connection is lost.
+    RECONNECT_DELAY = 30
+
+    # The listener running in this process, if any.
+    instance = None
+
+    log = logging.getLogger("Cache invalidation listener")
+
+    def __init__(self, engine):
+        super(CacheInvalidationListener, self).__init__(
+            name="Cache invalidation listener"
+        )
+        self.daemon = True
+        self.engine = engine
+        self.stopped = Event()
+
+    @classmethod
+    def start_for_engine(cls, engine):
+        """Make sure a listener is running in this process.
+
+        The listener holds a database connection of its own, so only
+        long-running processes, such as the web application and the
+        monitor scripts, should start one.
+
+        :param engine: An Engine, or a Connection to its database.
+
+        :return: The running CacheInvalidationListener, or None if the
+        database doesn't support LISTEN/NOTIFY.
+        """
+        if cls.instance and cls.instance.is_alive():
+            return cls.instance
+        if os.environ.get('TESTING'):
+            return None
+        engine = engine.engine
+        if engine.dialect.name != 'postgresql':
+            return None
+        cls.instance = cls(engine)
+        cls.instance.start()
+        return cls.instance
+
+    @classmethod
+    def notify_site_configuration_change(cls, _db, timestamp):
+        """Tell other processes that the site configuration changed."""
+        if _db.get_bind().dialect.name != 'postgresql':
+            return
+        payload = "%s %s %s" % (
+            HasFullTableCache.process_token(), cls.SITE_CONFIGURATION,
+            timestamp.strftime(cls.TIMESTAMP_FORMAT)
+        )
+        _db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            dict(channel=HasFullTableCache.NOTIFY_CHANNEL, payload=payload)
+        )
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.listen()
+            except Exception, e:
+                self.log.error(
+                    "Stopped listening for cache invalidations", exc_info=e
+                )
+            finally:
+                Configuration.instance[
+                    Configuration.SITE_CONFIGURATION_CHANGES_PUSHED
+                ] = None
+            if not self.stopped.is_set():
+                self.stopped.wait(self.RECONNECT_DELAY)
+
+    def listen(self):
+        # This connection is held for the life of the thread, so it's
+        # taken out of the connection pool.
+        connection = self.engine.raw_connection()
+        connection.detach()
+        try:
+            dbapi_connection = connection.connection
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute("LISTEN %s;" % HasFullTableCache.NOTIFY_CHANNEL)
+
+            # Anything that changed while we weren't listening is
+            # lost, so start over from scratch.
+            HasFullTableCache.reset_all_caches()
+            # A process forked from this one doesn't inherit this
+            # thread, so the flag only applies to this process.
+            Configuration.instance[
+                Configuration.SITE_CONFIGURATION_CHANGES_PUSHED
+            ] = os.getpid()
+            self.log.info("Listening for cache invalidations.")
+
+            while not self.stopped.is_set():
+                ready, ignore, ignore = select_module.select(
+                    [dbapi_connection], [], [], self.POLL_INTERVAL
+                )
+                if not ready:
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    self.process(notification.payload)
+        finally:
+            connection.close()
+
+    def process(self, payload):
+        """Act on a single notification."""
+        try:
+            token, name, value = payload.split(" ", 2)
+        except ValueError, e:
+            self.log.error("Unrecognized notification: %r", payload)
+            return
+        if token == HasFullTableCache.process_token():
+            # We sent this notification ourselves.
+            return
+
+        if name == self.SITE_CONFIGURATION:
+            timestamp = datetime.datetime.strptime(
+                value, self.TIMESTAMP_FORMAT
+            )
+            Configuration.site_configuration_last_update(
+                None, known_value=timestamp
+            )
+            return
+
+        cls = HasFullTableCache.cached_classes().get(name)
+        if not cls:
+            self.log.error("Unrecognized notification: %r", payload)
+            return
+        cls._cache_evict(int(value))
+
+
 class SessionManager(object):
 
     # Materialized views need to be created and indexed from SQL
@@ -331,11 +860,26 @@ class SessionManager(object):
     RECURSIVE_EQUIVALENTS_FUNCTION = 'recursive_equivalents.sql'
 
     engine_for_url = {}
+    replica_engine_for_url = {}
+
+    _schema_fingerprint = None
 
     @classmethod
     def engine(cls, url=None):
         url = url or Configuration.database_url()
-        return create_engine(url, echo=DEBUG)
+        options = Configuration.database_engine_options()
+        return create_engine(url, echo=DEBUG, **options)
+
+    @classmethod
+    def replica_engine(cls, url):
+        """Find or create the Engine for a read replica.
+
+        The replica's schema is whatever the primary's is, so nothing
+        is done to initialize it.
+        """
+        if url not in cls.replica_engine_for_url:
+            cls.replica_engine_for_url[url] = cls.engine(url)
+        return cls.replica_engine_for_url[url]
 
     @classmethod
     def sessionmaker(cls, url=None, session=None):
@@ -359,6 +903,49 @@ class SessionManager(object):
             return engine, engine.connect()
 
         engine = cls.engine(url)
+        if cls.schema_is_current(engine):
+            # Nothing about the schema has changed since the last time
+            # it was brought up to date, so there's no need to check it.
+            logging.debug("Database schema is current.")
+        else:
+            cls.update_schema(engine)
+
+        if create_materialized_work_class:
+            class MaterializedWorkWithGenre(Base, BaseMaterializedWork):
+                __table__ = Table(
+                    cls.MATERIALIZED_VIEW_LANES,
+                    Base.metadata,
+                    Column('works_id', Integer, primary_key=True, index=True),
+                    Column('workgenres_id', Integer, primary_key=True, index=True),
+                    Column('list_id', Integer, ForeignKey('customlists.id'),
+                           primary_key=True, index=True),
+                    Column(
+                        'list_edition_id', Integer, ForeignKey('editions.id'),
+                        primary_key=True, index=True
+                    ),
+                    Column(
+                        'license_pool_id', Integer,
+                        ForeignKey('licensepools.id'), primary_key=True,
+                        index=True
+                    ),
+                    autoload=True,
+                    autoload_with=engine
+                )
+                license_pool = relationship(
+                    LicensePool,
+                    primaryjoin="LicensePool.id==MaterializedWorkWithGenre.license_pool_id",
+                    foreign_keys=LicensePool.id, lazy='joined', uselist=False)
+
+            globals()['MaterializedWorkWithGenre'] = MaterializedWorkWithGenre
+
+        cls.engine_for_url[url] = engine
+        return engine, engine.connect()
+
+    @classmethod
+    def update_schema(cls, engine):
+        """Create any tables, materialized views and SQL functions
+        that don't exist yet, then record that the schema is current.
+        """
         Base.metadata.create_all(engine)
 
         base_path = os.path.split(__file__)[0]
@@ -410,39 +997,102 @@ class SessionManager(object):
             sql = open(resource_file).read()
             connection.execute(sql)
 
-        if connection:
-            connection.close()
+        cls.stamp_schema(connection)
+        connection.close()
 
-        if create_materialized_work_class:
-            class MaterializedWorkWithGenre(Base, BaseMaterializedWork):
-                __table__ = Table(
-                    cls.MATERIALIZED_VIEW_LANES,
-                    Base.metadata,
-                    Column('works_id', Integer, primary_key=True, index=True),
-                    Column('workgenres_id', Integer, primary_key=True, index=True),
-                    Column('list_id', Integer, ForeignKey('customlists.id'),
-                           primary_key=True, index=True),
-                    Column(
-                        'list_edition_id', Integer, ForeignKey('editions.id'),
-                        primary_key=True, index=True
-                    ),
-                    Column(
-                        'license_pool_id', Integer,
-                        ForeignKey('licensepools.id'), primary_key=True,
-                        index=True
-                    ),
-                    autoload=True,
-                    autoload_with=engine
+    @classmethod
+    def schema_fingerprint(cls):
+        """Summarize the tables, materialized views and SQL functions
+        this code expects the database to have.
+
+        :return: A string that changes whenever any of those change.
+        """
+        if cls._schema_fingerprint:
+            return cls._schema_fingerprint
+        digest = md5.new()
+        for name, table in sorted(Base.metadata.tables.items()):
+            if name in cls.MATERIALIZED_VIEWS:
+                # This table is loaded from the database, not defined
+                # here.
+                continue
+            digest.update(name)
+            for column in table.columns:
+                digest.update("%s %r %s %s" % (
+                    column.name, column.type, column.nullable,
+                    column.primary_key
+                ))
+            for index in sorted(table.indexes, key=lambda x: x.name):
+                digest.update(
+                    "%s %s" % (index.name, [x.name for x in index.columns])
                 )
-                license_pool = relationship(
-                    LicensePool,
-                    primaryjoin="LicensePool.id==MaterializedWorkWithGenre.license_pool_id",
-                    foreign_keys=LicensePool.id, lazy='joined', uselist=False)
+        resource_path = os.path.join(os.path.split(__file__)[0], "files")
+        for filename in sorted(cls.MATERIALIZED_VIEWS.values()) + [
+                cls.RECURSIVE_EQUIVALENTS_FUNCTION]:
+            digest.update(open(os.path.join(resource_path, filename)).read())
+        cls._schema_fingerprint = digest.hexdigest()
+        return cls._schema_fingerprint
 
-            globals()['MaterializedWorkWithGenre'] = MaterializedWorkWithGenre
+    @classmethod
+    def schema_is_current(cls, bind):
+        """Has the database schema been brought up to date with this
+        version of the code?
 
-        cls.engine_for_url[url] = engine
-        return engine, engine.connect()
+        :param bind: An Engine or Connection.
+        """
+        connection = bind.connect()
+        try:
+            return (cls._has_fingerprint(connection)
+                    and cls._has_views_and_functions(connection))
+        except sa_exc.DBAPIError, e:
+            # Most likely the schemaversion table doesn't exist yet.
+            return False
+        finally:
+            connection.close()
+
+    @classmethod
+    def _has_fingerprint(cls, connection):
+        query = select([schemaversion.c.fingerprint]).where(
+            schemaversion.c.fingerprint==cls.schema_fingerprint()
+        )
+        return connection.execute(query).first() is not None
+
+    @classmethod
+    def _has_views_and_functions(cls, connection):
+        # A migration may drop a materialized view or SQL function and
+        # leave it to be recreated, without changing the fingerprint.
+        views = cls.MATERIALIZED_VIEWS.keys()
+        query = text(
+            "SELECT (SELECT count(*) FROM pg_class WHERE relname = ANY(:views)),"
+            " EXISTS (SELECT 1 FROM pg_proc WHERE proname = :function)"
+        )
+        view_count, has_function = connection.execute(
+            query, views=views, function='fn_recursive_equivalents'
+        ).first()
+        return view_count == len(views) and has_function
+
+    @classmethod
+    def stamp_schema(cls, connection):
+        """Record that the schema is current.
+
+        Processes that import different sets of modules expect
+        different sets of tables, so more than one fingerprint may be
+        recorded.
+        """
+        if cls._has_fingerprint(connection):
+            return
+        connection.execute(
+            schemaversion.insert(), fingerprint=cls.schema_fingerprint(),
+            created=datetime.datetime.utcnow()
+        )
+
+    @classmethod
+    def unstamp_schema(cls, connection):
+        """Forget that the schema was ever current, so the next process
+        to start up checks it and creates anything that's missing.
+
+        :param connection: A Connection or Session.
+        """
+        connection.execute(schemaversion.delete())
 
     @classmethod
     def refresh_materialized_views(self, _db):
@@ -456,14 +1106,26 @@ class SessionManager(object):
             lane.update_size(_db)
 
     @classmethod
-    def session(cls, url, initialize_data=True):
+    def session(cls, url, initialize_data=True, replica_url=None):
+        """Create a database session.
+
+        :param replica_url: The URL to a read replica of the database.
+            If this is provided, the session will be a
+            ReplicaRoutingSession, which sends some read-only queries
+            to the replica.
+        """
         engine = connection = 0
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=sa_exc.SAWarning)
             engine, connection = cls.initialize(
                 url, create_materialized_work_class=initialize_data
             )
-        session = Session(connection)
+        if replica_url:
+            session = ReplicaRoutingSession(
+                connection, replica_bind=cls.replica_engine(replica_url)
+            )
+        else:
+            session = Session(connection)
         if initialize_data:
             session = cls.initialize_data(session)
         return session
@@ -478,11 +1140,6 @@ class SessionManager(object):
 
         # Create any genres not in the database.
         for g in classifier.genres.values():
-            # TODO: On the very first startup this is rather expensive
-            # because the cache is invalidated every time a Genre is
-            # created, then populated the next time a Genre is looked
-            # up. This wouldn't be a big problem, but this also happens
-            # on setup for the unit tests.
             Genre.lookup(session, g, autocreate=True)
 
         # Make sure that the mechanisms fulfillable by the default
@@ -508,6 +1165,106 @@ class SessionManager(object):
         # it was updated by cls.update_timestamps_table
         return session
 
+class PreloadedLookups(object):
+    """Answers get_one() lookups from objects that were loaded in bulk
+    ahead of time.
+
+    Code that looks up or creates one object at a time, like
+    Metadata.apply(), can be run over a large batch of objects
+    without sending a SELECT for every lookup. Load the objects the
+    batch will need with load(), install() the PreloadedLookups in
+    the database session, and run the code as usual.
+    """
+
+    # While installed, a PreloadedLookups is kept in Session.info
+    # under this key.
+    KEY = 'preloaded_lookups'
+
+    def __init__(self):
+        # Maps (model, field names) to a dictionary mapping field
+        # values to objects.
+        self.objects = dict()
+
+        # Maps (model, field names) to a function that decides whether
+        # a set of field values is known not to exist if there's no
+        # corresponding object.
+        self.covers = dict()
+
+        # How many lookups were answered without a query?
+        self.hits = 0
+
+    @classmethod
+    def for_session(cls, _db):
+        """Find the PreloadedLookups installed in a database session, if any."""
+        if not isinstance(_db, Session):
+            return None
+        return _db.info.get(cls.KEY)
+
+    def install(self, _db):
+        _db.info[self.KEY] = self
+
+    @classmethod
+    def uninstall(cls, _db):
+        _db.info.pop(cls.KEY, None)
+
+    def load(self, model, fields, objects, covers=None):
+        """Make some objects available to get_one().
+
+        :param fields: The keyword arguments get_one() will be called
+            with to look up these objects.
+        :param objects: The objects.
+        :param covers: A function that takes a tuple of values for
+            `fields` (in alphabetical order of field name) and returns
+            True if all objects with those values were loaded. For
+            those values, get_one() will return None if there's no
+            corresponding object.
+        """
+        fields = tuple(sorted(fields))
+        by_key = self.objects.setdefault((model, fields), dict())
+        if covers:
+            self.covers[(model, fields)] = covers
+        for obj in objects:
+            key = tuple(getattr(obj, field) for field in fields)
+            by_key.setdefault(key, obj)
+
+    def add(self, obj):
+        """Keep track of an object that was just created."""
+        for (model, fields), by_key in self.objects.items():
+            if isinstance(obj, model):
+                key = tuple(getattr(obj, field) for field in fields)
+                by_key.setdefault(key, obj)
+
+    def find(self, _db, model, kwargs):
+        """Try to find an object the way get_one() would.
+
+        :return: A 2-tuple (found, object). If `found` is False, the
+            lookup must be done with a query.
+        """
+        fields = tuple(sorted(kwargs))
+        by_key = self.objects.get((model, fields))
+        if by_key is None:
+            return False, None
+        key = tuple(kwargs[field] for field in fields)
+        obj = by_key.get(key)
+        if obj is None:
+            covers = self.covers.get((model, fields))
+            if not covers or not covers(key):
+                return False, None
+            # A query would find objects that are about to be
+            # inserted, so look at those as well.
+            for pending in _db.new:
+                if isinstance(pending, model):
+                    self.add(pending)
+            obj = by_key.get(key)
+        if obj is not None and (obj in _db.deleted
+                                or Session.object_session(obj) is not _db):
+            # This object is gone.
+            del by_key[key]
+            return False, None
+        self.hits += 1
+        return True, obj
+
+
 def get_one(db, model, on_multiple='error', constraint=None, **kwargs):
     """Gets an object from the database based on its attributes.
 
@@ -520,6 +1277,13 @@ def get_one(db, model, on_multiple='error', constraint=None, **kwargs):
         constraint = kwargs['constraint']
         del kwargs['constraint']
 
+    if constraint is None:
+        lookups = PreloadedLookups.for_session(db)
+        if lookups:
+            found, one = lookups.find(db, model, kwargs)
+            if found:
+                return one
+
     q = db.query(model).filter_by(**kwargs)
     if constraint is not None:
         q = q.filter(constraint)
@@ -556,6 +1320,9 @@ def get_one_or_create(db, model, create_method='',
                     del kwargs[key]
             obj = create(db, model, create_method, create_method_kwargs, **kwargs)
             __transaction.commit()
+            lookups = PreloadedLookups.for_session(db)
+            if lookups:
+                lookups.add(obj[0])
             return obj
         except IntegrityError, e:
             logging.info(
@@ -589,6 +1356,16 @@ def create(db, model, create_method='',
 
 Base = declarative_base()
 
+# Once the database schema has been brought up to date, a fingerprint
+# of the schema is recorded here, so other processes running the same
+# code can skip checking it. See SessionManager.schema_is_current.
+schemaversion = Table(
+    'schemaversion', Base.metadata,
+    Column('fingerprint', String, primary_key=True),
+    Column('created', DateTime),
+)
+
+
 class Patron(Base):
 
     __tablename__ = 'patrons'
@@ -1141,7 +1918,12 @@ class DataSource(Base, HasFullTableCache):
 
     @classmethod
     def lookup(cls, _db, name, autocreate=False, offers_licenses=False,
-               primary_identifier_type=None):
+               primary_identifier_type=None, snapshot=False):
+        """Find (or create) a DataSource by name.
+
+        :param snapshot: If this is True, a read-only
+            DataSourceSnapshot is returned instead of a DataSource.
+        """
         # Turn a deprecated name (e.g. "3M" into the current name
         # (e.g. "Bibliotheca").
         name = cls.DEPRECATED_NAMES.get(name, name)
@@ -1165,7 +1947,10 @@ class DataSource(Base, HasFullTableCache):
 
         # Look up the DataSource in the full-table cache, falling back
         # to the database if necessary.
-        obj, is_new = cls.by_cache_key(_db, name, lookup_hook)
+        if snapshot:
+            obj, is_new = cls.snapshot_by_cache_key(_db, name, lookup_hook)
+        else:
+            obj, is_new = cls.by_cache_key(_db, name, lookup_hook)
         return obj
 
     URI_PREFIX = u"http://librarysimplified.org/terms/sources/"
@@ -1283,6 +2068,20 @@ class DataSource(Base, HasFullTableCache):
 
             yield obj
 
+
+class DataSourceSnapshot(CacheSnapshot):
+    """A read-only copy of a DataSource."""
+
+    FIELDS = __slots__ = (
+        'id', 'name', 'offers_licenses', 'primary_identifier_type'
+    )
+
+    URI_PREFIX = DataSource.URI_PREFIX
+    uri = DataSource.uri
+
+DataSource.SNAPSHOT_CLASS = DataSourceSnapshot
+
+
 class BaseCoverageRecord(object):
     """Contains useful constants used by both CoverageRecord and
     WorkCoverageRecord.
@@ -1455,14 +2254,21 @@ class CoverageRecord(Base, BaseCoverageRecord):
             raise ValueError(
                 "Cannot create a coverage record for %r." % edition)
         timestamp = timestamp or datetime.datetime.utcnow()
-        coverage_record, is_new = get_one_or_create(
-            _db, CoverageRecord,
-            identifier=identifier,
-            data_source=data_source,
-            operation=operation,
-            collection=collection,
-            on_multiple='interchangeable'
-        )
+        found = None
+        batch = PresentationBatch.for_session(_db)
+        if batch and not collection:
+            found = batch.coverage_record(identifier, data_source, operation)
+        if found:
+            coverage_record, is_new = found
+        else:
+            coverage_record, is_new = get_one_or_create(
+                _db, CoverageRecord,
+                identifier=identifier,
+                data_source=data_source,
+                operation=operation,
+                collection=collection,
+                on_multiple='interchangeable'
+            )
         coverage_record.status = status
         coverage_record.timestamp = timestamp
         return coverage_record, is_new
@@ -1625,12 +2431,19 @@ class WorkCoverageRecord(Base, BaseCoverageRecord):
                 status=CoverageRecord.SUCCESS):
         _db = Session.object_session(work)
         timestamp = timestamp or datetime.datetime.utcnow()
-        coverage_record, is_new = get_one_or_create(
-            _db, WorkCoverageRecord,
-            work=work,
-            operation=operation,
-            on_multiple='interchangeable'
-        )
+        found = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            found = batch.work_coverage_record(work, operation)
+        if found:
+            coverage_record, is_new = found
+        else:
+            coverage_record, is_new = get_one_or_create(
+                _db, WorkCoverageRecord,
+                work=work,
+                operation=operation,
+                on_multiple='interchangeable'
+            )
         coverage_record.status = status
         coverage_record.timestamp = timestamp
         return coverage_record, is_new
@@ -1750,6 +2563,221 @@ class Equivalency(Base):
             q = q.filter(~Equivalency.id.in_(exclude_ids))
         return q
 
+class EquivalencyClosure(Base):
+    """A precalculated answer to the question "Which Identifiers are
+    equivalent to this one, and how strongly?"
+
+    Each row says that `equivalent` can be reached from `identifier`
+    by following `depth` Equivalencies, and that the product of their
+    strengths is `strength`. A row is only kept for a given depth if
+    it's stronger than every shorter path between the two Identifiers.
+    An Identifier is never recorded as equivalent to itself.
+
+    This table is kept up to date as Equivalencies are created,
+    changed, and deleted. RebuildEquivalencyClosureScript will
+    rebuild it from scratch.
+    """
+    __tablename__ = 'equivalencyclosures'
+
+    # Paths longer than this are not recorded.
+    MAX_DEPTH = 5
+
+    # Session.info key for Identifiers whose rows need to be refreshed
+    # after the current flush.
+    CHANGED_IDENTIFIERS = 'equivalency_closure_changed_identifier_ids'
+
+    identifier_id = Column(
+        Integer, ForeignKey('identifiers.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    equivalent_id = Column(
+        Integer, ForeignKey('identifiers.id', ondelete='CASCADE'),
+        primary_key=True, index=True
+    )
+    depth = Column(Integer, primary_key=True)
+    strength = Column(Float)
+
+    @classmethod
+    def calculate(cls, _db, identifier_ids):
+        """Calculate the rows for the given Identifiers from the
+        Equivalencies currently in the database.
+
+        Equivalencies with a strength of zero or less are ignored.
+
+        :return: A list of dictionaries suitable for inserting into
+        the equivalencyclosures table.
+        """
+        equivalents = Equivalency.__table__.c
+
+        # Load every Equivalency that's close enough to one of these
+        # Identifiers to matter, a level at a time.
+        neighbors = defaultdict(dict)
+        seen = set(identifier_ids)
+        frontier = set(identifier_ids)
+        for i in range(cls.MAX_DEPTH):
+            if not frontier:
+                break
+            qu = select(
+                [equivalents.input_id, equivalents.output_id,
+                 equivalents.strength]
+            ).where(
+                equivalents.strength > 0
+            ).where(
+                or_(equivalents.input_id.in_(frontier),
+                    equivalents.output_id.in_(frontier))
+            )
+            found = set()
+            for input_id, output_id, strength in _db.execute(qu):
+                if None in (input_id, output_id) or input_id == output_id:
+                    continue
+                for a, b in ((input_id, output_id), (output_id, input_id)):
+                    if strength > neighbors[a].get(b, 0):
+                        neighbors[a][b] = strength
+                found.add(input_id)
+                found.add(output_id)
+            frontier = found - seen
+            seen.update(found)
+
+        rows = []
+        for identifier_id in set(identifier_ids):
+            # best[x] is the strongest path to x found so far, using
+            # no more than `depth` Equivalencies.
+            best = {identifier_id: 1}
+            improved = [identifier_id]
+            for depth in range(1, cls.MAX_DEPTH+1):
+                stronger = dict()
+                for node in improved:
+                    for neighbor, strength in neighbors[node].items():
+                        strength = best[node] * strength
+                        if strength > max(best.get(neighbor, 0),
+                                          stronger.get(neighbor, 0)):
+                            stronger[neighbor] = strength
+                if not stronger:
+                    break
+                best.update(stronger)
+                improved = stronger.keys()
+                for equivalent_id, strength in stronger.items():
+                    if equivalent_id == identifier_id:
+                        continue
+                    rows.append(dict(
+                        identifier_id=identifier_id,
+                        equivalent_id=equivalent_id,
+                        depth=depth, strength=strength
+                    ))
+        return rows
+
+    @classmethod
+    def refresh(cls, _db, identifier_ids):
+        """Bring the rows up to date after the Equivalencies involving
+        the given Identifiers have changed.
+
+        Any Identifier whose rows might change as a result can already
+        reach one of these Identifiers, so the rows to recalculate can
+        be found in the table itself.
+        """
+        identifier_ids = set(x for x in identifier_ids if x is not None)
+        if not identifier_ids:
+            return
+        table = cls.__table__
+        affected = set(identifier_ids)
+        qu = select([table.c.identifier_id]).where(
+            table.c.equivalent_id.in_(identifier_ids)
+        ).distinct()
+        affected.update(x for [x] in _db.execute(qu))
+        cls.rebuild(_db, affected)
+
+    @classmethod
+    def rebuild(cls, _db, identifier_ids):
+        """Replace the rows for the given Identifiers."""
+        table = cls.__table__
+        identifier_ids = list(identifier_ids)
+        _db.execute(
+            table.delete().where(table.c.identifier_id.in_(identifier_ids))
+        )
+        rows = cls.calculate(_db, identifier_ids)
+        if rows:
+            _db.execute(table.insert(), rows)
+
+
+@event.listens_for(Equivalency, 'after_insert')
+@event.listens_for(Equivalency, 'after_update')
+@event.listens_for(Equivalency, 'after_delete')
+def equivalency_changed(mapper, connection, target):
+    """Make a note of the Identifiers whose EquivalencyClosure rows
+    need to be refreshed once this flush is done.
+    """
+    _db = Session.object_session(target)
+    if not _db:
+        return
+    changed = _db.info.setdefault(EquivalencyClosure.CHANGED_IDENTIFIERS, set())
+    changed.add(target.input_id)
+    changed.add(target.output_id)
+    for field in ('input_id', 'output_id'):
+        # If an Equivalency is changed to point somewhere else, the
+        # Identifier it used to point to is also affected.
+        changed.update(get_history(target, field).deleted or [])
+
+@event.listens_for(Session, 'after_flush')
+def refresh_equivalency_closure(session, flush_context):
+    changed = session.info.pop(EquivalencyClosure.CHANGED_IDENTIFIERS, None)
+    if changed:
+        EquivalencyClosure.refresh(session, changed)
+        EquivalentIdentifierCache.reset(session)
+
+
+class EquivalentIdentifierCache(object):
+    """Remembers the results of
+    Identifier.recursively_equivalent_identifier_ids until the end of
+    the current database transaction, or until an Equivalency changes.
+
+    Calculating a Work's presentation looks up the same equivalent
+    identifiers several times over: to classify the work, judge its
+    quality, choose its summary and cover, and build its OPDS entries.
+    """
+
+    # The cache is kept in Session.info under this key.
+    KEY = 'equivalent_identifier_cache'
+
+    def __init__(self):
+        # Maps (identifier_id, levels, threshold, cutoff) to a list of
+        # equivalent identifier IDs.
+        self.results = dict()
+
+        # How many lookups needed a database query?
+        self.queries = 0
+
+        # How many lookups were answered entirely from the cache?
+        self.saved = 0
+
+    @classmethod
+    def for_session(cls, _db):
+        """Find or create the cache for a database session.
+
+        :return: An EquivalentIdentifierCache, or None if `_db` isn't
+        a Session.
+        """
+        if not isinstance(_db, Session):
+            return None
+        return _db.info.setdefault(cls.KEY, cls())
+
+    @classmethod
+    def reset(cls, _db):
+        """Forget everything that was cached for a database session.
+
+        The counters are kept, so they cover the life of the session.
+        """
+        cache = _db.info.get(cls.KEY)
+        if cache:
+            cache.results.clear()
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def reset_equivalent_identifier_cache(session):
+    # Another transaction may change the Equivalencies, so nothing
+    # is cached past the end of this one.
+    EquivalentIdentifierCache.reset(session)
+
+
 class Identifier(Base):
     """A way of uniquely referring to a particular edition.
     """
@@ -2157,9 +3185,34 @@ class Identifier(Base):
         like `Edition.primary_identifier_id` if the query will be used as
         a subquery.
 
-        This uses the function defined in files/recursive_equivalents.sql.
+        This reads from the EquivalencyClosure table, unless `levels`
+        is too deep for that table, in which case it uses the function
+        defined in files/recursive_equivalents.sql.
         """
-        return select([func.fn_recursive_equivalents(identifier_id_column, levels, threshold, cutoff)])
+        if levels > EquivalencyClosure.MAX_DEPTH:
+            return select([func.fn_recursive_equivalents(identifier_id_column, levels, threshold, cutoff)])
+
+        closure = EquivalencyClosure.__table__.c
+        equivalents = select([closure.equivalent_id]).where(
+            closure.identifier_id==identifier_id_column
+        ).where(
+            closure.depth <= levels
+        ).where(
+            closure.strength > threshold
+        ).group_by(closure.equivalent_id)
+        if cutoff:
+            equivalents = equivalents.order_by(
+                func.min(closure.depth), func.max(closure.strength).desc()
+            ).limit(levels * cutoff)
+
+        # An Identifier is equivalent to itself. Adding it to the array
+        # of equivalents (rather than using a UNION) keeps this a
+        # single SELECT that callers can add conditions to.
+        return select([
+            func.unnest(func.array_append(
+                func.array(equivalents.as_scalar()), identifier_id_column
+            ))
+        ])
 
     @classmethod
     def recursively_equivalent_identifier_ids(
@@ -2167,7 +3220,9 @@ class Identifier(Base):
         """All Identifier IDs equivalent to the given set of Identifier
         IDs at the given confidence threshold.
 
-        This uses the function defined in files/recursive_equivalents.sql.
+        This reads from the EquivalencyClosure table, unless `levels`
+        is too deep for that table, in which case it uses the function
+        defined in files/recursive_equivalents.sql.
 
         Four levels is enough to go from a Gutenberg text to an ISBN.
         Gutenberg ID -> OCLC Work IS -> OCLC Number -> ISBN
@@ -2175,18 +3230,81 @@ class Identifier(Base):
         Returns a dictionary mapping each ID in the original to a
         list of equivalent IDs.
 
-        :param cutoff: For each recursion level, results will be cut
-        off at this many results. (The maximum total number of results
-        is levels * cutoff)
+        :param cutoff: Results will be cut off at levels * cutoff
+        equivalents, with the closest and strongest equivalents coming
+        first.
         """
-        query = select([Identifier.id, func.fn_recursive_equivalents(Identifier.id, levels, threshold, cutoff)],
-                       Identifier.id.in_(identifier_ids))
-        results = _db.execute(query)
+        identifier_ids = list(identifier_ids)
+        cache = EquivalentIdentifierCache.for_session(_db)
+        if cache is None:
+            return cls._recursively_equivalent_identifier_ids(
+                _db, identifier_ids, levels, threshold, cutoff
+            )
+
+        # A query would flush any pending Equivalencies before running,
+        # invalidating the cache if necessary. Do the same thing even
+        # if the answer turns out to be cached.
+        if _db.autoflush:
+            _db.flush()
+
+        def key(identifier_id):
+            return (identifier_id, levels, threshold, cutoff)
+        missing = [x for x in identifier_ids if key(x) not in cache.results]
+        if missing:
+            cache.queries += 1
+            found = cls._recursively_equivalent_identifier_ids(
+                _db, missing, levels, threshold, cutoff
+            )
+            for identifier_id in missing:
+                cache.results[key(identifier_id)] = found.get(identifier_id, [])
+        else:
+            cache.saved += 1
+
         equivalents = defaultdict(list)
-        for r in results:
-            original = r[0]
-            equivalent = r[1]
-            equivalents[original].append(equivalent)
+        for identifier_id in identifier_ids:
+            result = cache.results[key(identifier_id)]
+            if result:
+                equivalents[identifier_id] = list(result)
+        return equivalents
+
+    @classmethod
+    def _recursively_equivalent_identifier_ids(
+            cls, _db, identifier_ids, levels, threshold, cutoff):
+        """Look up equivalent identifier IDs without using the cache."""
+        equivalents = defaultdict(list)
+        if levels > EquivalencyClosure.MAX_DEPTH:
+            query = select([Identifier.id, func.fn_recursive_equivalents(Identifier.id, levels, threshold, cutoff)],
+                           Identifier.id.in_(identifier_ids))
+            results = _db.execute(query)
+            for r in results:
+                original = r[0]
+                equivalent = r[1]
+                equivalents[original].append(equivalent)
+            return equivalents
+
+        identifier_ids = list(identifier_ids)
+        if not identifier_ids:
+            return equivalents
+        closure = EquivalencyClosure.__table__.c
+        query = select(
+            [closure.identifier_id, closure.equivalent_id,
+             func.min(closure.depth), func.max(closure.strength)]
+        ).where(
+            closure.identifier_id.in_(identifier_ids)
+        ).where(
+            closure.depth <= levels
+        ).where(
+            closure.strength > threshold
+        ).group_by(closure.identifier_id, closure.equivalent_id)
+
+        found = defaultdict(list)
+        for original, equivalent, depth, strength in _db.execute(query):
+            found[original].append((depth, -strength, equivalent))
+        for original in identifier_ids:
+            matches = sorted(found[original])
+            if cutoff:
+                matches = matches[:levels * cutoff]
+            equivalents[original] = [original] + [x[-1] for x in matches]
         return equivalents
 
     def equivalent_identifier_ids(self, levels=5, threshold=0.5):
@@ -2368,10 +3486,17 @@ class Identifier(Base):
         # Find all image resources associated with any of
         # these identifiers.
         rel = rel or Hyperlink.IMAGE
-        images = cls.resources_for_identifier_ids(
-            _db, identifier_ids, rel)
-        images = images.join(Resource.representation)
-        images = images.all()
+        images = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            images = batch.resources_for(identifier_ids, rel)
+        if images is None:
+            images = cls.resources_for_identifier_ids(
+                _db, identifier_ids, rel)
+            images = images.join(Resource.representation)
+            images = images.all()
+        else:
+            images = [x for x in images if x.representation]
 
         champions = Resource.best_covers_among(images)
         if not champions:
@@ -2414,8 +3539,15 @@ class Identifier(Base):
         # Find all rel="description" resources associated with any of
         # these records.
         rels = [Hyperlink.DESCRIPTION, Hyperlink.SHORT_DESCRIPTION]
-        descriptions = cls.resources_for_identifier_ids(
-            _db, identifier_ids, rels, privileged_data_source).all()
+        descriptions = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            descriptions = batch.resources_for(
+                identifier_ids, rels, privileged_data_source
+            )
+        if descriptions is None:
+            descriptions = cls.resources_for_identifier_ids(
+                _db, identifier_ids, rels, privileged_data_source).all()
 
         champion = None
         # Add each resource's content to the evaluator's corpus.
@@ -2551,6 +3683,13 @@ class Contributor(Base):
     # the name most familiar to readers.
     display_name = Column(Unicode, index=True)
 
+    # This is display_name as normalized by
+    # normalize_contributor_name_for_matching(), so that display names
+    # which differ only in case, punctuation or accents can be
+    # matched with an index lookup. It's kept up to date whenever
+    # display_name changes.
+    normalized_name = Column(Unicode, index=True)
+
     # This is a short version of the contributor's name, displayed in
     # situations where the full name is too long. For corporate contributors
     # this value will be None.
@@ -2694,6 +3833,7 @@ class Contributor(Base):
                 "Cannot look up a Contributor without any identifying "
                 "information whatsoever!")
 
+        cache = ContributorCache.for_session(_db)
         if sort_name and not lc and not viaf:
             # We will not create a Contributor based solely on a name
             # unless there is no existing Contributor with that name.
@@ -2702,11 +3842,14 @@ class Contributor(Base):
             # return all of them.
             #
             # We currently do not check aliases when doing name lookups.
+            key = ContributorCache.sort_name_key(sort_name)
+            if cache:
+                cached = cache.get(_db, key)
+                if cached:
+                    return cached, new
             q = _db.query(Contributor).filter(Contributor.sort_name==sort_name)
             contributors = q.all()
-            if contributors:
-                return contributors, new
-            else:
+            if not contributors:
                 try:
                     contributor = Contributor(**create_method_kwargs)
                     _db.add(contributor)
@@ -2717,6 +3860,12 @@ class Contributor(Base):
                     _db.rollback()
                     contributors = q.all()
                     new = False
+            if (cache and contributors
+                and all(x.sort_name == sort_name for x in contributors)):
+                # A new Contributor may have had its sort name
+                # reformatted, in which case looking up this name
+                # again wouldn't find it.
+                cache.put(key, contributors)
         else:
             # We are perfecly happy to create a Contributor based solely
             # on lc or viaf.
@@ -2726,6 +3875,12 @@ class Contributor(Base):
             if viaf:
                 query[Contributor.viaf.name] = viaf
 
+            key = ContributorCache.standard_identifier_key(lc, viaf)
+            if cache:
+                cached = cache.get(_db, key)
+                if cached:
+                    return cached, new
+
             if create_new:
                 contributor, new = get_one_or_create(
                     _db, Contributor, create_method_kwargs=create_method_kwargs,
@@ -2738,9 +3893,20 @@ class Contributor(Base):
                 contributor = get_one(_db, Contributor, **query)
                 if contributor:
                     contributors = [contributor]
+            if cache and contributors:
+                cache.put(key, contributors)
 
         return contributors, new
 
+    @classmethod
+    def normalize_name(cls, display_name):
+        """Normalize a display name for matching against
+        Contributor.normalized_name.
+        """
+        if not display_name:
+            return None
+        return normalize_contributor_name_for_matching(display_name)
+
 
     @property
     def sort_name(self):
@@ -2957,6 +4123,166 @@ class Contributor(Base):
         return family_name, display_name
 
 
+class ContributorCache(object):
+    """Remembers which Contributors a name or a standard identifier
+    was resolved to, until the end of the current transaction.
+
+    An import run looks up the same authors for title after title, so
+    this saves a query per contributor per title. The cache is
+    bounded, and the least recently used resolutions are forgotten
+    first.
+    """
+
+    # The cache is kept in Session.info under this key.
+    KEY = 'contributor_cache'
+
+    # The maximum number of resolutions to remember.
+    MAX_SIZE = 10000
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or self.MAX_SIZE
+
+        # Maps a key to a list of Contributor IDs, least recently
+        # used first.
+        self.results = OrderedDict()
+
+        # Maps a Contributor ID to the keys that resolved to it.
+        self.keys_by_id = defaultdict(set)
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_session(cls, _db):
+        """Find or create the cache for a database session.
+
+        :return: A ContributorCache, or None if `_db` isn't a Session.
+        """
+        if not isinstance(_db, Session):
+            return None
+        return _db.info.setdefault(cls.KEY, cls())
+
+    @classmethod
+    def reset(cls, _db):
+        """Forget everything that was cached for a database session."""
+        cache = _db.info.get(cls.KEY)
+        if cache:
+            cache.results.clear()
+            cache.keys_by_id.clear()
+
+    @classmethod
+    def sort_name_key(cls, sort_name):
+        return ('sort_name', sort_name)
+
+    @classmethod
+    def standard_identifier_key(cls, lc, viaf):
+        return ('standard_identifier', lc or None, viaf or None)
+
+    @classmethod
+    def normalized_name_key(cls, normalized_name):
+        return ('normalized_name', normalized_name)
+
+    @classmethod
+    def keys_for(cls, contributor):
+        """Every key a lookup for this Contributor could be cached
+        under.
+        """
+        keys = [
+            cls.sort_name_key(contributor.sort_name),
+            cls.normalized_name_key(contributor.normalized_name),
+        ]
+        for lc, viaf in ((contributor.lc, None), (None, contributor.viaf),
+                         (contributor.lc, contributor.viaf)):
+            keys.append(cls.standard_identifier_key(lc, viaf))
+        return keys
+
+    def get(self, _db, key):
+        """Find the Contributors a key was resolved to.
+
+        :return: A list of Contributors (possibly empty), or None if
+        the key isn't cached.
+        """
+        if key in self.results and _db.autoflush:
+            # A query would have flushed pending Contributors, which
+            # may change what the key resolves to.
+            flush(_db)
+        ids = self.results.get(key)
+        if ids is None:
+            self.misses += 1
+            return None
+        contributors = []
+        for id in ids:
+            contributor = _db.query(Contributor).get(id)
+            if not contributor or contributor in _db.deleted:
+                self.discard(key)
+                self.misses += 1
+                return None
+            contributors.append(contributor)
+
+        # This key is now the most recently used.
+        self.results[key] = self.results.pop(key)
+        self.hits += 1
+        return contributors
+
+    def put(self, key, contributors):
+        """Remember that a key resolved to the given Contributors."""
+        ids = [x.id for x in contributors]
+        if None in ids:
+            # These Contributors haven't been written to the database.
+            return
+        self.discard(key)
+        self.results[key] = ids
+        for id in ids:
+            self.keys_by_id[id].add(key)
+        while len(self.results) > self.max_size:
+            self.discard(next(iter(self.results)))
+
+    def discard(self, key):
+        ids = self.results.pop(key, None)
+        for id in ids or []:
+            keys = self.keys_by_id.get(id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_id[id]
+
+    def forget(self, contributor):
+        """Forget every resolution that might have changed because
+        this Contributor changed.
+        """
+        keys = set(self.keys_for(contributor))
+        keys.update(self.keys_by_id.get(contributor.id, []))
+        for key in keys:
+            self.discard(key)
+
+@event.listens_for(Contributor.display_name, 'set')
+def set_contributor_normalized_name(target, value, oldvalue, initiator):
+    target.normalized_name = Contributor.normalize_name(value)
+
+@event.listens_for(Contributor, 'after_insert')
+@event.listens_for(Contributor, 'after_update')
+@event.listens_for(Contributor, 'after_delete')
+def contributor_changed(mapper, connection, target):
+    cache = ContributorCache.for_session(Session.object_session(target))
+    if cache:
+        cache.forget(target)
+
+@event.listens_for(Session, 'after_commit')
+def reset_contributor_cache_on_commit(session):
+    # Other processes may create, change or merge Contributors, so
+    # nothing is cached past the end of this transaction. Releasing a
+    # savepoint doesn't end the transaction.
+    transaction = session.transaction
+    if transaction is not None and transaction.nested:
+        return
+    ContributorCache.reset(session)
+
+@event.listens_for(Session, 'after_rollback')
+def reset_contributor_cache_on_rollback(session):
+    # Contributors created during the transaction (or the savepoint)
+    # are gone.
+    ContributorCache.reset(session)
+
 
 class Contribution(Base):
     """A contribution made by a Contributor to a Edition."""
@@ -4598,6 +5924,16 @@ class Work(Base):
 
         policy = policy or PresentationCalculationPolicy()
 
+        # Every step below may look up the identifiers equivalent to
+        # this Work's. Keep track of how many of those lookups didn't
+        # need to hit the database.
+        _db = Session.object_session(self)
+        equivalent_identifier_cache = EquivalentIdentifierCache.for_session(_db)
+        if equivalent_identifier_cache:
+            lookups_saved = equivalent_identifier_cache.saved
+        else:
+            lookups_saved = 0
+
         edition_changed = self.calculate_presentation_edition(policy)
 
         if policy.choose_cover:
@@ -4622,8 +5958,6 @@ class Work(Base):
         if policy.classify or policy.choose_summary or policy.calculate_quality:
             # Find all related IDs that might have associated descriptions,
             # classifications, or measurements.
-            _db = Session.object_session(self)
-
             identifier_ids = self.all_identifier_ids()
         else:
             identifier_ids = []
@@ -4694,6 +6028,9 @@ class Work(Base):
         if (changed or policy.update_search_index) and not exclude_search:
             self.external_index_needs_updating()
 
+        if equivalent_identifier_cache:
+            lookups_saved = equivalent_identifier_cache.saved - lookups_saved
+
         # Now that everything's calculated, print it out.
         if policy.verbose:
             if changed:
@@ -4704,6 +6041,15 @@ class Work(Base):
                 changed = "unchanged"
                 representation = repr(self)
             logging.info("Presentation %s for work: %s", changed, representation)
+            logging.info(
+                "%d equivalent identifier lookup(s) answered from cache for %r",
+                lookups_saved, self
+            )
+        else:
+            logging.debug(
+                "%d equivalent identifier lookup(s) answered from cache for %r",
+                lookups_saved, self
+            )
 
     @property
     def detailed_representation(self):
@@ -4857,10 +6203,15 @@ class Work(Base):
         _db = Session.object_session(self)
         quantities = [Measurement.POPULARITY, Measurement.RATING,
                       Measurement.DOWNLOADS, Measurement.QUALITY]
-        measurements = _db.query(Measurement).filter(
-            Measurement.identifier_id.in_(identifier_ids)).filter(
-                Measurement.is_most_recent==True).filter(
-                    Measurement.quantity_measured.in_(quantities)).all()
+        measurements = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            measurements = batch.measurements_for(identifier_ids, quantities)
+        if measurements is None:
+            measurements = _db.query(Measurement).filter(
+                Measurement.identifier_id.in_(identifier_ids)).filter(
+                    Measurement.is_most_recent==True).filter(
+                        Measurement.quantity_measured.in_(quantities)).all()
 
         self.quality = Measurement.overall_quality(
             measurements, default_value=default_quality)
@@ -4882,9 +6233,14 @@ class Work(Base):
         old_target_age = self.target_age
 
         _db = Session.object_session(self)
-        classifications = Identifier.classifications_for_identifier_ids(
-            _db, identifier_ids
-        )
+        classifications = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            classifications = batch.classifications_for(identifier_ids)
+        if classifications is None:
+            classifications = Identifier.classifications_for_identifier_ids(
+                _db, identifier_ids
+            )
         for classification in classifications:
             classifier.add(classification)
 
@@ -4912,7 +6268,12 @@ class Work(Base):
         _db = Session.object_session(self)
         total_genre_weight = float(sum(genre_weights.values()))
         workgenres = []
-        current_workgenres = _db.query(WorkGenre).filter(WorkGenre.work==self)
+        current_workgenres = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            current_workgenres = batch.work_genres_for(self)
+        if current_workgenres is None:
+            current_workgenres = _db.query(WorkGenre).filter(WorkGenre.work==self)
         by_genre = dict()
         for wg in current_workgenres:
             by_genre[wg.genre] = wg
@@ -4924,6 +6285,12 @@ class Work(Base):
                 wg = by_genre[g]
                 is_new = False
                 del by_genre[g]
+            elif batch and self.id in batch.work_genres:
+                # The batch loaded every WorkGenre for this Work, so
+                # there's no need to look for this one.
+                wg = WorkGenre(work=self, genre=g)
+                _db.add(wg)
+                is_new = True
             else:
                 wg, is_new = get_one_or_create(
                     _db, WorkGenre, work=self, genre=g)
@@ -4940,6 +6307,8 @@ class Work(Base):
 
         # ensure that work_genres is up to date without having to read from database again
         self.work_genres = workgenres
+        if batch and self.id in batch.work_genres:
+            batch.work_genres[self.id] = list(workgenres)
 
         return workgenres, changed
 
@@ -6642,6 +8011,349 @@ class Classification(Base):
         return False
 
 
+class PresentationBatch(object):
+    """Calculate the presentation of a block of Works at once.
+
+    Work.calculate_presentation looks up classifications, links,
+    measurements, genres and coverage records separately for every
+    Work. A PresentationBatch loads all of that data for a block of
+    Works in a handful of queries, then runs the usual
+    calculate_presentation() on each Work, answering those lookups
+    from what it loaded. The result for each Work is the same as if
+    calculate_presentation() had been called on its own.
+    """
+
+    # While the batch is running, it's kept in Session.info under
+    # this key.
+    KEY = 'presentation_batch'
+
+    # calculate_presentation() only looks at links with these
+    # relations.
+    RELS = [Hyperlink.IMAGE, Hyperlink.THUMBNAIL_IMAGE,
+            Hyperlink.DESCRIPTION, Hyperlink.SHORT_DESCRIPTION]
+
+    # ...and measurements of these quantities.
+    QUANTITIES = [Measurement.POPULARITY, Measurement.RATING,
+                  Measurement.DOWNLOADS, Measurement.QUALITY]
+
+    # Any pending objects of these classes mean the loaded data may
+    # be out of date.
+    TRACKED_CLASSES = (Hyperlink, Classification, Measurement)
+
+    def __init__(self, _db, works):
+        self._db = _db
+        self.works = list(works)
+        self.work_ids = set(work.id for work in self.works)
+
+        # The Identifiers whose classifications, links and
+        # measurements have been loaded and are still up to date.
+        self.identifier_ids = set()
+
+        self.classifications = defaultdict(list)
+        self.links = defaultdict(list)
+        self.measurements = defaultdict(list)
+
+        # Maps Work IDs to lists of WorkGenres.
+        self.work_genres = dict()
+
+        # Maps (work ID, operation) to WorkCoverageRecords.
+        self.work_coverage_records = dict()
+
+        # Maps (identifier ID, data source ID, operation) to
+        # CoverageRecords that aren't associated with a Collection.
+        self.coverage_records = dict()
+        self.coverage_record_identifier_ids = set()
+
+        # How many lookups were answered from the loaded data?
+        self.saved = 0
+
+    @classmethod
+    def for_session(cls, _db):
+        """Find the PresentationBatch running in a database session, if
+        any.
+        """
+        if not isinstance(_db, Session):
+            return None
+        return _db.info.get(cls.KEY)
+
+    def calculate_presentation(self, policy=None, **kwargs):
+        """Load everything calculate_presentation() needs, then call it on
+        every Work in the batch.
+
+        :return: The number of lookups that didn't need a query.
+        """
+        self.load()
+        self._db.info[self.KEY] = self
+        try:
+            for work in self.works:
+                work.calculate_presentation(policy=policy, **kwargs)
+        finally:
+            self._db.info.pop(self.KEY, None)
+        logging.info(
+            "Calculated presentation for %d works, %d lookups answered from the batch.",
+            len(self.works), self.saved
+        )
+        return self.saved
+
+    def load(self):
+        """Load the data for every Work in the batch."""
+        _db = self._db
+        work_ids = [work.id for work in self.works]
+        if not work_ids:
+            return
+
+        # The pools and editions each Work is built from.
+        works = _db.query(Work).filter(Work.id.in_(work_ids)).options(
+            selectinload(Work.license_pools).joinedload(
+                LicensePool.identifier
+            ),
+            selectinload(Work.license_pools).joinedload(
+                LicensePool.presentation_edition
+            ),
+            joinedload(Work.presentation_edition).joinedload(
+                Edition.primary_identifier
+            ),
+        ).all()
+
+        # Look up the equivalent identifiers the way
+        # Work.all_identifier_ids() and
+        # Edition.best_cover_within_distance() will, so the results
+        # end up in the EquivalentIdentifierCache.
+        pool_identifier_ids = set()
+        edition_identifier_ids = set()
+        for work in works:
+            for pool in work.license_pools:
+                if pool.identifier:
+                    pool_identifier_ids.add(pool.identifier.id)
+            edition = work.presentation_edition
+            if edition and edition.primary_identifier:
+                edition_identifier_ids.add(edition.primary_identifier.id)
+
+        identifier_ids = set(pool_identifier_ids) | edition_identifier_ids
+        for ids, levels in (
+            (pool_identifier_ids, 3), (edition_identifier_ids, 5)
+        ):
+            if not ids:
+                continue
+            equivalents = Identifier.recursively_equivalent_identifier_ids(
+                _db, ids, levels
+            )
+            for equivalent_ids in equivalents.values():
+                identifier_ids.update(equivalent_ids)
+        identifier_ids = list(identifier_ids)
+
+        if identifier_ids:
+            qu = _db.query(Classification).filter(
+                Classification.identifier_id.in_(identifier_ids)
+            ).options(joinedload(Classification.subject))
+            for classification in qu.order_by(Classification.id):
+                self.classifications[classification.identifier_id].append(
+                    classification
+                )
+
+            qu = _db.query(Hyperlink).filter(
+                Hyperlink.identifier_id.in_(identifier_ids)
+            ).filter(
+                Hyperlink.rel.in_(self.RELS)
+            ).options(
+                joinedload(Hyperlink.resource).joinedload(
+                    Resource.representation
+                )
+            )
+            for link in qu.order_by(Hyperlink.id):
+                self.links[link.identifier_id].append(link)
+
+            qu = _db.query(Measurement).filter(
+                Measurement.identifier_id.in_(identifier_ids)
+            ).filter(
+                Measurement.quantity_measured.in_(self.QUANTITIES)
+            )
+            for measurement in qu.order_by(Measurement.id):
+                self.measurements[measurement.identifier_id].append(
+                    measurement
+                )
+        self.identifier_ids = set(identifier_ids)
+
+        for work_id in work_ids:
+            self.work_genres[work_id] = []
+        qu = _db.query(WorkGenre).filter(WorkGenre.work_id.in_(work_ids))
+        for wg in qu.options(joinedload(WorkGenre.genre)):
+            self.work_genres[wg.work_id].append(wg)
+
+        qu = _db.query(WorkCoverageRecord).filter(
+            WorkCoverageRecord.work_id.in_(work_ids)
+        )
+        for record in qu:
+            key = (record.work_id, record.operation)
+            self.work_coverage_records.setdefault(key, record)
+
+        if edition_identifier_ids:
+            qu = _db.query(CoverageRecord).filter(
+                CoverageRecord.identifier_id.in_(edition_identifier_ids)
+            ).filter(CoverageRecord.collection_id==None)
+            for record in qu:
+                key = (record.identifier_id, record.data_source_id,
+                       record.operation)
+                self.coverage_records.setdefault(key, record)
+        self.coverage_record_identifier_ids = edition_identifier_ids
+
+    def _loaded(self, identifier_ids):
+        """Is the data for all of these Identifiers loaded and up to date?"""
+        # A query would flush any pending links, classifications or
+        # measurements first, and they might belong to one of these
+        # Identifiers. Do the same, so they can be noticed.
+        if self._db.autoflush:
+            for obj in list(self._db.new) + list(self._db.deleted):
+                if isinstance(obj, self.TRACKED_CLASSES):
+                    self._db.flush()
+                    break
+        identifier_ids = set(identifier_ids)
+        if identifier_ids.issubset(self.identifier_ids):
+            self.saved += 1
+            return True
+        return False
+
+    def identifier_changed(self, identifier_id):
+        """Stop answering lookups for an Identifier whose data has
+        changed.
+        """
+        self.identifier_ids.discard(identifier_id)
+
+    def classifications_for(self, identifier_ids):
+        """The equivalent of Identifier.classifications_for_identifier_ids.
+
+        :return: A list of Classifications, or None if they weren't loaded.
+        """
+        if not self._loaded(identifier_ids):
+            return None
+        classifications = []
+        for identifier_id in identifier_ids:
+            classifications.extend(self.classifications[identifier_id])
+        return classifications
+
+    def resources_for(self, identifier_ids, rel, data_source=None):
+        """The equivalent of Identifier.resources_for_identifier_ids.
+
+        :return: A list of Resources, or None if they weren't loaded.
+        """
+        if isinstance(rel, list):
+            rels = rel
+        else:
+            rels = [rel]
+        if any(x not in self.RELS for x in rels):
+            return None
+        if not self._loaded(identifier_ids):
+            return None
+
+        data_source_ids = None
+        if data_source:
+            if isinstance(data_source, DataSource):
+                data_source = [data_source]
+            data_source_ids = set(d.id for d in data_source)
+
+        resources = []
+        seen = set()
+        for identifier_id in identifier_ids:
+            for link in self.links[identifier_id]:
+                if link.rel not in rels:
+                    continue
+                if (data_source_ids is not None
+                    and link.data_source_id not in data_source_ids):
+                    continue
+                if link.resource_id in seen:
+                    continue
+                seen.add(link.resource_id)
+                resources.append(link.resource)
+        return resources
+
+    def measurements_for(self, identifier_ids, quantities):
+        """Find the most recent Measurements of the given quantities.
+
+        :return: A list of Measurements, or None if they weren't loaded.
+        """
+        if any(x not in self.QUANTITIES for x in quantities):
+            return None
+        if not self._loaded(identifier_ids):
+            return None
+        measurements = []
+        for identifier_id in identifier_ids:
+            for measurement in self.measurements[identifier_id]:
+                if (measurement.is_most_recent
+                    and measurement.quantity_measured in quantities):
+                    measurements.append(measurement)
+        return measurements
+
+    def work_genres_for(self, work):
+        """Find a Work's WorkGenres.
+
+        :return: A list of WorkGenres, or None if they weren't loaded.
+        """
+        work_genres = self.work_genres.get(work.id)
+        if work_genres is not None:
+            self.saved += 1
+        return work_genres
+
+    def work_coverage_record(self, work, operation):
+        """The equivalent of get_one_or_create for a WorkCoverageRecord.
+
+        :return: A 2-tuple (WorkCoverageRecord, is_new), or None if
+        the Work isn't part of the batch.
+        """
+        if work.id not in self.work_ids:
+            return None
+        self.saved += 1
+        key = (work.id, operation)
+        record = self.work_coverage_records.get(key)
+        if record:
+            return record, False
+        # There was no record when the batch was loaded, so there's
+        # no need to check the database before creating one.
+        record = WorkCoverageRecord(work=work, operation=operation)
+        self._db.add(record)
+        self.work_coverage_records[key] = record
+        return record, True
+
+    def coverage_record(self, identifier, data_source, operation):
+        """The equivalent of get_one_or_create for a CoverageRecord that
+        isn't associated with a Collection.
+
+        :return: A 2-tuple (CoverageRecord, is_new), or None if the
+        Identifier's coverage records weren't loaded.
+        """
+        if (not identifier or not data_source
+            or identifier.id not in self.coverage_record_identifier_ids):
+            return None
+        self.saved += 1
+        key = (identifier.id, data_source.id, operation)
+        record = self.coverage_records.get(key)
+        if record:
+            return record, False
+        record = CoverageRecord(
+            identifier=identifier, data_source=data_source,
+            operation=operation
+        )
+        self._db.add(record)
+        self.coverage_records[key] = record
+        return record, True
+
+@event.listens_for(Hyperlink, 'after_insert')
+@event.listens_for(Hyperlink, 'after_update')
+@event.listens_for(Hyperlink, 'after_delete')
+@event.listens_for(Classification, 'after_insert')
+@event.listens_for(Classification, 'after_update')
+@event.listens_for(Classification, 'after_delete')
+@event.listens_for(Measurement, 'after_insert')
+@event.listens_for(Measurement, 'after_update')
+@event.listens_for(Measurement, 'after_delete')
+def presentation_batch_data_changed(mapper, connection, target):
+    batch = PresentationBatch.for_session(Session.object_session(target))
+    if not batch:
+        return
+    batch.identifier_changed(target.identifier_id)
+    for identifier_id in get_history(target, 'identifier_id').deleted or []:
+        batch.identifier_changed(identifier_id)
+
+
 class WillNotGenerateExpensiveFeed(Exception):
     """This exception is raised when a feed is not cached, but it's too
     expensive to generate.
@@ -6698,6 +8410,7 @@ class CachedFeed(Base):
     log = logging.getLogger("CachedFeed")
 
     @classmethod
+    @metrics.timed("CachedFeed.fetch")
     def fetch(cls, _db, lane, type, facets, pagination, annotator,
               force_refresh=False, max_age=None):
         from opds import AcquisitionFeed
@@ -8121,6 +9834,101 @@ class CirculationEvent(Base):
             )
         return event, was_new
 
+    @classmethod
+    def log_batch(cls, _db, events):
+        """Log a number of events at once, with a single INSERT.
+
+        :param events: A list of dictionaries with the keys
+            'license_pool_id', 'type', 'start', 'old_value' and
+            'new_value', and optionally 'end' and
+            'foreign_patron_id'.
+
+        :return: The number of new events.
+        """
+        # As with log(), an event that's already been logged isn't
+        # logged again. The rest are inserted in the order given, so
+        # their IDs reflect the order in which they happened.
+        rows = OrderedDict()
+        for data in events:
+            old_value = data.get('old_value')
+            new_value = data.get('new_value')
+            if new_value is None or old_value is None:
+                delta = None
+            else:
+                delta = new_value - old_value
+            start = data.get('start') or datetime.datetime.utcnow()
+            row = dict(
+                license_pool_id=data.get('license_pool_id'),
+                type=data['type'], start=start,
+                end=data.get('end') or start,
+                old_value=old_value, new_value=new_value, delta=delta,
+                foreign_patron_id=data.get('foreign_patron_id'),
+            )
+            rows.setdefault(cls._batch_key(row), row)
+        if not rows:
+            return 0
+
+        existing = _db.query(
+            CirculationEvent.license_pool_id, CirculationEvent.type,
+            CirculationEvent.start, CirculationEvent.foreign_patron_id
+        ).filter(
+            CirculationEvent.start.in_(set(x['start'] for x in rows.values()))
+        )
+        for key in existing:
+            rows.pop(tuple(key), None)
+        if not rows:
+            return 0
+
+        _db.flush()
+        transaction = _db.begin_nested()
+        try:
+            _db.execute(CirculationEvent.__table__.insert(), rows.values())
+            transaction.commit()
+        except IntegrityError, e:
+            # Another process logged one of these events in the
+            # meantime, or one of them refers to a LicensePool that
+            # doesn't exist. Fall back to logging them one at a time.
+            transaction.rollback()
+            return cls._log_individually(_db, rows.values())
+        logging.info("Logged %d circulation events.", len(rows))
+        return len(rows)
+
+    @classmethod
+    def _batch_key(cls, row):
+        return (row['license_pool_id'], row['type'], row['start'],
+                row['foreign_patron_id'])
+
+    @classmethod
+    def _log_individually(cls, _db, rows):
+        new = 0
+        for row in rows:
+            license_pool = None
+            if row['license_pool_id']:
+                license_pool = get_one(
+                    _db, LicensePool, id=row['license_pool_id']
+                )
+                if not license_pool:
+                    logging.error(
+                        "Could not log circulation event %r: no such LicensePool",
+                        row
+                    )
+                    continue
+            transaction = _db.begin_nested()
+            try:
+                ignore, was_new = cls.log(
+                    _db, license_pool, row['type'], row['old_value'],
+                    row['new_value'], start=row['start'], end=row['end'],
+                    foreign_patron_id=row['foreign_patron_id']
+                )
+                transaction.commit()
+                if was_new:
+                    new += 1
+            except IntegrityError, e:
+                transaction.rollback()
+                logging.error("Could not log circulation event %r", row,
+                              exc_info=e)
+        return new
+
 
 Index("ix_circulationevents_start_desc_nullslast", CirculationEvent.start.desc().nullslast())
 
@@ -8390,6 +10198,28 @@ class Timestamp(Base):
     )
 
 
+class RepresentationFetch(object):
+    """A request for one of the representations to be retrieved by
+    Representation.get_many().
+
+    The arguments mean the same thing as the corresponding arguments
+    to Representation.get().
+    """
+
+    def __init__(self, url, max_age=None, accept=None,
+                 extra_request_headers=None, presumed_media_type=None,
+                 response_reviewer=None):
+        self.url = url
+        self.max_age = max_age
+        self.accept = accept
+        self.extra_request_headers = extra_request_headers
+        self.presumed_media_type = presumed_media_type
+        self.response_reviewer = response_reviewer
+
+    def __repr__(self):
+        return "<RepresentationFetch %s>" % self.url
+
+
 class Representation(Base):
     """A cached document obtained from (and possibly mirrored to) the Web
     at large.
@@ -8483,6 +10313,12 @@ class Representation(Base):
     for media_type, extension in FILE_EXTENSIONS.items():
         MEDIA_TYPE_FOR_EXTENSION['.' + extension] = media_type
 
+    # get_many() makes at most this many HTTP requests at once...
+    BULK_FETCH_CONCURRENCY = 10
+
+    # ...and at most this many to any one host.
+    BULK_FETCH_CONCURRENCY_PER_HOST = 2
+
     __tablename__ = 'representations'
     id = Column(Integer, primary_key=True)
 
@@ -8560,8 +10396,14 @@ class Representation(Base):
     # If this representation is an image, the width of the image.
     image_width = Column(Integer, index=True)
 
-    # The content of the representation itself.
-    content = Column(Binary)
+    # The content of the representation itself. Use the `content`
+    # property rather than this column, since the content may be kept
+    # in a BlobStore instead.
+    _content = Column('content', Binary)
+
+    # If the content is kept in a BlobStore, this is the key under
+    # which it can be found.
+    content_hash = Column(Unicode, index=True)
 
     # Instead of being stored in the database, the content of the
     # representation may be stored on a local file relative to the
@@ -8584,9 +10426,63 @@ class Representation(Base):
             return 1000000
         return (datetime.datetime.utcnow() - self.fetched_at).total_seconds()
 
+    @property
+    def content(self):
+        """The content of the representation, whether it's kept in the
+        database or in the BlobStore.
+        """
+        if self._content is not None or not self.content_hash:
+            return self._content
+        return self._required_blob_store().read(self.content_hash)
+
+    @content.setter
+    def content(self, value):
+        store = self.blob_store()
+        if value and store:
+            self.content_hash = store.put(value)
+            self._content = None
+        else:
+            self.content_hash = None
+            self._content = value
+
+    @classmethod
+    def blob_store(cls):
+        """The BlobStore in which new content should be kept, if any."""
+        return BlobStore.instance
+
+    def _required_blob_store(self):
+        store = self.blob_store()
+        if not store:
+            # This process may not have looked for a blob store yet.
+            _db = Session.object_session(self)
+            if _db:
+                store = BlobStore.initialize(_db)
+        if not store:
+            raise ValueError(
+                "Content for %s is kept in a blob store, but none is configured." % self.url
+            )
+        return store
+
+    @property
+    def has_stored_content(self):
+        """Is there any content, without loading it?"""
+        return bool(self._content or self.content_hash)
+
+    def move_content_to_blob_store(self, store=None):
+        """Move content from the database to the BlobStore.
+
+        :return: True if the content was moved.
+        """
+        store = store or self.blob_store()
+        if not store or self._content is None:
+            return False
+        self.content_hash = store.put(self._content)
+        self._content = None
+        return True
+
     @property
     def has_content(self):
-        if self.content and self.status_code == 200 and self.fetch_exception is None:
+        if self.has_stored_content and self.status_code == 200 and self.fetch_exception is None:
             return True
         if self.local_content_path and os.path.exists(self.local_content_path) and self.fetch_exception is None:
             return True
@@ -8617,7 +10513,7 @@ class Representation(Base):
         a status code that's not in the 5xx series.
         """
         if not self.fetch_exception and (
-            self.content or self.local_path or self.status_code
+            self.has_stored_content or self.local_path or self.status_code
             and self.status_code / 100 != 5
         ):
             return True
@@ -8662,6 +10558,7 @@ class Representation(Base):
         return (max_age is None or max_age > self.age)
 
     @classmethod
+    @metrics.timed("Representation.get")
     def get(cls, _db, url, do_get=None, extra_request_headers=None,
             accept=None, max_age=None, pause_before=0, allow_redirects=True,
             presumed_media_type=None, debug=True, response_reviewer=None,
@@ -8724,6 +10621,150 @@ class Representation(Base):
         # We must make an HTTP request.
         if debug_level is not None:
             logging.log(debug_level, "Fetching %s", url)
+        headers = cls._request_headers(
+            representation, usable_representation, extra_request_headers,
+            accept
+        )
+
+        fetched_at = datetime.datetime.utcnow()
+        if pause_before:
+            time.sleep(pause_before)
+        response = cls._fetch(
+            url, headers, do_get, presumed_media_type, response_reviewer
+        )
+        return cls._store_response(
+            _db, url, representation, usable_representation, fetched_at,
+            response, exception_handler
+        )
+
+    @classmethod
+    def get_many(cls, _db, fetches, do_get=None, concurrency=None,
+                 concurrency_per_host=None, exception_handler=None):
+        """Retrieve a number of representations at once, from the cache
+        where possible.
+
+        The cache is checked with a single database query, and the
+        representations that need to be fetched are fetched
+        concurrently, with no more than `concurrency_per_host`
+        requests going to any one host at a time. Everything else
+        works the same way as in get().
+
+        :param fetches: A list of RepresentationFetch objects.
+
+        :param do_get: A function that takes arguments (url, headers)
+        and retrieves a representation over the network. It will be
+        called from several threads at once.
+
+        :return: A list of 2-tuples (representation,
+        obtained_from_cache), one for each item in `fetches`, in the
+        same order.
+        """
+        do_get = do_get or cls.simple_http_get
+        exception_handler = exception_handler or cls.record_exception
+        concurrency = concurrency or cls.BULK_FETCH_CONCURRENCY
+        concurrency_per_host = (
+            concurrency_per_host or cls.BULK_FETCH_CONCURRENCY_PER_HOST
+        )
+
+        cached = defaultdict(list)
+        urls = set([fetch.url for fetch in fetches])
+        if urls:
+            qu = _db.query(Representation).filter(Representation.url.in_(urls))
+            for representation in qu:
+                cached[representation.url].append(representation)
+
+        results = [None] * len(fetches)
+        pending = []
+        for i, fetch in enumerate(fetches):
+            # As in get(), different representations of a URL are
+            # treated as interchangeable unless the caller asked for
+            # a specific media type.
+            candidates = [
+                x for x in cached[fetch.url]
+                if not fetch.accept or x.media_type == fetch.accept
+            ]
+            representation = None
+            usable_representation = False
+            if candidates:
+                representation = candidates[0]
+                usable_representation = representation.is_usable
+                if representation.is_fresher_than(fetch.max_age):
+                    results[i] = (representation, True)
+                    continue
+            headers = cls._request_headers(
+                representation, usable_representation,
+                fetch.extra_request_headers, fetch.accept
+            )
+            pending.append((i, fetch, representation, usable_representation,
+                             headers))
+
+        responses = cls._fetch_concurrently(
+            [(request[1], request[-1]) for request in pending],
+            do_get, concurrency, concurrency_per_host
+        )
+
+        # The database work happens back in this thread, in the order
+        # the fetches were requested.
+        for (i, fetch, representation, usable_representation, headers), \
+            (fetched_at, response) in zip(pending, responses):
+            results[i] = cls._store_response(
+                _db, fetch.url, representation, usable_representation,
+                fetched_at, response, exception_handler
+            )
+        return results
+
+    @classmethod
+    def _fetch_concurrently(cls, requests, do_get, concurrency,
+                            concurrency_per_host):
+        """Make a number of HTTP requests in a pool of threads.
+
+        :param requests: A list of 2-tuples (RepresentationFetch, headers).
+        :return: A list of 2-tuples (fetched_at, response), in the same
+        order as `requests`. `response` is the return value of _fetch().
+        """
+        responses = [None] * len(requests)
+        if not requests:
+            return responses
+
+        host_limits = dict()
+        for fetch, headers in requests:
+            host = urlparse.urlsplit(fetch.url).netloc
+            if host not in host_limits:
+                host_limits[host] = BoundedSemaphore(concurrency_per_host)
+
+        queue = Queue()
+        for i, request in enumerate(requests):
+            queue.put((i, request))
+
+        def work():
+            while True:
+                try:
+                    i, (fetch, headers) = queue.get_nowait()
+                except Empty:
+                    return
+                host = urlparse.urlsplit(fetch.url).netloc
+                with host_limits[host]:
+                    fetched_at = datetime.datetime.utcnow()
+                    responses[i] = (fetched_at, cls._fetch(
+                        fetch.url, headers, do_get,
+                        fetch.presumed_media_type, fetch.response_reviewer
+                    ))
+
+        threads = [Thread(target=work)
+                   for i in range(min(concurrency, len(requests)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    @classmethod
+    def _request_headers(cls, representation, usable_representation,
+                         extra_request_headers, accept):
+        """Build the headers for an HTTP request that might replace
+        the given cached representation.
+        """
         headers = {}
         if extra_request_headers:
             headers.update(extra_request_headers)
@@ -8738,10 +10779,16 @@ class Representation(Base):
                 headers['If-Modified-Since'] = representation.last_modified
             if representation.etag:
                 headers['If-None-Match'] = representation.etag
+        return headers
 
-        fetched_at = datetime.datetime.utcnow()
-        if pause_before:
-            time.sleep(pause_before)
+    @classmethod
+    def _fetch(cls, url, headers, do_get, presumed_media_type=None,
+               response_reviewer=None):
+        """Make an HTTP request, without touching the database.
+
+        :return: A 6-tuple (status_code, headers, content, media_type,
+        fetch_exception, exception_traceback).
+        """
         media_type = None
         fetch_exception = None
         exception_traceback = None
@@ -8751,7 +10798,6 @@ class Representation(Base):
                 # An optional function passed to raise errors if the
                 # post response isn't worth caching.
                 response_reviewer((status_code, headers, content))
-            exception = None
             media_type = cls._best_media_type(url, headers, presumed_media_type)
             if isinstance(content, unicode):
                 content = content.encode("utf8")
@@ -8766,6 +10812,19 @@ class Representation(Base):
             headers = None
             content = None
             media_type = None
+        return (status_code, headers, content, media_type, fetch_exception,
+                exception_traceback)
+
+    @classmethod
+    def _store_response(cls, _db, url, representation, usable_representation,
+                        fetched_at, response, exception_handler):
+        """Record the result of an HTTP request in a Representation.
+
+        :param response: A 6-tuple as returned by _fetch().
+        :return: A 2-tuple (representation, obtained_from_cache)
+        """
+        (status_code, headers, content, media_type, fetch_exception,
+         exception_traceback) = response
 
         # At this point we can create/fetch a Representation object if
         # we don't have one already, or if the URL or media type we
@@ -9240,11 +11299,15 @@ class Representation(Base):
     def content_fh(self):
         """Return an open filehandle to the representation's contents.
 
-        This works whether the representation is kept in the database
-        or in a file on disk.
+        This works whether the representation is kept in the database,
+        in the BlobStore, or in a file on disk.
         """
-        if self.content:
-            return StringIO(self.content)
+        if self._content:
+            return StringIO(self._content)
+        elif self.content_hash:
+            # Stream the content from the BlobStore rather than
+            # loading all of it at once.
+            return self._required_blob_store().open(self.content_hash)
         elif self.local_path:
             if not os.path.exists(self.local_path):
                 raise ValueError("%s does not exist." % self.local_path)
@@ -9257,16 +11320,22 @@ class Representation(Base):
             raise ValueError(
                 "Cannot load non-image representation as image: type %s."
                 % self.media_type)
-        if not self.content and not self.local_path:
+        if not self.has_stored_content and not self.local_path:
             raise ValueError("Image representation has no content.")
 
         fh = self.content_fh()
         if not fh:
             return None
+        if not hasattr(fh, 'seek'):
+            # PIL needs to be able to seek around in the image, which
+            # can't be done with content streamed from S3.
+            fh = StringIO(fh.read())
         if self.clean_media_type == self.SVG_MEDIA_TYPE:
             # Transparently convert the SVG to a PNG.
+            import cairosvg
             png_data = cairosvg.svg2png(fh.read())
             fh = StringIO(png_data)
+        from PIL import Image
         return Image.open(fh)
 
     pil_format_for_media_type = {
@@ -9341,6 +11410,7 @@ class Representation(Base):
         thumbnail.mirrored_at = None
         thumbnail.mirror_exception = None
 
+        from PIL import Image
         args = [(max_width, max_height),
                 Image.ANTIALIAS]
         try:
@@ -9531,13 +11601,24 @@ class DeliveryMechanism(Base, HasFullTableCache):
         )
 
     @classmethod
-    def lookup(cls, _db, content_type, drm_scheme):
+    def lookup(cls, _db, content_type, drm_scheme, snapshot=False):
+        """Find or create a DeliveryMechanism.
+
+        :param snapshot: If this is True, a read-only
+            DeliveryMechanismSnapshot is returned instead of a
+            DeliveryMechanism.
+
+        :return: A 2-tuple (delivery_mechanism, is_new)
+        """
         def lookup_hook():
             return get_one_or_create(
                 _db, DeliveryMechanism, content_type=content_type,
                 drm_scheme=drm_scheme
             )
-        return cls.by_cache_key(_db, (content_type, drm_scheme), lookup_hook)
+        key = (content_type, drm_scheme)
+        if snapshot:
+            return cls.snapshot_by_cache_key(_db, key, lookup_hook)
+        return cls.by_cache_key(_db, key, lookup_hook)
 
     @property
     def implicit_medium(self):
@@ -9634,6 +11715,16 @@ Index("ix_deliverymechanisms_drm_scheme_content_type",
       unique=True)
 
 
+class DeliveryMechanismSnapshot(CacheSnapshot):
+    """A read-only copy of a DeliveryMechanism."""
+
+    FIELDS = __slots__ = (
+        'id', 'content_type', 'drm_scheme', 'default_client_can_fulfill'
+    )
+
+DeliveryMechanism.SNAPSHOT_CLASS = DeliveryMechanismSnapshot
+
+
 class CustomList(Base):
     """A custom grouping of Editions."""
 
@@ -11042,24 +13133,29 @@ class ConfigurationSetting(Base, HasFullTableCache):
         return lines
 
     @classmethod
-    def sitewide(cls, _db, key):
+    def sitewide(cls, _db, key, snapshot=False):
         """Find or create a sitewide ConfigurationSetting."""
-        return cls.for_library_and_externalintegration(_db, key, None, None)
+        return cls.for_library_and_externalintegration(
+            _db, key, None, None, snapshot=snapshot
+        )
 
     @classmethod
-    def for_library(cls, key, library):
+    def for_library(cls, key, library, snapshot=False):
         """Find or create a ConfigurationSetting for the given Library."""
         _db = Session.object_session(library)
-        return cls.for_library_and_externalintegration(_db, key, library, None)
+        return cls.for_library_and_externalintegration(
+            _db, key, library, None, snapshot=snapshot
+        )
 
     @classmethod
-    def for_externalintegration(cls, key, externalintegration):
+    def for_externalintegration(cls, key, externalintegration,
+                                snapshot=False):
         """Find or create a ConfigurationSetting for the given
         ExternalIntegration.
         """
         _db = Session.object_session(externalintegration)
         return cls.for_library_and_externalintegration(
-            _db, key, None, externalintegration
+            _db, key, None, externalintegration, snapshot=snapshot
         )
 
     @classmethod
@@ -11079,10 +13175,15 @@ class ConfigurationSetting(Base, HasFullTableCache):
 
     @classmethod
     def for_library_and_externalintegration(
-            cls, _db, key, library, external_integration
+            cls, _db, key, library, external_integration, snapshot=False
     ):
         """Find or create a ConfigurationSetting associated with a Library
         and an ExternalIntegration.
+
+        :param snapshot: If this is True, a read-only
+            ConfigurationSettingSnapshot is returned instead of a
+            ConfigurationSetting. Its value takes into account any
+            value it inherits from another setting.
         """
         def create():
             """Function called when a ConfigurationSetting is not found in cache
@@ -11097,6 +13198,25 @@ class ConfigurationSetting(Base, HasFullTableCache):
         # ConfigurationSettings are stored in cache based on their library,
         # external integration, and the name of the setting.
         cache_key = cls._cache_key(library, external_integration, key)
+        if snapshot:
+            setting, ignore = cls.snapshot_by_cache_key(
+                _db, cache_key, create
+            )
+            if setting.value:
+                return setting
+
+            # Find the value this setting inherits, the same way
+            # ConfigurationSetting.value does.
+            if library and external_integration:
+                default = cls.for_library_and_externalintegration(
+                    _db, key, None, external_integration, snapshot=True
+                )
+            elif library:
+                default = cls.sitewide(_db, key, snapshot=True)
+            else:
+                return setting
+            return setting.replace(value=default.value)
+
         setting, ignore = cls.by_cache_key(_db, cache_key, create)
         return setting
 
@@ -11116,12 +13236,12 @@ class ConfigurationSetting(Base, HasFullTableCache):
             # ExternalIntegration. Treat the value set on the
             # ExternalIntegration as a default.
             return self.for_externalintegration(
-                self.key, self.external_integration).value
+                self.key, self.external_integration, snapshot=True).value
         elif self.library:
             # This is a library-specific setting. Treat the site-wide
             # value as a default.
             _db = Session.object_session(self)
-            return self.sitewide(_db, self.key).value
+            return self.sitewide(_db, self.key, snapshot=True).value
         return self._value
 
     @value.setter
@@ -11208,6 +13328,33 @@ class ConfigurationSetting(Base, HasFullTableCache):
         return None
 
 
+class ConfigurationSettingSnapshot(CacheSnapshot):
+    """A read-only copy of a ConfigurationSetting."""
+
+    FIELDS = __slots__ = (
+        'id', 'library_id', 'external_integration_id', 'key', 'value'
+    )
+
+    @classmethod
+    def from_object(cls, obj):
+        # Only the setting's own value is copied. Any inherited value
+        # is filled in by
+        # ConfigurationSetting.for_library_and_externalintegration.
+        return cls(
+            id=obj.id, library_id=obj.library_id,
+            external_integration_id=obj.external_integration_id,
+            key=obj.key, value=obj._value
+        )
+
+    MEANS_YES = ConfigurationSetting.MEANS_YES
+    bool_value = ConfigurationSetting.bool_value
+    int_value = ConfigurationSetting.int_value
+    float_value = ConfigurationSetting.float_value
+    json_value = ConfigurationSetting.json_value
+
+ConfigurationSetting.SNAPSHOT_CLASS = ConfigurationSettingSnapshot
+
+
 class Collection(Base, HasFullTableCache):
 
     """A Collection is a set of LicensePools obtained through some mechanism.
@@ -12092,6 +14239,7 @@ def _site_configuration_has_changed(_db, timeout=1):
             dict(service=Configuration.SITE_CONFIGURATION_CHANGED,
                  timestamp=now, earlier=earlier)
         )
+        CacheInvalidationListener.notify_site_configuration_change(_db, now)
 
         # Update the Configuration's record of when the configuration
         # was updated. This will update our local record immediately
@@ -12207,77 +14355,70 @@ def configuration_relevant_update(mapper, connection, target):
     if directly_modified(target):
         site_configuration_has_changed(target)
 
+# Each HasFullTableCache class keeps its in-memory caches up to date
+# one object at a time, and tells other processes which object
+# changed. The full table is only reloaded when a cache is reset.
 @event.listens_for(Admin, 'after_insert')
-@event.listens_for(Admin, 'after_delete')
 @event.listens_for(Admin, 'after_update')
-def refresh_admin_cache(mapper, connection, target):
-    # The next time someone tries to access an Admin,
-    # the cache will be repopulated.
-    Admin.reset_cache()
-
 @event.listens_for(AdminRole, 'after_insert')
-@event.listens_for(AdminRole, 'after_delete')
 @event.listens_for(AdminRole, 'after_update')
-def refresh_admin_role_cache(mapper, connection, target):
-    # The next time someone tries to access an AdminRole,
-    # the cache will be repopulated.
-    AdminRole.reset_cache()
-
 @event.listens_for(Collection, 'after_insert')
-@event.listens_for(Collection, 'after_delete')
 @event.listens_for(Collection, 'after_update')
-def refresh_collection_cache(mapper, connection, target):
-    # The next time someone tries to access a Collection,
-    # the cache will be repopulated.
-    Collection.reset_cache()
-
 @event.listens_for(ConfigurationSetting, 'after_insert')
-@event.listens_for(ConfigurationSetting, 'after_delete')
 @event.listens_for(ConfigurationSetting, 'after_update')
-def refresh_configuration_settings(mapper, connection, target):
-    # The next time someone tries to access a configuration setting,
-    # the cache will be repopulated.
-    ConfigurationSetting.reset_cache()
-
 @event.listens_for(DataSource, 'after_insert')
-@event.listens_for(DataSource, 'after_delete')
 @event.listens_for(DataSource, 'after_update')
-def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access a DataSource,
-    # the cache will be repopulated.
-    DataSource.reset_cache()
-
 @event.listens_for(DeliveryMechanism, 'after_insert')
-@event.listens_for(DeliveryMechanism, 'after_delete')
 @event.listens_for(DeliveryMechanism, 'after_update')
-def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access a DeliveryMechanism,
-    # the cache will be repopulated.
-    DeliveryMechanism.reset_cache()
-
 @event.listens_for(ExternalIntegration, 'after_insert')
-@event.listens_for(ExternalIntegration, 'after_delete')
 @event.listens_for(ExternalIntegration, 'after_update')
-def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access an ExternalIntegration,
-    # the cache will be repopulated.
-    ExternalIntegration.reset_cache()
-
+@event.listens_for(Genre, 'after_insert')
+@event.listens_for(Genre, 'after_update')
 @event.listens_for(Library, 'after_insert')
-@event.listens_for(Library, 'after_delete')
 @event.listens_for(Library, 'after_update')
-def refresh_library_cache(mapper, connection, target):
-    # The next time someone tries to access a library,
-    # the cache will be repopulated.
-    Library.reset_cache()
+def refresh_cached_object(mapper, connection, target):
+    HasFullTableCache.cached_object_changed(target)
+    HasFullTableCache.notify(connection, target)
 
-@event.listens_for(Genre, 'after_insert')
+@event.listens_for(Admin, 'after_delete')
+@event.listens_for(AdminRole, 'after_delete')
+@event.listens_for(Collection, 'after_delete')
+@event.listens_for(ConfigurationSetting, 'after_delete')
+@event.listens_for(DataSource, 'after_delete')
+@event.listens_for(DeliveryMechanism, 'after_delete')
+@event.listens_for(ExternalIntegration, 'after_delete')
 @event.listens_for(Genre, 'after_delete')
-@event.listens_for(Genre, 'after_update')
-def refresh_genre_cache(mapper, connection, target):
-    # The next time someone tries to access a genre,
-    # the cache will be repopulated.
-    #
-    # The only time this should really happen is the very first time a
-    # site is brought up, but just in case.
-    Genre.reset_cache()
+@event.listens_for(Library, 'after_delete')
+def evict_cached_object(mapper, connection, target):
+    HasFullTableCache.cached_object_changed(target, deleted=True)
+    HasFullTableCache.notify(connection, target)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def prepare_cached_objects(session, flush_context):
+    for obj in session.info.pop(HasFullTableCache.PENDING_UPSERTS_KEY, []):
+        if obj in session and obj not in session.deleted:
+            obj.__class__._upsert_on_commit(session, obj)
+
+@event.listens_for(Session, 'after_commit')
+def upsert_cached_objects(session):
+    # Releasing a savepoint doesn't commit anything.
+    transaction = session.transaction
+    if transaction is not None and transaction.nested:
+        return
+    session.info.pop(HasFullTableCache.CHANGED_CLASSES_KEY, None)
+    for obj, key, snapshot in session.info.pop(
+            HasFullTableCache.UNCOMMITTED_UPSERTS_KEY, []
+    ):
+        obj.__class__._cache_upsert(obj, key=key, snapshot=snapshot)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_uncommitted_cached_objects(session):
+    # Nothing uncommitted was ever put into the caches, so there's
+    # nothing to undo there. Objects that were changed before a
+    # rolled-back savepoint may have been changed back, so they're
+    # left to be cached the next time they're looked up.
+    session.info.pop(HasFullTableCache.PENDING_UPSERTS_KEY, None)
+    session.info.pop(HasFullTableCache.UNCOMMITTED_UPSERTS_KEY, None)
+    transaction = session.transaction
+    if transaction is None or not transaction.nested:
+        session.info.pop(HasFullTableCache.CHANGED_CLASSES_KEY, None)
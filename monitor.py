@@ -8,11 +8,14 @@ from sqlalchemy.sql.functions import func
 from sqlalchemy.sql.expression import (
     or_,
     and_,
+    select,
 )
 
 import log # This sets the appropriate log format and level.
 from config import Configuration
 from coverage import CoverageFailure
+from util import metrics
+from util.worker_pools import DatabaseJob
 from model import (
     get_one,
     get_one_or_create,
@@ -26,6 +29,7 @@ from model import (
     CustomListEntry,
     Identifier,
     LicensePool,
+    PresentationBatch,
     PresentationCalculationPolicy,
     Subject,
     Timestamp,
@@ -273,7 +277,19 @@ class SweepMonitor(CollectionMonitor):
     # `id` field.
     MODEL_CLASS = None
     
-    def __init__(self, _db, collection=None, batch_size=None):
+    def __init__(self, _db, collection=None, batch_size=None, shard=None,
+                 shard_count=None):
+        """Constructor.
+
+        :param shard: If this Monitor is one of several workers
+            sweeping the same table in parallel, the number of the
+            shard this worker is responsible for, from 0 to
+            shard_count-1.
+
+        :param shard_count: The total number of shards the sweep is
+            divided into. A shard is responsible for every item whose
+            ID is congruent to `shard` modulo `shard_count`.
+        """
         cls = self.__class__
         if not batch_size or batch_size < 0:
             batch_size = cls.DEFAULT_BATCH_SIZE
@@ -281,10 +297,129 @@ class SweepMonitor(CollectionMonitor):
         if not cls.MODEL_CLASS:
             raise ValueError("%s must define MODEL_CLASS" % cls.__name__)
         self.model_class = cls.MODEL_CLASS
+        if shard_count is not None:
+            if shard_count < 1:
+                raise ValueError("shard_count must be at least 1.")
+            if shard is None or shard < 0 or shard >= shard_count:
+                raise ValueError(
+                    "shard must be between 0 and %d." % (shard_count-1)
+                )
+        elif shard is not None:
+            raise ValueError("shard_count is required when shard is set.")
+        self.shard = shard
+        self.shard_count = shard_count
         super(SweepMonitor, self).__init__(_db, collection=collection)
 
-    def run(self):        
-        timestamp = self.timestamp()
+    @property
+    def is_sharded(self):
+        return self.shard_count is not None
+
+    def shard_service_name(self, shard):
+        """The name of the service under which the given shard of this
+        sweep tracks its progress.
+        """
+        return "%s (shard %d of %d)" % (
+            self.service_name, shard, self.shard_count
+        )
+
+    def progress_timestamp(self):
+        """Find or create the Timestamp that tracks this Monitor's
+        progress through the table.
+
+        For an ordinary SweepMonitor this is the Monitor's own
+        Timestamp. For one shard of a sharded sweep, it's a separate
+        Timestamp that belongs to this shard alone. Its `counter` is the
+        shard's position in the table, and its `timestamp` is the last
+        time the shard completed its portion of a sweep.
+        """
+        if not self.is_sharded:
+            return self.timestamp()
+        timestamp, is_new = get_one_or_create(
+            self._db, Timestamp,
+            service=self.shard_service_name(self.shard),
+            collection=self.collection,
+            create_method_kwargs=dict(
+                timestamp=None,
+                counter=self.default_counter,
+            )
+        )
+        return timestamp
+
+    def shard_is_finished(self, shard_timestamp, sweep_timestamp):
+        """Has the given shard finished its portion of the current sweep?
+
+        :param shard_timestamp: The progress Timestamp for a shard.
+        :param sweep_timestamp: The Monitor's own Timestamp, whose
+            `timestamp` is the time the last complete sweep finished.
+        """
+        if not shard_timestamp or not shard_timestamp.timestamp:
+            # This shard has never finished a sweep.
+            return False
+        if not sweep_timestamp.timestamp:
+            # No sweep has ever been completed, but this shard has
+            # finished its portion of the first one.
+            return True
+        return shard_timestamp.timestamp > sweep_timestamp.timestamp
+
+    def finish_shard(self, shard_timestamp):
+        """Record that this shard has finished its portion of the sweep.
+
+        The Monitor's own Timestamp is locked while we check on the
+        other shards, so that if two shards finish at the same time,
+        exactly one of them will notice that the sweep is complete.
+
+        :return: True if every shard has now finished and the sweep
+            as a whole is complete; False otherwise.
+        """
+        sweep_timestamp = self.timestamp()
+        self._db.flush()
+        sweep_timestamp = self._db.query(Timestamp).filter(
+            Timestamp.id==sweep_timestamp.id
+        ).with_for_update().populate_existing().one()
+
+        now = datetime.datetime.utcnow()
+        shard_timestamp.timestamp = now
+        self._db.flush()
+
+        shard_names = [
+            self.shard_service_name(shard)
+            for shard in range(self.shard_count)
+        ]
+        shard_timestamps = self._db.query(Timestamp).filter(
+            Timestamp.service.in_(shard_names)
+        ).filter(
+            Timestamp.collection_id==self.collection_id
+        ).populate_existing()
+        by_service = dict((x.service, x) for x in shard_timestamps)
+        for name in shard_names:
+            if not self.shard_is_finished(
+                by_service.get(name), sweep_timestamp
+            ):
+                self.log.info(
+                    "%s is finished, but %s is not.",
+                    shard_timestamp.service, name
+                )
+                return False
+
+        # Every shard has finished, which means the sweep is
+        # complete. Updating the Monitor's own Timestamp starts a new
+        # sweep for every shard.
+        sweep_timestamp.timestamp = now
+        return True
+
+    def run(self):
+        timestamp = self.progress_timestamp()
+        if self.is_sharded and self.shard_is_finished(
+            timestamp, self.timestamp()
+        ):
+            # This shard already did its part of the current sweep.
+            # It needs to wait for the other shards to catch up.
+            self.log.info(
+                "%s is waiting for the other shards to finish.",
+                timestamp.service
+            )
+            self._db.commit()
+            return
         offset = timestamp.counter
 
         started_at = datetime.datetime.utcnow()
@@ -292,7 +427,8 @@ class SweepMonitor(CollectionMonitor):
             start_time = time.time()
             old_offset = offset
             try:
-                new_offset = self.process_batch(offset)
+                with metrics.timer("SweepMonitor.process_batch"):
+                    new_offset = self.process_batch(offset)
             except Exception, e:
                 self.log.error("Error during run: %s", e, exc_info=e)
                 break
@@ -300,6 +436,12 @@ class SweepMonitor(CollectionMonitor):
             # We completed one batch of work. Update the Timestamp so
             # we don't do the same work again.
             timestamp.counter = new_offset
+            sweep_complete = True
+            if new_offset == 0 and self.is_sharded:
+                # This shard is done, but the sweep as a whole may
+                # not be. This is recorded in the same transaction as
+                # the counter reset so a crash can't lose track of it.
+                sweep_complete = self.finish_shard(timestamp)
             self._db.commit()
 
             if old_offset != new_offset:
@@ -312,7 +454,8 @@ class SweepMonitor(CollectionMonitor):
             offset = new_offset
             if offset == 0:
                 # We completed a sweep. We're done.
-                self.cleanup()
+                if sweep_complete:
+                    self.cleanup()
                 break
 
     def process_batch(self, offset):
@@ -337,8 +480,10 @@ class SweepMonitor(CollectionMonitor):
 
     def fetch_batch(self, offset):
         """Retrieve one batch of work from the database."""
-        q = self.item_query().filter(self.model_class.id > offset).order_by(
-            self.model_class.id).limit(self.batch_size)
+        q = self.item_query().filter(self.model_class.id > offset)
+        if self.is_sharded:
+            q = q.filter(self.model_class.id % self.shard_count == self.shard)
+        q = q.order_by(self.model_class.id).limit(self.batch_size)
         return q
         
     def item_query(self):
@@ -369,6 +514,28 @@ class SweepMonitor(CollectionMonitor):
         raise NotImplementedError()
 
 
+class SweepMonitorShardJob(DatabaseJob):
+    """Run one shard of a sharded SweepMonitor in a worker thread."""
+
+    def __init__(self, monitor_class, shard, shard_count, collection=None,
+                 **monitor_kwargs):
+        self.monitor_class = monitor_class
+        self.shard = shard
+        self.shard_count = shard_count
+        self.collection = collection
+        self.monitor_kwargs = monitor_kwargs
+
+    def run(self, _db, **kwargs):
+        collection = self.collection
+        if collection:
+            collection = _db.merge(collection)
+        monitor = self.monitor_class(
+            _db, collection=collection, shard=self.shard,
+            shard_count=self.shard_count, **self.monitor_kwargs
+        )
+        monitor.run()
+
+
 class IdentifierSweepMonitor(SweepMonitor):
     """A Monitor that does some work for every Identifier."""
     MODEL_CLASS = Identifier    
@@ -388,13 +555,16 @@ class SubjectSweepMonitor(SweepMonitor):
     # large.
     DEFAULT_BATCH_SIZE = 500
     
-    def __init__(self, _db, subject_type=None, filter_string=None):
+    def __init__(self, _db, subject_type=None, filter_string=None,
+                 **kwargs):
         """Constructor.
         :param subject_type: Only process Subjects of this type.
         :param filter_string: Only process Subjects whose .identifier
            or .name contain this string.
+        :param kwargs: Passed on to SweepMonitor, e.g. to run the
+           sweep in shards.
         """
-        super(SubjectSweepMonitor, self).__init__(_db, None)
+        super(SubjectSweepMonitor, self).__init__(_db, **kwargs)
         self.subject_type = subject_type
         self.filter_string = filter_string
         
@@ -535,10 +705,35 @@ class MakePresentationReadyMonitor(NotPresentationReadyWorkSweepMonitor):
         )
         return super(MakePresentationReadyMonitor, self).run()
 
+    def process_items(self, works):
+        """Run the CoverageProviders on every Work in a batch, then
+        calculate the presentation of the ones that succeeded all at
+        once.
+        """
+        ready = [work for work in works if self._prepare(work)]
+        if ready:
+            PresentationBatch(self._db, ready).calculate_presentation(
+                self.policy
+            )
+        for work in ready:
+            work.set_presentation_ready()
+        for work in works:
+            self.log.log(self.COMPLETION_LOG_LEVEL, "Completed %r", work)
+
     def process_item(self, work):
         """Do the work necessary to make one Work presentation-ready,
         and handle exceptions.
         """
+        if self._prepare(work):
+            work.calculate_presentation(self.policy)
+            work.set_presentation_ready()
+
+    def _prepare(self, work):
+        """Call prepare() and note any exception inside the Work.
+
+        :return: True if the Work is ready to have its presentation
+            calculated.
+        """
         exception = None
 
         try:
@@ -556,10 +751,10 @@ class MakePresentationReadyMonitor(NotPresentationReadyWorkSweepMonitor):
             # reason to stop doing our job. Note it inside the Work
             # and keep going.
             work.presentation_ready_exception = exception
-        else:
-            # Success!
-            work.calculate_presentation(self.policy)
-            work.set_presentation_ready()                    
+            return False
+
+        # Success!
+        return True
 
     def prepare(self, work):
         """Try to make a single Work presentation-ready.
@@ -607,17 +802,46 @@ class WorkRandomnessUpdateMonitor(WorkSweepMonitor):
 
     SERVICE_NAME = "Work Randomness Updater"
     INTERVAL_SECONDS = 3600 * 24
-    DEFAULT_BATCH_SIZE = 1000
-    
+
+    # Each batch is a single UPDATE statement covering this many
+    # Work IDs, so the batch can be much larger than for a Monitor
+    # that processes Works one at a time.
+    DEFAULT_BATCH_SIZE = 50000
+
+    def __init__(self, *args, **kwargs):
+        super(WorkRandomnessUpdateMonitor, self).__init__(*args, **kwargs)
+        self.max_work_id = None
+
     def process_batch(self, offset):
         """Unlike other Monitors, this one leaves process_item() undefined
         because it works on a large number of Works at once using raw
         SQL.
+
+        Every Work whose ID falls in the range [offset,
+        offset+batch_size) gets a new value for Work.random, generated
+        by the database. No Work objects are loaded.
         """
+        offset = offset or 0
+        if self.max_work_id is None:
+            # The highest ID is only looked up once per run; Works
+            # created after that will be randomized on the next run.
+            [[self.max_work_id]] = self._db.execute(
+                select([func.max(Work.id)])
+            )
+        if self.max_work_id is None:
+            # There are no Works at all.
+            return 0
+
         new_offset = offset + self.batch_size
-        text = "update works set random=random() where id >= :offset and id < :new_offset;"
-        self._db.execute(text, dict(offset=offset, new_offset=new_offset))
-        [[self.max_work_id]] = self._db.execute('select max(id) from works')
+        works = Work.__table__
+        update = works.update().where(
+            and_(works.c.id >= offset, works.c.id < new_offset)
+        )
+        if self.is_sharded:
+            update = update.where(
+                works.c.id % self.shard_count == self.shard
+            )
+        self._db.execute(update.values(random=func.random()))
         if self.max_work_id < new_offset:
             # We're all done.
             return 0
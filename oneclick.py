@@ -29,6 +29,7 @@ from model import (
     Hyperlink,
     Identifier,
     Library,
+    PreloadedLookups,
     Representation,
     Subject,
     Work,
@@ -74,6 +75,10 @@ class OneClickAPI(object):
 
     # a complete response returns the json structure with more data fields than a basic response does
     RESPONSE_VERBOSITY = {0:'basic', 1:'compact', 2:'complete', 3:'extended', 4:'hypermedia'}
+
+    # populate_all_catalog() imports books, and commits, in batches
+    # of this size.
+    CATALOG_BATCH_SIZE = 100
    
     log = logging.getLogger("OneClick API")
 
@@ -387,41 +392,69 @@ class OneClickAPI(object):
             replacement_policy=metadata_replacement_policy
         )
 
-        for catalog_item in catalog_list:
-            result = coverage_provider.update_metadata(
-                catalog_item=catalog_item
+        for start in range(0, items_transmitted, self.CATALOG_BATCH_SIZE):
+            batch = catalog_list[start:start+self.CATALOG_BATCH_SIZE]
+
+            # Look up everything this batch of books refers to at
+            # once, rather than one book at a time.
+            metadatas = [
+                OneClickRepresentationExtractor.isbn_info_to_metadata(x)
+                for x in batch
+            ]
+            lookups = Metadata.preload(
+                self._db, [x for x in metadatas if x],
+                collection=self.collection
             )
-            if not isinstance(result, CoverageFailure):
-                items_created += 1
-
-                if isinstance(result, Identifier):
-                    # calls work.set_presentation_ready() for us
-                    coverage_provider.handle_success(result)
-
-                    # We're populating the catalog, so we can assume the list OneClick
-                    # sent us is of books we own licenses to.  
-                    # NOTE:  TODO later:  For the 4 out of 2000 libraries that chose to display 
-                    # books they don't own, we'd need to call the search endpoint to get 
-                    # the interest field, and then deal with licenses_owned. 
-                    for lp in result.licensed_through:
-                        if lp.collection == self.collection:
-                            lp.licenses_owned = 1
-
-                            # Start off by assuming the book is available.
-                            # If it's not, we'll hear differently the
-                            # next time we use the collection delta API.
-                            lp.licenses_available = 1
-            if not items_created % 100:
-                # Periodically commit the work done so that if there's
-                # a failure, the subsequent run through this code will
-                # take less time.
-                self._db.commit()
+            lookups.install(self._db)
+            try:
+                for catalog_item in batch:
+                    if self.populate_catalog_item(
+                            coverage_provider, catalog_item):
+                        items_created += 1
+            finally:
+                PreloadedLookups.uninstall(self._db)
+
+            # Periodically commit the work done so that if there's
+            # a failure, the subsequent run through this code will
+            # take less time.
+            self._db.commit()
         # stay data, stay!
         self._db.commit()
 
         return items_transmitted, items_created
 
 
+    def populate_catalog_item(self, coverage_provider, catalog_item):
+        """Create or update the database objects for one book in the
+        library's catalog.
+
+        :return: True if the book was imported.
+        """
+        result = coverage_provider.update_metadata(
+            catalog_item=catalog_item
+        )
+        if isinstance(result, CoverageFailure):
+            return False
+
+        if isinstance(result, Identifier):
+            # calls work.set_presentation_ready() for us
+            coverage_provider.handle_success(result)
+
+            # We're populating the catalog, so we can assume the list OneClick
+            # sent us is of books we own licenses to.  
+            # NOTE:  TODO later:  For the 4 out of 2000 libraries that chose to display 
+            # books they don't own, we'd need to call the search endpoint to get 
+            # the interest field, and then deal with licenses_owned. 
+            for lp in result.licensed_through:
+                if lp.collection == self.collection:
+                    lp.licenses_owned = 1
+
+                    # Start off by assuming the book is available.
+                    # If it's not, we'll hear differently the
+                    # next time we use the collection delta API.
+                    lp.licenses_available = 1
+        return True
+
     def populate_delta(self, months=1):
         """ Call get_delta for the last month to get all of the library's book info changes 
         from OneClick.  Update Work, Edition, LicensePool objects in our database.
@@ -45,6 +45,7 @@ from model import (
     Identifier,
     Edition,
     Measurement,
+    PresentationBatch,
     Subject,
     Work,
 )
@@ -56,6 +57,8 @@ from lane import (
     SearchFacets,
     WorkList,
 )
+from util import metrics
+from util.read_replica import read_replica
 from util.opds_writer import (
     AtomFeed,
     OPDSFeed,
@@ -483,8 +486,13 @@ class VerboseAnnotator(Annotator):
         _db = Session.object_session(work)
         by_scheme_and_term = dict()
         identifier_ids = work.all_identifier_ids(cutoff=identifier_cutoff)
-        classifications = Identifier.classifications_for_identifier_ids(
-            _db, identifier_ids)
+        classifications = None
+        batch = PresentationBatch.for_session(_db)
+        if batch:
+            classifications = batch.classifications_for(identifier_ids)
+        if classifications is None:
+            classifications = Identifier.classifications_for_identifier_ids(
+                _db, identifier_ids)
         for c in classifications:
             subject = c.subject
             if subject.type in Subject.uri_lookup:
@@ -556,6 +564,7 @@ class AcquisitionFeed(OPDSFeed):
     NO_CACHE = object()
 
     @classmethod
+    @metrics.timed("AcquisitionFeed.groups")
     def groups(cls, _db, title, url, lane, annotator,
                cache_type=None, force_refresh=False, facets=None):
         """The acquisition feed for 'featured' items from a given lane's
@@ -673,6 +682,7 @@ class AcquisitionFeed(OPDSFeed):
         return content
 
     @classmethod
+    @metrics.timed("AcquisitionFeed.page")
     def page(cls, _db, title, url, lane, annotator,
              cache_type=None, facets=None, pagination=None,
              force_refresh=False
@@ -711,7 +721,8 @@ class AcquisitionFeed(OPDSFeed):
             # The Lane believes that creating this feed is a bad idea.
             works = []
         else:
-            works = works_q.all()
+            with read_replica(_db), metrics.timer("WorkList.works"):
+                works = works_q.all()
             pagination.this_page_size = len(works)
         feed = cls(_db, title, url, works, annotator)
 
@@ -986,7 +997,7 @@ class AcquisitionFeed(OPDSFeed):
     def grouped_max_age(cls, _db):
         "The maximum cache time for a grouped acquisition feed."
         value = ConfigurationSetting.sitewide(
-            _db, cls.GROUPED_MAX_AGE_POLICY).int_value
+            _db, cls.GROUPED_MAX_AGE_POLICY, snapshot=True).int_value
         if value is None:
             value = cls.DEFAULT_GROUPED_MAX_AGE
         return value
@@ -995,7 +1006,7 @@ class AcquisitionFeed(OPDSFeed):
     def nongrouped_max_age(cls, _db):
         "The maximum cache time for a non-grouped acquisition feed."
         value = ConfigurationSetting.sitewide(
-            _db, cls.NONGROUPED_MAX_AGE_POLICY).int_value
+            _db, cls.NONGROUPED_MAX_AGE_POLICY, snapshot=True).int_value
         if value is cls.CACHE_FOREVER:
             logging.error(
                 "Non-grouped acquisition feed cannot be cached forever."
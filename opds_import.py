@@ -8,8 +8,11 @@ import base64
 import datetime
 import feedparser
 import logging
+import re
 import traceback
 import urllib
+from functools import partial
+from Queue import Queue
 from urlparse import urlparse, urljoin
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm.session import Session
@@ -18,7 +21,10 @@ from flask_babel import lazy_gettext as _
 from lxml import builder, etree
 
 from monitor import CollectionMonitor
-from util import LanguageCodes
+from util import (
+    LanguageCodes,
+    feedparser_helpers,
+)
 from util.xmlparser import XMLParser
 from config import (
     CannotLoadConfiguration,
@@ -60,6 +66,7 @@ from util.opds_writer import (
     OPDSFeed,
     OPDSMessage,
 )
+from util.worker_pools import Pool
 from mirror import MirrorUploader
 from selftest import HasSelfTests
 
@@ -330,6 +337,7 @@ class OPDSXMLParser(XMLParser):
                    "schema" : "http://schema.org/",
                    "atom" : "http://www.w3.org/2005/Atom",
                    "drm": "http://librarysimplified.org/terms/drm",
+                   "bibframe": "http://bibframe.org/vocab/",
     }
 
 
@@ -388,6 +396,21 @@ class OPDSImporter(object):
     # when they show up in <simplified:message> tags.
     SUCCESS_STATUS_CODES = None
 
+    # extract_feed_data feeds the document to lxml in chunks of this
+    # many bytes.
+    STREAMING_CHUNK_SIZE = 64 * 1024
+
+    # An XML declaration, which must be removed from a document that
+    # has already been decoded into Unicode.
+    XML_DECLARATION = re.compile(u"^\\s*<\\?xml[^>]*\\?>")
+
+    # feedparser's names for the types of Atom text constructs.
+    TEXT_CONSTRUCT_TYPES = {
+        "text": "text/plain",
+        "html": "text/html",
+        "xhtml": "application/xhtml+xml",
+    }
+
     def __init__(self, _db, collection, data_source_name=None,
                  identifier_mapping=None, mirror=None, http_get=None,
                  metadata_client=None, content_modifier=None,
@@ -436,6 +459,10 @@ class OPDSImporter(object):
             data_source_name = data_source_name or DataSource.METADATA_WRANGLER
         self.data_source_name = data_source_name
         self.identifier_mapping = identifier_mapping
+
+        # Identifiers for the URNs in the feed currently being
+        # imported, so each URN only needs to be looked up once.
+        self.identifiers_by_urn = {}
         try:
             self.metadata_client = metadata_client or MetadataWranglerOPDSLookup.from_config(_db, collection=collection)
         except CannotLoadConfiguration, e:
@@ -571,7 +598,7 @@ class OPDSImporter(object):
                 # Rather than scratch the whole import, treat this as a failure that only applies
                 # to this item.
                 self.log.error("Error importing an OPDS item", exc_info=e)
-                identifier, ignore = Identifier.parse_urn(self._db, key)
+                identifier = self.identifier_for_urn(key)
                 data_source = self.data_source
                 failure = CoverageFailure(identifier, traceback.format_exc(), data_source=data_source, transient=False)
                 failures[key] = failure
@@ -590,7 +617,7 @@ class OPDSImporter(object):
                 if work:
                     works[key] = work
             except Exception, e:
-                identifier, ignore = Identifier.parse_urn(self._db, key)
+                identifier = self.identifier_for_urn(key)
                 data_source = self.data_source
                 failure = CoverageFailure(identifier, traceback.format_exc(), data_source=data_source, transient=False)
                 failures[key] = failure
@@ -696,10 +723,9 @@ class OPDSImporter(object):
             return
 
         mapping = dict()
-        identifiers_by_urn, failures = Identifier.parse_urns(
-            self._db, external_urns, autocreate=False
-        )
-        external_identifiers = identifiers_by_urn.values()
+        external_identifiers = self.identifiers_for_urns(
+            external_urns, autocreate=False
+        ).values()
 
         internal_identifier = aliased(Identifier)
         qu = self._db.query(Identifier, internal_identifier)\
@@ -716,35 +742,89 @@ class OPDSImporter(object):
 
         self.identifier_mapping = mapping
 
+    def identifiers_for_urns(self, urns, autocreate=True):
+        """Find (and, optionally, create) the Identifiers for a batch of
+        URNs using as few queries as possible.
+
+        The Identifiers are kept in self.identifiers_by_urn, so URNs
+        that have already been looked up are not looked up again.
+
+        :return: A dictionary mapping URNs to Identifiers. URNs that
+        could not be turned into Identifiers are left out.
+        """
+        unknown = [x for x in urns if x not in self.identifiers_by_urn]
+        if unknown:
+            identifiers, ignore = Identifier.parse_urns(
+                self._db, unknown, autocreate=autocreate
+            )
+
+            # parse_urns keys its results by each Identifier's own
+            # URN, which isn't always the URN that was passed in
+            # (e.g. an ISBN-10 becomes an ISBN-13).
+            by_details = dict(
+                ((x.type, x.identifier), x) for x in identifiers.values()
+            )
+            for urn in unknown:
+                if urn in identifiers:
+                    self.identifiers_by_urn[urn] = identifiers[urn]
+                    continue
+                try:
+                    details = Identifier.prepare_foreign_type_and_identifier(
+                        *Identifier.type_and_identifier_for_urn(urn)
+                    )
+                except ValueError, e:
+                    continue
+                if details in by_details:
+                    self.identifiers_by_urn[urn] = by_details[details]
+
+        return dict(
+            (urn, self.identifiers_by_urn[urn]) for urn in urns
+            if urn in self.identifiers_by_urn
+        )
+
+    def identifier_for_urn(self, urn):
+        """Find or create the Identifier for a single URN, using the
+        Identifiers already looked up for this feed if possible.
+        """
+        identifier = self.identifiers_by_urn.get(urn)
+        if not identifier:
+            identifier, ignore = Identifier.parse_urn(self._db, urn)
+            self.identifiers_by_urn[urn] = identifier
+        return identifier
+
     def extract_feed_data(self, feed, feed_url=None):
         """Turn an OPDS feed into lists of Metadata and CirculationData objects, 
         with associated messages and next_links.
         """
         data_source = self.data_source
-        fp_metadata, fp_failures = self.extract_data_from_feedparser(feed=feed, data_source=data_source)
-        # gets: medium, measurements, links, contributors, etc.
-        xml_data_meta, xml_failures = self.extract_metadata_from_elementtree(
+        values, failures = self.extract_data_from_stream(
             feed, data_source=data_source, feed_url=feed_url
         )
 
+        # Look up every Identifier mentioned in the feed at once. The
+        # results are used for the rest of this feed's import.
+        urns = values.keys() + failures.keys()
+        self.identifiers_by_urn = {}
+        self.identifiers_for_urns(urns)
+
         if self.map_from_collection:
             # Build the identifier_mapping based on the Collection.
-            self.build_identifier_mapping(fp_metadata.keys() + fp_failures.keys())
+            self.build_identifier_mapping(urns)
 
         # translate the id in failures to identifier.urn
         identified_failures = {}
-        for urn, failure in fp_failures.items() + xml_failures.items():
+        for urn, failure in failures.items():
             identifier, failure = self.handle_failure(urn, failure)
             identified_failures[identifier.urn] = failure
 
-        # Use one loop for both, since the id will be the same for both dictionaries.
         metadata = {}
         circulationdata = {}
-        for id, m_data_dict in fp_metadata.items():
-            external_identifier, ignore = Identifier.parse_urn(self._db, id)
+        for id, (m_data_dict, xml_data_dict) in values.items():
+            external_identifier = self.identifier_for_urn(id)
             if self.identifier_mapping:
                 internal_identifier = self.identifier_mapping.get(
                     external_identifier, external_identifier)
+                self.identifiers_by_urn[internal_identifier.urn] = internal_identifier
             else:
                 internal_identifier = external_identifier
 
@@ -752,13 +832,11 @@ class OPDSImporter(object):
             if internal_identifier.urn in identified_failures.keys():
                 continue
 
-            identifier_obj = IdentifierData(
-                type=internal_identifier.type,
-                identifier=internal_identifier.identifier
-            )
+            # Metadata and CirculationData can use the Identifier we
+            # already have rather than looking it up again.
+            identifier_obj = internal_identifier
 
             # form the Metadata object
-            xml_data_dict = xml_data_meta.get(id, {})
             combined_meta = self.combine(m_data_dict, xml_data_dict)
             if combined_meta.get('data_source') is None:
                 combined_meta['data_source'] = self.data_source_name
@@ -819,7 +897,7 @@ class OPDSImporter(object):
         that what a normal OPDSImporter would consider 'failure' is
         considered success.
         """
-        external_identifier, ignore = Identifier.parse_urn(self._db, urn)
+        external_identifier = self.identifier_for_urn(urn)
         if self.identifier_mapping:
             # The identifier found in the OPDS feed is different from 
             # the identifier we want to export.
@@ -960,6 +1038,108 @@ class OPDSImporter(object):
                     values[identifier] = detail
         return values, failures
 
+    @classmethod
+    def extract_data_from_stream(cls, feed, data_source, feed_url=None):
+        """Make a single streaming pass over an OPDS feed, gathering
+        everything extract_data_from_feedparser and
+        extract_metadata_from_elementtree would find between them.
+
+        Each <entry> tag is discarded as soon as it has been processed,
+        so a large feed is never held in memory all at once.
+
+        :return: A 2-tuple (values, failures). `values` maps each
+        identifier to a 2-tuple of dictionaries: the feedparser-style
+        keyword arguments and the elementtree-style keyword arguments
+        for the Metadata constructor.
+        """
+        values = {}
+        failures = {}
+        parser = cls.PARSER_CLASS()
+        link_tag_name = '{%s}link' % parser.NAMESPACES['atom']
+        entry_tag_name = '{%s}entry' % parser.NAMESPACES['atom']
+        message_tag_name = '{%s}message' % parser.NAMESPACES['simplified']
+
+        tag_names = [link_tag_name, entry_tag_name, message_tag_name]
+        for tag in cls._top_level_tags(feed, tag_names):
+            if tag.tag == link_tag_name:
+                # Some OPDS feeds contain relative urls, so we need
+                # the feed's self URL to extract links. It has to
+                # show up before the entries to be any use to them.
+                if not feed_url and tag.get('rel') == 'self':
+                    feed_url = tag.get('href')
+
+            elif tag.tag == message_tag_name:
+                message = cls.extract_message(parser, tag)
+                failure = cls.coveragefailure_from_message(
+                    data_source, message
+                )
+                if isinstance(failure, Identifier):
+                    # The Simplified <message> tag does not actually
+                    # represent a failure -- it was turned into an
+                    # Identifier instead of a CoverageFailure.
+                    failures[failure.urn] = failure
+                elif failure:
+                    failures[failure.obj.urn] = failure
+
+            else:
+                entry = cls.feedparser_entry_from_tag(parser, tag)
+                identifier, detail, failure = cls.data_detail_for_feedparser_entry(
+                    entry=entry, data_source=data_source
+                )
+                if not identifier:
+                    logging.error(
+                        "Tried to parse an element without a valid identifier.  feed=%s" % feed
+                    )
+                    continue
+                ignore, xml_detail, xml_failure = cls.detail_for_elementtree_entry(
+                    parser, tag, data_source, feed_url
+                )
+                failure = xml_failure or failure
+                if failure:
+                    failures[identifier] = failure
+                elif detail:
+                    values[identifier] = (detail, xml_detail or {})
+        return values, failures
+
+    @classmethod
+    def _top_level_tags(cls, feed, tag_names):
+        """Stream through an OPDS document, yielding each child of the
+        <atom:feed> tag with one of the given names as soon as the end
+        of that child has been parsed.
+
+        Once the caller is done with a tag, it's cleared and removed
+        from the tree along with everything that came before it.
+        """
+        if isinstance(feed, unicode):
+            # The document has already been decoded, so whatever
+            # encoding its XML declaration names is no longer true.
+            feed = cls.XML_DECLARATION.sub(u"", feed, count=1)
+            feed = feed.encode("utf8")
+        feed_tag_name = '{%s}feed' % cls.PARSER_CLASS.NAMESPACES['atom']
+
+        parser = etree.XMLPullParser(events=('end',), tag=tag_names)
+        def parsed_tags():
+            for event, tag in parser.read_events():
+                parent = tag.getparent()
+                if parent is None or parent.tag != feed_tag_name:
+                    # This is something like an <atom:link> inside an
+                    # <atom:entry>. It will be handled along with
+                    # the entry.
+                    continue
+                yield tag
+                tag.clear()
+                while tag.getprevious() is not None:
+                    del parent[0]
+
+        chunk_size = cls.STREAMING_CHUNK_SIZE
+        for start in range(0, len(feed), chunk_size):
+            parser.feed(feed[start:start+chunk_size])
+            for tag in parsed_tags():
+                yield tag
+        parser.close()
+        for tag in parsed_tags():
+            yield tag
+
     @classmethod
     def _datetime(cls, entry, key):
         value = entry.get(key, None)
@@ -974,6 +1154,107 @@ class OPDSImporter(object):
         updated = cls._datetime(entry, 'updated_parsed')
         return (identifier, updated)
 
+    @classmethod
+    def feedparser_entry_from_tag(cls, parser, entry_tag):
+        """Build, from an lxml <entry> tag, the parts of a feedparser
+        entry dictionary that data_detail_for_feedparser_entry uses.
+        """
+        entry = dict()
+
+        def text_of(expression):
+            # As with feedparser, the last matching tag wins. lxml
+            # gives plain ASCII text as a str, but feedparser always
+            # gives unicode.
+            tags = parser._xpath(entry_tag, expression)
+            if not tags or not tags[-1].text:
+                return None
+            return unicode(tags[-1].text.strip())
+
+        def date_of(expression):
+            value = text_of(expression)
+            if not value:
+                return None
+            return feedparser_helpers.parse_date(value)
+
+        for key, expression in (
+            ('id', 'atom:id'),
+            ('schema_alternativeheadline', 'schema:alternativeHeadline'),
+            ('publisher', 'dc:publisher'),
+            ('dcterms_publisher', 'dcterms:publisher'),
+            ('language', 'dc:language'),
+            ('dcterms_language', 'dcterms:language'),
+            ('rights', 'atom:rights|dc:rights'),
+        ):
+            value = text_of(expression)
+            if value:
+                entry[key] = value
+
+        title_tag = parser._xpath1(entry_tag, 'atom:title')
+        if title_tag is not None:
+            entry['title'] = cls._text_construct_detail(title_tag)['value']
+
+        # feedparser falls back to the publication date when no
+        # update date is given.
+        updated = date_of('atom:updated|dcterms:modified|dc:date')
+        if not updated:
+            updated = date_of('atom:published|dcterms:issued')
+        if updated:
+            entry['updated_parsed'] = updated
+
+        distribution_tag = parser._xpath1(entry_tag, 'bibframe:distribution')
+        if distribution_tag is not None:
+            provider_name = distribution_tag.get(
+                '{%s}ProviderName' % parser.NAMESPACES['bibframe']
+            )
+            if provider_name is not None:
+                provider_name = unicode(provider_name)
+            entry['bibframe_distribution'] = {
+                'bibframe:providername': provider_name
+            }
+
+        # The first summary becomes the summary; any others are
+        # treated as content.
+        summaries = [
+            cls._text_construct_detail(tag, default_type='text/html')
+            for tag in parser._xpath(entry_tag, 'atom:summary|dc:description')
+        ]
+        contents = [
+            cls._text_construct_detail(tag)
+            for tag in parser._xpath(entry_tag, 'atom:content')
+        ]
+        if summaries:
+            entry['summary_detail'] = summaries[0]
+            contents = summaries[1:] + contents
+        if contents:
+            entry['content'] = contents
+        return entry
+
+    @classmethod
+    def _text_construct_detail(cls, tag, default_type="text"):
+        """Turn an Atom text construct such as <atom:summary> into a
+        dictionary like the ones feedparser creates for them.
+
+        As with feedparser, HTML is sanitized.
+        """
+        if tag.tag.startswith('{%s}' % cls.PARSER_CLASS.NAMESPACES['atom']):
+            # An Atom text construct is plain text unless it says
+            # otherwise.
+            default_type = "text"
+        media_type = tag.get('type', default_type)
+        media_type = cls.TEXT_CONSTRUCT_TYPES.get(media_type, media_type)
+        if media_type == "application/xhtml+xml":
+            # The markup is inside a wrapper <div>.
+            value = u"".join(
+                etree.tostring(child, encoding=unicode, with_tail=False)
+                for child in tag
+            )
+        else:
+            value = unicode(tag.text or u"")
+        value = value.strip()
+        if value and media_type in ("text/html", "application/xhtml+xml"):
+            value = feedparser_helpers.sanitize_html(value, media_type)
+        return dict(type=media_type, value=value)
+
     @classmethod
     def data_detail_for_feedparser_entry(cls, entry, data_source):
         """Turn an entry dictionary created by feedparser into dictionaries of data
@@ -1139,33 +1420,37 @@ class OPDSImporter(object):
         """
         path = '/atom:feed/simplified:message'
         for message_tag in parser._xpath(feed_tag, path):
+            yield cls.extract_message(parser, message_tag)
 
-            # First thing to do is determine which Identifier we're
-            # talking about.
-            identifier_tag = parser._xpath1(message_tag, 'atom:id')
-            if identifier_tag is None:
-                urn = None
-            else:
-                urn = identifier_tag.text
+    @classmethod
+    def extract_message(cls, parser, message_tag):
+        """Convert a <simplified:message> tag into an OPDSMessage object."""
+        # First thing to do is determine which Identifier we're
+        # talking about.
+        identifier_tag = parser._xpath1(message_tag, 'atom:id')
+        if identifier_tag is None:
+            urn = None
+        else:
+            urn = identifier_tag.text
 
-            # What status code is associated with the message?
-            status_code_tag = parser._xpath1(message_tag, 'simplified:status_code')
-            if status_code_tag is None:
+        # What status code is associated with the message?
+        status_code_tag = parser._xpath1(message_tag, 'simplified:status_code')
+        if status_code_tag is None:
+            status_code = None
+        else:
+            try:
+                status_code = int(status_code_tag.text)
+            except ValueError:
                 status_code = None
-            else:
-                try:
-                    status_code = int(status_code_tag.text)
-                except ValueError:
-                    status_code = None
-
-            # What is the human-readable message?
-            description_tag = parser._xpath1(message_tag, 'schema:description')
-            if description_tag is None:
-                description = ''
-            else:
-                description = description_tag.text
+
+        # What is the human-readable message?
+        description_tag = parser._xpath1(message_tag, 'schema:description')
+        if description_tag is None:
+            description = ''
+        else:
+            description = description_tag.text
         
-            yield OPDSMessage(urn, status_code, description)
+        return OPDSMessage(urn, status_code, description)
     
     @classmethod
     def coveragefailures_from_messages(cls, data_source, parser, feed_tag):
@@ -1543,8 +1828,12 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
     # specialize OPDS import should override this.
     PROTOCOL = ExternalIntegration.OPDS_IMPORT
 
+    # This many pages of the OPDS feed may be downloaded at once.
+    DEFAULT_FETCH_CONCURRENCY = 4
+
     def __init__(self, _db, collection, import_class,
-                 force_reimport=False, **import_class_kwargs):
+                 force_reimport=False, fetch_concurrency=None,
+                 **import_class_kwargs):
         if not collection:
             raise ValueError(
                 "OPDSImportMonitor can only be run in the context of a Collection."
@@ -1566,6 +1855,9 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
         self.external_integration_id = collection.external_integration.id
         self.feed_url = self.opds_url(collection)
         self.force_reimport = force_reimport
+        self.fetch_concurrency = (
+            fetch_concurrency or self.DEFAULT_FETCH_CONCURRENCY
+        )
         self.username = collection.external_integration.username
         self.password = collection.external_integration.password
         self.importer = import_class(
@@ -1730,13 +2022,14 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
                 )
                 return True
 
-    def follow_one_link(self, url, do_get=None):
-        """Download a representation of a URL and extract the useful
-        information.
+    def fetch_one_link(self, url, do_get=None):
+        """Download one page of the OPDS feed and make sure it's
+        actually an OPDS feed.
 
-        :return: A 2-tuple (next_links, feed). `next_links` is a list of 
-            additional links that need to be followed. `feed` is the content
-            that needs to be imported.
+        This method doesn't touch the database, so it's safe to call
+        from a worker thread.
+
+        :return: The content of the page.
         """
         self.log.info("Following next link: %s", url)
         get = do_get or self._get
@@ -1753,7 +2046,17 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
                 url, message=message, debug_message=feed,
                 status_code=status_code
             )
+        return feed
 
+    def follow_one_link(self, url, do_get=None):
+        """Download a representation of a URL and extract the useful
+        information.
+
+        :return: A 2-tuple (next_links, feed). `next_links` is a list of 
+            additional links that need to be followed. `feed` is the content
+            that needs to be imported.
+        """
+        feed = self.fetch_one_link(url, do_get=do_get)
         new_data = self.feed_contains_new_data(feed)
 
         if new_data:
@@ -1767,6 +2070,22 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
             self.log.info("No new data.")
             return [], None
 
+    def feed_updated_since(self, feed, start):
+        """Was any entry in the given feed updated on the remote side
+        at or after the given time?
+
+        :param start: A datetime. If this is None, every feed counts
+            as updated.
+        """
+        if not start:
+            return True
+        for identifier, remote_updated in (
+            self.importer.extract_last_update_dates(feed)
+        ):
+            if remote_updated >= start:
+                return True
+        return False
+
     def import_one_feed(self, feed):
         """Import every book mentioned in an OPDS feed."""
         
@@ -1792,30 +2111,64 @@ class OPDSImportMonitor(CollectionMonitor, HasSelfTests):
                 operation=CoverageRecord.IMPORT_OPERATION
             )
         
-    def run_once(self, start_ignore, cutoff_ignore):
-        feeds = []
-        queue = [self.feed_url]
-        seen_links = set([])
-        
-        # First, follow the feed's next links until we reach a page with
-        # nothing new. If any link raises an exception, nothing will be imported.
-        while queue:
-            new_queue = []
+    def run_once(self, start, cutoff_ignore):
+        """Crawl the OPDS feed, importing each page as it arrives.
+
+        Pages are downloaded by a pool of worker threads, so the next
+        page is on its way while the current page is being imported,
+        and if a page has several next links, they're downloaded in
+        parallel. All database work happens in this thread, and only
+        one page is held in memory at a time.
+
+        Pages are imported newest-first, so a run that fails partway
+        through may leave older pages unimported even though the
+        newer pages no longer contain anything new. To recover from
+        this, we keep following next links past any page that has
+        entries updated since the last successful run -- the
+        Timestamp is only updated when a run succeeds.
+
+        :param start: The time the last successful run started, or
+            None if there has never been a successful run.
+        """
+        results = Queue()
 
-            for link in queue:
-                if link in seen_links:
-                    continue
-                next_links, feed = self.follow_one_link(link)
-                new_queue.extend(next_links)
-                if feed:
-                    feeds.append((link, feed))
-                seen_links.add(link)
-
-            queue = new_queue
-
-        # Start importing at the end. If something fails, it will be easier to
-        # pick up where we left off.
-        for link, feed in reversed(feeds):
-            self.log.info("Importing next feed: %s", link)
-            self.import_one_feed(feed)
-            self._db.commit()
+        def fetch(link):
+            try:
+                results.put((link, self.fetch_one_link(link), None))
+            except Exception, e:
+                results.put((link, None, e))
+
+        seen_links = set([self.feed_url])
+        with Pool(self.fetch_concurrency) as pool:
+            pool.put(partial(fetch, self.feed_url))
+            pending = 1
+            while pending:
+                link, feed, exception = results.get()
+                pending -= 1
+                if exception:
+                    # Pages that were already imported stay imported,
+                    # but the Timestamp won't be updated.
+                    raise exception
+
+                # Parse the feed once for all the checks we need to make.
+                parsed = feedparser.parse(feed)
+                new_data = self.feed_contains_new_data(parsed)
+                if new_data or self.feed_updated_since(parsed, start):
+                    # Start downloading the next page(s) before
+                    # importing this one.
+                    for next_link in self.importer.extract_next_links(
+                        parsed
+                    ):
+                        if next_link in seen_links:
+                            continue
+                        seen_links.add(next_link)
+                        pool.put(partial(fetch, next_link))
+                        pending += 1
+                del parsed
+
+                if new_data:
+                    self.log.info("Importing next feed: %s", link)
+                    self.import_one_feed(feed)
+                    self._db.commit()
+                else:
+                    self.log.info("No new data in %s.", link)
@@ -1,11 +1,20 @@
+import datetime
 import logging
 import os
+import traceback
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import (
     BotoCoreError,
     ClientError,
 )
 import urllib
+from Queue import Queue
+from StringIO import StringIO
+from threading import (
+    RLock,
+    Thread,
+)
 from flask_babel import lazy_gettext as _
 from nose.tools import set_trace
 from sqlalchemy.orm.session import Session
@@ -28,6 +37,7 @@ class S3Uploader(MirrorUploader):
 
     BOOK_COVERS_BUCKET_KEY = u'book_covers_bucket'
     OA_CONTENT_BUCKET_KEY = u'open_access_content_bucket'
+    BLOB_STORE_BUCKET_KEY = u'blob_store_bucket'
 
     URL_TEMPLATE_KEY = u'bucket_name_transform'
     URL_TEMPLATE_HTTP = u'http'
@@ -49,6 +59,9 @@ class S3Uploader(MirrorUploader):
         { "key": OA_CONTENT_BUCKET_KEY, "label": _("Open Access Content Bucket"), "optional": True,
           "description" : _("All open-access books encountered will be uploaded to this S3 bucket. <p>The bucket must already exist&mdash;it will not be created automatically.</p>")
         },
+        { "key": BLOB_STORE_BUCKET_KEY, "label": _("Cached Content Bucket"), "optional": True,
+          "description" : _("If this is set, documents downloaded from the Web (cover images, books, API responses) will be stored in this S3 bucket instead of in the database. <p>The bucket must already exist&mdash;it will not be created automatically.</p>")
+        },
         { "key": URL_TEMPLATE_KEY, "label": _("URL format"),
           "type": "select",
           "options" : [
@@ -69,6 +82,15 @@ class S3Uploader(MirrorUploader):
 
     SITEWIDE = True
 
+    # mirror_batch() uploads this many representations at once.
+    MIRROR_BATCH_CONCURRENCY = 8
+
+    # Documents at least this large are uploaded in parts of
+    # MULTIPART_CHUNKSIZE bytes, each read from the document's
+    # filehandle as it's needed.
+    MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
     def __init__(self, integration, client_class=None):
         """Instantiate an S3Uploader from an ExternalIntegration.
 
@@ -282,6 +304,138 @@ class S3Uploader(MirrorUploader):
         finally:
             fh.close()
 
+    @property
+    def transfer_config(self):
+        """Configure multipart uploads for mirror_batch().
+
+        mirror_batch() has its own pool of threads, so each individual
+        upload happens in a single thread.
+        """
+        return TransferConfig(
+            multipart_threshold=self.MULTIPART_THRESHOLD,
+            multipart_chunksize=self.MULTIPART_CHUNKSIZE,
+            use_threads=False,
+        )
+
+    def mirror_batch(self, representations, mirror_to=None,
+                     concurrency=None):
+        """Mirror a number of representations at once.
+
+        :param representations: A list of Representations.
+
+        :param mirror_to: A function that takes a Representation and
+            returns the URL to mirror it to, like the `mirror_to`
+            argument to mirror_one(). By default, each Representation
+            is mirrored to its own `url`, as a thumbnail is.
+
+        Uploads happen concurrently in a pool of threads. The outcome
+        of each upload is recorded in its Representation when the
+        whole batch is done.
+        """
+        mirror_to = mirror_to or (lambda representation: representation.url)
+        concurrency = concurrency or self.MIRROR_BATCH_CONCURRENCY
+
+        # Filehandles are opened only as the workers become ready for
+        # them, so a big batch doesn't open all of its files at once.
+        jobs = Queue(maxsize=concurrency)
+        outcomes = []
+
+        def work():
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                outcomes.append(self._mirror_in_thread(*job))
+
+        threads = [Thread(target=work) for i in range(concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for representation in representations:
+                # Finding the content may mean talking to the
+                # database, so it has to happen in this thread.
+                try:
+                    destination = mirror_to(representation)
+                    fh = representation.external_content()
+                except Exception, e:
+                    logging.error(
+                        "Could not get content of %r to mirror: %r",
+                        representation, e, exc_info=e
+                    )
+                    outcomes.append(
+                        (representation, None, traceback.format_exc())
+                    )
+                    continue
+                if not fh:
+                    outcomes.append(
+                        (representation, None,
+                         "Representation has no content to mirror.")
+                    )
+                    continue
+                jobs.put(
+                    (representation, destination,
+                     representation.external_media_type, fh)
+                )
+        finally:
+            for thread in threads:
+                jobs.put(None)
+            for thread in threads:
+                thread.join()
+
+            # Even if something went wrong, record the uploads that
+            # already happened.
+            now = datetime.datetime.utcnow()
+            for representation, mirror_url, exception in outcomes:
+                if mirror_url:
+                    representation.mirror_url = mirror_url
+                    representation.mirrored_at = now
+                    representation.mirror_exception = None
+                elif exception:
+                    representation.mirrored_at = None
+                    representation.mirror_exception = exception
+
+    def _mirror_in_thread(self, representation, mirror_to, media_type, fh):
+        """Upload one document on behalf of mirror_batch().
+
+        This runs in a worker thread, so it doesn't touch the
+        Representation.
+
+        :return: A 3-tuple (representation, mirror_url, exception).
+        If the upload succeeded, `mirror_url` is the URL to record.
+        If it failed for a reason that's worth recording, `exception`
+        explains why. If it failed for a transient reason, both are
+        None.
+        """
+        bucket, remote_filename = self.bucket_and_filename(mirror_to)
+        try:
+            self.client.upload_fileobj(
+                Fileobj=fh,
+                Bucket=bucket,
+                Key=remote_filename,
+                ExtraArgs=dict(ContentType=media_type),
+                Config=self.transfer_config,
+            )
+            mirror_url = self.final_mirror_url(bucket, remote_filename)
+            logging.info("MIRRORED %s", mirror_url)
+            return representation, mirror_url, None
+        except (BotoCoreError, ClientError), e:
+            # As in mirror_one(), this is treated as a transient error.
+            logging.error(
+                "Error uploading %s: %r", mirror_to, e, exc_info=e
+            )
+            return representation, None, None
+        except Exception, e:
+            # Unlike in mirror_one(), we can't let this propagate
+            # without losing the rest of the batch.
+            logging.error(
+                "Error uploading %s: %r", mirror_to, e, exc_info=e
+            )
+            return representation, None, traceback.format_exc()
+        finally:
+            fh.close()
+
 # MirrorUploader.implementation will instantiate an S3Uploader
 # for storage integrations with protocol 'Amazon S3'.
 MirrorUploader.IMPLEMENTATION_REGISTRY[S3Uploader.NAME] = S3Uploader
@@ -311,6 +465,14 @@ class MockS3Uploader(S3Uploader):
         else:
             representation.set_as_mirrored(mirror_to)
 
+    def mirror_batch(self, representations, mirror_to=None,
+                     concurrency=None):
+        for representation in representations:
+            destination = representation.url
+            if mirror_to:
+                destination = mirror_to(representation)
+            self.mirror_one(representation, destination)
+
 
 class MockS3Client(object):
     """This pool lets us test the real S3Uploader class with a mocked-up
@@ -322,10 +484,60 @@ class MockS3Client(object):
         self.access_key = aws_access_key_id
         self.secret_key = aws_secret_access_key
         self.uploads = []
+        self.multipart_uploads = []
+        self.objects = {}
         self.fail_with = None
 
-    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        # Uploads to these keys will raise the corresponding exceptions.
+        self.fail_for = {}
+
+        # upload_fileobj may be called from several threads at once.
+        self.lock = RLock()
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None,
+                       Config=None, **kwargs):
         if self.fail_with:
             raise self.fail_with
-        self.uploads.append((Fileobj.read(), Bucket, Key, ExtraArgs, kwargs))
+        if Key in self.fail_for:
+            raise self.fail_for[Key]
+        if not Config:
+            content = Fileobj.read()
+            parts = None
+        else:
+            # Read the file one part at a time, the way boto3 does
+            # for a multipart upload.
+            parts = []
+            while True:
+                part = Fileobj.read(Config.multipart_chunksize)
+                if not part:
+                    break
+                parts.append(part)
+            content = b''.join(parts)
+        with self.lock:
+            if parts and len(content) >= Config.multipart_threshold:
+                self.multipart_uploads.append(
+                    (Bucket, Key, [len(x) for x in parts])
+                )
+            self.uploads.append((content, Bucket, Key, ExtraArgs, kwargs))
         return None
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if self.fail_with:
+            raise self.fail_with
+        self.objects[(Bucket, Key)] = Body
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError(
+                dict(Error=dict(Code='404', Message='Not Found')),
+                'HeadObject'
+            )
+        return dict(ContentLength=len(self.objects[(Bucket, Key)]))
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError(
+                dict(Error=dict(Code='NoSuchKey', Message='Not Found')),
+                'GetObject'
+            )
+        return dict(Body=StringIO(self.objects[(Bucket, Key)]))
@@ -2,6 +2,7 @@ import argparse
 import datetime
 import imp
 import logging
+import multiprocessing
 import os
 import random
 import re
@@ -30,6 +31,7 @@ from sqlalchemy import (
     exists,
     and_,
     or_,
+    select,
     text,
 )
 from sqlalchemy.sql.functions import func
@@ -41,6 +43,7 @@ from sqlalchemy.orm import Session
 
 from app_server import ComplaintController
 from axis import Axis360BibliographicCoverageProvider
+from blob_store import BlobStore
 from config import Configuration, CannotLoadConfiguration
 from coverage import CollectionCoverageProviderJob
 from lane import Lane
@@ -57,6 +60,7 @@ from model import (
     production_session,
     BaseCoverageRecord,
     CachedFeed,
+    CacheInvalidationListener,
     Collection,
     Complaint,
     ConfigurationSetting,
@@ -65,6 +69,8 @@ from model import (
     CustomList,
     DataSource,
     Edition,
+    Equivalency,
+    EquivalencyClosure,
     ExternalIntegration,
     Hyperlink,
     Identifier,
@@ -72,8 +78,10 @@ from model import (
     LicensePool,
     LicensePoolDeliveryMechanism,
     Patron,
+    PresentationBatch,
     PresentationCalculationPolicy,
     Representation,
+    Resource,
     SessionManager,
     Subject,
     Timestamp,
@@ -85,6 +93,7 @@ from model import (
 from monitor import (
     CollectionMonitor,
     ReaperMonitor,
+    SweepMonitorShardJob,
 )
 from opds_import import (
     OPDSImportMonitor,
@@ -94,7 +103,15 @@ from oneclick import (
     OneClickBibliographicCoverageProvider,
 )
 from overdrive import OverdriveBibliographicCoverageProvider
-from util import fast_query_count
+from thumbnailer import Thumbnailer
+from util import (
+    batched_query,
+    fast_query_count,
+    metrics,
+    stream_query,
+)
+from util.http import HTTP
+from util.median import median
 from util.opds_writer import OPDSFeed
 from util.personal_names import (
     contributor_name_match_ratio, 
@@ -113,6 +130,12 @@ from bibliotheca import (
 
 class Script(object):
 
+    # A long-running script keeps a CacheInvalidationListener running,
+    # so it finds out right away when another process changes one of
+    # the tables it keeps in memory. That takes a database connection
+    # of its own, which isn't worth it for a short-lived script.
+    LISTEN_FOR_CACHE_INVALIDATIONS = False
+
     @property
     def _db(self):
         if not hasattr(self, "_session"):
@@ -167,6 +190,8 @@ class Script(object):
 
     def run(self):
         self.load_configuration()
+        if self.LISTEN_FOR_CACHE_INVALIDATIONS:
+            CacheInvalidationListener.start_for_engine(self._db.get_bind())
         DataSource.well_known_sources(self._db)
         try:
             self.do_run()
@@ -176,14 +201,31 @@ class Script(object):
                 exc_info=e
             )
             raise e
+        finally:
+            self.dump_metrics()
+
+    def dump_metrics(self):
+        """If the script was asked to, write out how long its
+        instrumented operations took.
+        """
+        try:
+            path = metrics.registry.dump()
+            if path:
+                self.log.info("Wrote metrics to %s", path)
+        except (IOError, OSError), e:
+            self.log.error("Could not write metrics: %s", e)
 
     def load_configuration(self):
         if not Configuration.loaded_from_database():
             Configuration.load(self._db)
+        BlobStore.initialize(self._db)
+        HTTP.configure_sessions(**Configuration.http_session_options())
 
 
 class RunMonitorScript(Script):
 
+    LISTEN_FOR_CACHE_INVALIDATIONS = True
+
     def __init__(self, monitor, _db=None, **kwargs):
         super(RunMonitorScript, self).__init__(_db)
         if issubclass(monitor, CollectionMonitor):
@@ -220,6 +262,8 @@ class RunMultipleMonitorsScript(Script):
     system.
     """
 
+    LISTEN_FOR_CACHE_INVALIDATIONS = True
+
     def __init__(self, _db=None, **kwargs):
         """Constructor.
         
@@ -284,6 +328,57 @@ class RunReaperMonitorsScript(RunMultipleMonitorsScript):
         return [cls(self._db, **kwargs) for cls in ReaperMonitor.REGISTRY]
 
 
+class RunShardedSweepMonitorScript(Script):
+    """Run a SweepMonitor as a number of shards, each in its own thread
+    with its own database session.
+
+    Every shard keeps its own progress counter, so a crash in one
+    shard doesn't affect the others, and the next run picks up where
+    each shard left off. The SweepMonitor's cleanup() method is
+    called once, when the last shard finishes.
+
+    To spread a sweep across several processes or machines instead,
+    run the SweepMonitor with the same `shard_count` and a different
+    `shard` in each process.
+    """
+
+    DEFAULT_SHARD_COUNT = 4
+
+    def __init__(self, monitor_class, shard_count=None, _db=None,
+                 collection=None, **monitor_kwargs):
+        super(RunShardedSweepMonitorScript, self).__init__(_db)
+
+        self.shard_count = shard_count or self.DEFAULT_SHARD_COUNT
+        self.session_factory = SessionManager.sessionmaker(session=self._db)
+
+        # Use a database from the factory.
+        if not _db:
+            # Close the new, autogenerated database session.
+            self._session.close()
+        self._session = self.session_factory()
+
+        self.monitor_class = monitor_class
+        self.collection = collection
+        self.monitor_kwargs = monitor_kwargs
+        self.name = monitor_class.SERVICE_NAME
+
+    def run(self, pool=None):
+        """Run every shard of the sweep and wait for them all to finish.
+
+        :param pool: A DatabasePool (or other) object for use in testing
+        environments.
+        """
+        with (
+            pool or DatabasePool(self.shard_count, self.session_factory)
+        ) as job_queue:
+            for shard in range(self.shard_count):
+                job = SweepMonitorShardJob(
+                    self.monitor_class, shard, self.shard_count,
+                    collection=self.collection, **self.monitor_kwargs
+                )
+                job_queue.put(job)
+
+
 class UpdateSearchIndexScript(RunMonitorScript):
 
     def __init__(self):
@@ -1642,16 +1737,19 @@ class WorkProcessingScript(IdentifierInputScript):
         return query.order_by(Work.id)
 
     def do_run(self):
-        works = True
-        offset = 0
-        while works:
-            works = self.query.offset(offset).limit(self.batch_size).all()
-            for work in works:
-                self.process_work(work)
-            offset += self.batch_size
+        # Subclasses may query for something other than Works.
+        model_class = self.query.column_descriptions[0]['type']
+        for works in batched_query(
+                self.query, model_class.id, self.batch_size):
+            self.process_works(works)
             self._db.commit()
         self._db.commit()
 
+    def process_works(self, works):
+        """Process a batch of Works."""
+        for work in works:
+            self.process_work(work)
+
     def process_work(self, work):
         raise NotImplementedError()      
 
@@ -1693,7 +1791,7 @@ class WorkConsolidationScript(WorkProcessingScript):
         self.log.info(
             "Deleting %d Works that have no LicensePools." % qu.count()
         )
-        for i in qu:
+        for i in stream_query(qu):
             self._db.delete(i)
         self._db.commit()
 
@@ -1704,6 +1802,12 @@ class WorkPresentationScript(WorkProcessingScript):
     # Do a complete recalculation of the presentation.
     policy = PresentationCalculationPolicy()
 
+    def process_works(self, works):
+        """Calculate the presentation of a whole batch of Works at once."""
+        PresentationBatch(self._db, works).calculate_presentation(
+            policy=self.policy
+        )
+
     def process_work(self, work):
         work.calculate_presentation(policy=self.policy)
 
@@ -2052,6 +2156,251 @@ class RefreshMaterializedViewsScript(Script):
         db.commit()
 
 
+class MoveRepresentationContentScript(Script):
+    """Move the content of Representations out of the database and
+    into the BlobStore, a batch at a time.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, _db=None, store=None, batch_size=None):
+        super(MoveRepresentationContentScript, self).__init__(_db)
+        self.store = store
+        self.batch_size = batch_size or self.BATCH_SIZE
+
+    def do_run(self):
+        store = self.store or BlobStore.instance
+        if not store:
+            raise CannotLoadConfiguration("No blob store is configured.")
+
+        qu = self._db.query(Representation).filter(
+            Representation._content != None
+        ).order_by(Representation.id)
+        moved = 0
+        last_id = 0
+        while True:
+            batch = qu.filter(Representation.id > last_id).limit(
+                self.batch_size
+            ).all()
+            if not batch:
+                break
+            for representation in batch:
+                if representation.move_content_to_blob_store(store):
+                    moved += 1
+                last_id = representation.id
+            self._db.commit()
+            self.log.info("Moved content for %d representations.", moved)
+        return moved
+
+
+class RebuildEquivalencyClosureScript(Script):
+    """Rebuild the EquivalencyClosure table from the Equivalencies in
+    the database, a batch of Identifiers at a time.
+
+    This is only necessary when the table is first created; after
+    that, it's kept up to date as Equivalencies change.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, _db=None, batch_size=None):
+        super(RebuildEquivalencyClosureScript, self).__init__(_db)
+        self.batch_size = batch_size or self.BATCH_SIZE
+
+    def do_run(self):
+        equivalents = Equivalency.__table__.c
+        qu = select([equivalents.input_id]).where(
+            equivalents.input_id != None
+        ).union(
+            select([equivalents.output_id]).where(
+                equivalents.output_id != None
+            )
+        )
+        identifier_ids = sorted(x for [x] in self._db.execute(qu))
+        for i in range(0, len(identifier_ids), self.batch_size):
+            batch = identifier_ids[i:i+self.batch_size]
+            EquivalencyClosure.rebuild(self._db, batch)
+            self._db.commit()
+            self.log.info(
+                "Rebuilt equivalencies for %d/%d identifiers.",
+                i + len(batch), len(identifier_ids)
+            )
+
+        # Clear out rows for Identifiers that no longer have any
+        # Equivalencies.
+        table = EquivalencyClosure.__table__
+        self._db.execute(
+            table.delete().where(~table.c.identifier_id.in_(qu))
+        )
+        self._db.commit()
+
+class ImportTimeScript(Script):
+    """Measure how long it takes to import the modules that the
+    server's entry points start with.
+
+    Every import is timed in a fresh Python process, so nothing is
+    cached from a previous import. This script doesn't use the
+    database.
+    """
+
+    MODULES = [
+        'model', 'lane', 'opds', 'external_search', 'coverage', 'monitor',
+        'app_server', 'scripts',
+    ]
+
+    REPETITIONS = 5
+
+    TIMING_CODE = (
+        "import time; start = time.time(); import %s; "
+        "print time.time() - start"
+    )
+
+    @classmethod
+    def arg_parser(cls):
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            'modules', nargs='*',
+            help='Modules to import. By default, the main entry points are imported.',
+        )
+        parser.add_argument(
+            '--repetitions', type=int, default=cls.REPETITIONS,
+            help='Import each module this many times.',
+        )
+        return parser
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+
+    def run(self, cmd_args=None):
+        args = self.parse_command_line(cmd_args=cmd_args)
+        results = dict()
+        for module in args.modules or self.MODULES:
+            timings = [
+                self.time_import(module) for i in range(args.repetitions)
+            ]
+            results[module] = timings
+            self.output.write(
+                "%-20s min %.3fs  median %.3fs\n" % (
+                    module, min(timings), median(timings)
+                )
+            )
+        return results
+
+    def time_import(self, module):
+        """Import a module in a new process.
+
+        :return: The number of seconds the import took.
+        """
+        package_dir = os.path.split(os.path.abspath(__file__))[0]
+        output = subprocess.check_output(
+            [sys.executable, '-c', self.TIMING_CODE % module],
+            cwd=package_dir
+        )
+        return float(output.strip().split("\n")[-1])
+
+
+class ThumbnailCoversScript(Script):
+    """Create thumbnails for every cover image that needs one but
+    doesn't have one, and mirror them.
+
+    Images are decoded and scaled in a pool of worker processes.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, _db=None, mirror=None, thumbnailer=None,
+                 batch_size=None, processes=None):
+        super(ThumbnailCoversScript, self).__init__(_db)
+        self.mirror = mirror
+        self.thumbnailer = thumbnailer
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.processes = processes
+
+    def needs_thumbnail(self, sizes):
+        """Find cover images that don't have thumbnails, but would
+        get one for at least one of the given sizes.
+        """
+        smallest_width = min(width for width, height in sizes)
+        smallest_height = min(height for width, height in sizes)
+        return self._db.query(Representation).join(
+            Resource, Resource.representation_id==Representation.id
+        ).join(Resource.links).filter(
+            Hyperlink.rel==Hyperlink.IMAGE
+        ).filter(
+            Representation.thumbnail_of_id==None
+        ).filter(
+            ~Representation.thumbnails.any()
+        ).filter(
+            Representation.media_type.like(u"image/%")
+        ).filter(
+            or_(Representation._content != None,
+                Representation.content_hash != None,
+                Representation.local_content_path != None)
+        ).filter(
+            Representation.fetch_exception==None
+        ).filter(
+            Representation.scale_exception==None
+        ).filter(
+            # We know an image is already small enough once we've
+            # looked at it, so it doesn't need to be checked again.
+            or_(Representation.image_width==None,
+                Representation.image_height==None,
+                Representation.image_width > smallest_width,
+                Representation.image_height > smallest_height,
+                Representation.media_type==Representation.SVG_MEDIA_TYPE)
+        ).distinct()
+
+    def thumbnail_url(self, mirror, representation, size):
+        """Decide where a thumbnail of the given size should be
+        mirrored, the same way Metadata does.
+        """
+        max_width, max_height = size
+        link = representation.resource.links[0]
+        filename = representation.default_filename(
+            link, self.thumbnailer.media_type
+        )
+        return mirror.cover_image_url(
+            link.data_source, link.identifier, filename, max_height
+        )
+
+    def do_run(self):
+        mirror = self.mirror or MirrorUploader.sitewide(self._db)
+        pool = None
+        if not self.thumbnailer:
+            pool = multiprocessing.Pool(self.processes)
+            self.thumbnailer = Thumbnailer(pool=pool)
+
+        def destination_url(representation, size):
+            return self.thumbnail_url(mirror, representation, size)
+
+        qu = self.needs_thumbnail(self.thumbnailer.sizes).order_by(
+            Representation.id
+        )
+        created = 0
+        last_id = 0
+        try:
+            while True:
+                batch = qu.filter(Representation.id > last_id).limit(
+                    self.batch_size
+                ).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                thumbnails = self.thumbnailer.thumbnail_batch(
+                    self._db, batch, destination_url
+                )
+                self._db.flush()
+                mirror.mirror_batch(thumbnails)
+                self._db.commit()
+                created += len(thumbnails)
+                self.log.info("Created %d thumbnails.", created)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return created
+
+
 class DatabaseMigrationScript(Script):
     """Runs new migrations.
 
@@ -2309,6 +2658,10 @@ class DatabaseMigrationScript(Script):
             self.run_migrations(
                 new_migrations, migrations_by_dir, timestamp
             )
+
+            # A migration may have dropped a view or function that the
+            # next process to start up is expected to recreate.
+            SessionManager.unstamp_schema(self._db)
             self._db.commit()
         else:
             print "No new migrations found. Your database is up-to-date."
@@ -2651,20 +3004,14 @@ class CheckContributorNamesInDB(IdentifierInputScript):
             self._db, self.parsed_args.identifier_type, self.parsed_args.identifiers, self.log
         )
 
-        editions = True
-        offset = 0
         output = "ContributorID|\tSortName|\tDisplayName|\tComputedSortName|\tResolution|\tComplaintSource"
         print output.encode("utf8")
 
-        while editions:
-            my_query = self.query.offset(offset).limit(batch_size)
-            editions = my_query.all()
-
+        for editions in batched_query(self.query, Edition.id, batch_size):
             for edition in editions:
                 if edition.contributions:
                     for contribution in edition.contributions:
                         self.process_contribution_local(self._db, contribution, self.log)
-            offset += batch_size
 
             self._db.commit()
         self._db.commit()
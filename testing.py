@@ -8,6 +8,7 @@ import os
 import shutil
 import tempfile
 import uuid
+from contextlib import contextmanager
 from nose.tools import set_trace
 from sqlalchemy.orm.session import Session
 from config import Configuration
@@ -59,6 +60,7 @@ from coverage import (
 
 from external_search import DummyExternalSearchIndex
 from log import LogConfiguration
+from util.query_profiler import QueryProfiler
 import external_search
 import mock
 import inspect
@@ -369,6 +371,39 @@ class DatabaseTest(object):
         self._db.commit()
         SessionManager.refresh_materialized_views(self._db)
 
+    @contextmanager
+    def count_queries(self):
+        """Count the SQL queries run by the code inside the `with`
+        block.
+
+        Changes that are already pending are flushed first, so they
+        aren't counted.
+
+        :return: A QueryProfile, whose `count` is filled in when the
+        block finishes.
+        """
+        self._db.flush()
+        profiler = QueryProfiler.for_bind(self._db.get_bind())
+        with profiler.profile() as profile:
+            yield profile
+
+    @contextmanager
+    def assert_max_queries(self, maximum):
+        """Fail if the code inside the `with` block runs more than
+        `maximum` SQL queries.
+
+        Changes that are already pending are flushed first, so they
+        don't count against the maximum.
+        """
+        with self.count_queries() as profile:
+            yield profile
+        if profile.count > maximum:
+            raise AssertionError(
+                "Expected no more than %d queries, got %d.\n%s" % (
+                    maximum, profile.count, profile.report()
+                )
+            )
+
     def _lane(self, display_name=None, library=None, 
               parent=None, genres=None, languages=None,
               fiction=None
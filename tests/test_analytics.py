@@ -6,7 +6,10 @@ from config import (
     Configuration,
     temp_config,
 )
-from analytics import Analytics
+from analytics import (
+    Analytics,
+    EventBuffer,
+)
 from mock_analytics_provider import MockAnalyticsProvider
 from local_analytics_provider import LocalAnalyticsProvider
 from . import DatabaseTest
@@ -16,7 +19,11 @@ from model import (
     Library,
     create,
 )
+import datetime
 import json
+import os
+import shutil
+import tempfile
 
 class TestAnalytics(DatabaseTest):
 
@@ -119,3 +126,85 @@ class TestAnalytics(DatabaseTest):
         # It's counted as a sitewide event, but not as a library event.
         eq_(3, sitewide_provider.count)
         eq_(1, library_provider.count)
+
+
+class TestEventBuffer(object):
+
+    def setup(self):
+        self.written = []
+        self.fail = False
+
+    def write_batch(self, events):
+        if self.fail:
+            raise Exception("The database is down.")
+        self.written.append(events)
+        return len(events)
+
+    def test_memory(self):
+        buffer = EventBuffer(self.write_batch, max_size=3, batch_size=2)
+        buffer.BLOCK_TIMEOUT = 0
+        for i in range(3):
+            eq_(True, buffer.add(dict(type="event", value=i)))
+
+        # The buffer is full, so the caller has to deal with this
+        # event itself.
+        eq_(False, buffer.add(dict(type="event", value=3)))
+
+        # Events are written in batches.
+        eq_(3, buffer.flush())
+        eq_([[0, 1], [2]],
+            [[x['value'] for x in batch] for batch in self.written])
+        eq_(0, buffer.flush())
+
+        # Events that can't be written are lost.
+        self.fail = True
+        buffer.add(dict(type="event"))
+        eq_(0, buffer.flush())
+        self.fail = False
+        eq_(0, buffer.flush())
+
+    def test_background_thread(self):
+        buffer = EventBuffer(self.write_batch, flush_interval=0.1)
+        buffer.start()
+        buffer.add(dict(type="event"))
+
+        # Stopping the buffer writes everything that's left.
+        buffer.stop()
+        eq_([[dict(type="event")]], self.written)
+        eq_(None, buffer.thread)
+
+    def test_spool(self):
+        directory = tempfile.mkdtemp()
+        try:
+            buffer = EventBuffer(
+                self.write_batch, max_size=3, batch_size=2,
+                spool_directory=directory
+            )
+            now = datetime.datetime.utcnow()
+            for i in range(3):
+                eq_(True, buffer.add(dict(type="event", start=now, value=i)))
+            eq_(False, buffer.add(dict(type="event")))
+            eq_(["%d.spool" % os.getpid()], os.listdir(directory))
+
+            # If the events can't be written, they stay on disk.
+            self.fail = True
+            eq_(0, buffer.flush())
+            [filename] = os.listdir(directory)
+            assert filename.endswith(".batch")
+            eq_(3, buffer.pending)
+
+            # Here's a spool file left behind by a process that's no
+            # longer running.
+            with open(os.path.join(directory, "999999.spool"), "w") as fh:
+                fh.write('{"type": "abandoned"}\n')
+
+            self.fail = False
+            eq_(4, buffer.flush())
+            eq_([], os.listdir(directory))
+            eq_(0, buffer.pending)
+            events = sum(self.written, [])
+            eq_(set([0, 1, 2, None]), set(x.get('value') for x in events))
+            [first] = [x for x in events if x.get('value') == 0]
+            eq_(now, first['start'])
+        finally:
+            shutil.rmtree(directory)
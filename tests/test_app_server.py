@@ -20,7 +20,10 @@ from . import (
 
 from opds import TestAnnotator
 
-from model import Identifier
+from model import (
+    ConfigurationSetting,
+    Identifier,
+)
 
 from lane import (
     Facets,
@@ -30,6 +33,8 @@ from lane import (
 
 from app_server import (
     HeartbeatController,
+    MetricsController,
+    RequestQueryProfiler,
     URNLookupController,
     ErrorHandler,
     ComplaintController,
@@ -50,6 +55,7 @@ from problem_details import (
     INVALID_URN,
 )
 
+from util.metrics import MetricsRegistry
 from util.opds_writer import (
     OPDSFeed,
     OPDSMessage,
@@ -94,6 +100,75 @@ class TestHeartbeatController(object):
         eq_('ba.na.na-10-ssssssssss', data['releaseID'])
 
 
+class TestRequestQueryProfiler(DatabaseTest):
+
+    def setup(self):
+        super(TestRequestQueryProfiler, self).setup()
+        self.app = Flask(__name__)
+        self.profiler = RequestQueryProfiler(self.app, self._db)
+
+        @self.app.route('/')
+        def index():
+            self._db.execute("select 1")
+            self._db.execute("select 2")
+            return "ok"
+        self.client = self.app.test_client()
+
+    def test_disabled(self):
+        response = self.client.get('/')
+        eq_("ok", response.data)
+        eq_(None, response.headers.get("X-SQL-Query-Count"))
+
+    def test_headers(self):
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.SQL_PROFILER
+        ).value = Configuration.SQL_PROFILER_HEADERS
+        self._db.flush()
+        response = self.client.get('/')
+        eq_("ok", response.data)
+        assert int(response.headers["X-SQL-Query-Count"]) >= 2
+        assert float(response.headers["X-SQL-Query-Time"]) >= 0
+
+        # The profile is finished.
+        eq_([], self.profiler.profiler.active_profiles)
+
+    def test_log(self):
+        ConfigurationSetting.sitewide(
+            self._db, Configuration.SQL_PROFILER
+        ).value = Configuration.SQL_PROFILER_LOG
+        self._db.flush()
+        messages = []
+        class MockLog(object):
+            def info(self, message):
+                messages.append(message)
+        self.profiler.log = MockLog()
+
+        response = self.client.get('/')
+        eq_(None, response.headers.get("X-SQL-Query-Count"))
+        [message] = messages
+        assert message.startswith("/: ")
+        assert "select 1" in message
+
+
+class TestMetricsController(object):
+
+    def test_metrics(self):
+        app = Flask(__name__)
+        registry = MetricsRegistry()
+        with registry.timer("an operation"):
+            pass
+        controller = MetricsController(registry)
+
+        with app.test_request_context('/'):
+            response = controller.metrics()
+        eq_(200, response.status_code)
+        eq_(MetricsRegistry.PROMETHEUS_CONTENT_TYPE,
+            response.headers.get('Content-Type'))
+        eq_(registry.prometheus_text(), response.data)
+        assert ('simplified_operation_seconds_count{operation="an operation"} 1.0'
+                in response.data)
+
+
 class TestURNLookupController(DatabaseTest):
 
     def setup(self):
@@ -191,6 +266,33 @@ class TestURNLookupController(DatabaseTest):
             assert identifier.urn in response.data
             assert work.title in response.data
 
+    def test_work_lookup_query_count(self):
+        # Looking up works doesn't run an extra set of queries for
+        # each one: looking up twice as many works runs the same
+        # number of queries.
+        def lookup(how_many):
+            works = [self._work(with_license_pool=True)
+                     for i in range(how_many)]
+            urns = "&".join(
+                "urn=%s" % work.license_pools[0].identifier.urn
+                for work in works
+            )
+            # Start from an empty session, as a real request would.
+            self._db.flush()
+            self._db.expunge_all()
+            controller = URNLookupController(self._db)
+            with self.app.test_request_context("/?" + urns):
+                with self.count_queries() as profile:
+                    response = controller.work_lookup(
+                        annotator=TestAnnotator()
+                    )
+            eq_(200, response.status_code)
+            return profile.count
+
+        # The first lookup fills some caches, so it isn't counted.
+        lookup(1)
+        eq_(lookup(3), lookup(6))
+
     def test_permalink(self):
         work = self._work(with_license_pool=True)
         work.license_pools[0].open_access = False
@@ -0,0 +1,219 @@
+import os
+import shutil
+import stat
+import tempfile
+from nose.tools import (
+    assert_raises_regexp,
+    eq_,
+    set_trace,
+)
+from . import DatabaseTest
+from blob_store import (
+    BlobStore,
+    LocalBlobStore,
+    S3BlobStore,
+)
+from config import (
+    CannotLoadConfiguration,
+    Configuration,
+    temp_config,
+)
+from model import (
+    ExternalIntegration,
+    Representation,
+)
+from s3 import (
+    MockS3Client,
+    S3Uploader,
+)
+from scripts import MoveRepresentationContentScript
+
+
+class TestLocalBlobStore(object):
+
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.store = LocalBlobStore(self.root)
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_put(self):
+        content = "Some content"
+        key = self.store.put(content)
+        eq_(BlobStore.key_for(content), key)
+        eq_(True, self.store.exists(key))
+
+        # The document is stored in a sharded directory beneath the
+        # root, named after its key.
+        eq_(os.path.join(self.root, key[0:2], key[2:4], key),
+            self.store.path(key))
+        eq_(content, open(self.store.path(key)).read())
+        eq_(content, self.store.read(key))
+        eq_(content, self.store.open(key).read())
+
+        # Anyone can read the document.
+        eq_(LocalBlobStore.FILE_MODE,
+            stat.S_IMODE(os.stat(self.store.path(key)).st_mode))
+
+        # Storing the same content again doesn't change anything.
+        eq_(key, self.store.put(content))
+        eq_([key], os.listdir(os.path.dirname(self.store.path(key))))
+
+    def test_exists(self):
+        eq_(False, self.store.exists(BlobStore.key_for("not stored")))
+
+
+class TestS3BlobStore(DatabaseTest):
+
+    def _uploader(self, **settings):
+        integration = self._external_integration(
+            ExternalIntegration.S3, ExternalIntegration.STORAGE_GOAL,
+            settings=settings
+        )
+        integration.username = 'username'
+        integration.password = 'password'
+        return S3Uploader(integration, client_class=MockS3Client)
+
+    def test_constructor(self):
+        uploader = self._uploader()
+        assert_raises_regexp(
+            CannotLoadConfiguration, "No S3 bucket is configured",
+            S3BlobStore, uploader
+        )
+
+        uploader = self._uploader(blob_store_bucket="blobs.bucket")
+        store = S3BlobStore(uploader)
+        eq_("blobs.bucket", store.bucket)
+        eq_(uploader.client, store.client)
+
+    def test_put(self):
+        uploader = self._uploader(blob_store_bucket="blobs.bucket")
+        store = S3BlobStore(uploader)
+        content = "Some content"
+        key = BlobStore.key_for(content)
+        eq_(False, store.exists(key))
+
+        eq_(key, store.put(content))
+        eq_(True, store.exists(key))
+        s3_key = "blobs/%s/%s/%s" % (key[0:2], key[2:4], key)
+        eq_({("blobs.bucket", s3_key): content}, uploader.client.objects)
+        eq_(content, store.read(key))
+
+    def test_from_configuration(self):
+        root = tempfile.mkdtemp()
+        try:
+            with temp_config() as config:
+                # Nothing is configured.
+                eq_(None, BlobStore.from_configuration(self._db))
+
+                # A local directory is configured.
+                config[Configuration.BLOB_STORE_DIRECTORY] = root
+                store = BlobStore.from_configuration(self._db)
+                assert isinstance(store, LocalBlobStore)
+                eq_(root, store.root)
+
+                # A sitewide S3 integration with a blob store bucket
+                # takes precedence.
+                integration = self._external_integration(
+                    ExternalIntegration.S3, ExternalIntegration.STORAGE_GOAL,
+                    settings={S3Uploader.BLOB_STORE_BUCKET_KEY: "blobs.bucket"}
+                )
+                integration.username = 'username'
+                integration.password = 'password'
+                store = BlobStore.from_configuration(self._db)
+                assert isinstance(store, S3BlobStore)
+                eq_("blobs.bucket", store.bucket)
+        finally:
+            shutil.rmtree(root)
+
+
+class TestRepresentationContent(DatabaseTest):
+
+    def setup(self):
+        super(TestRepresentationContent, self).setup()
+        self.root = tempfile.mkdtemp()
+        self.store = LocalBlobStore(self.root)
+        self.old_instance = BlobStore.instance
+
+    def teardown(self):
+        BlobStore.instance = self.old_instance
+        shutil.rmtree(self.root)
+        super(TestRepresentationContent, self).teardown()
+
+    def test_content_kept_in_blob_store(self):
+        BlobStore.instance = self.store
+        representation, ignore = self._representation(
+            media_type="text/plain"
+        )
+        representation.set_fetched_content("Some content")
+
+        # The content went into the blob store, not the database.
+        eq_(None, representation._content)
+        eq_(BlobStore.key_for("Some content"), representation.content_hash)
+        eq_(True, self.store.exists(representation.content_hash))
+
+        # But it's available as usual.
+        eq_("Some content", representation.content)
+        eq_("Some content", representation.content_fh().read())
+        eq_(True, representation.has_content)
+        eq_(True, representation.is_usable)
+
+        # If this process hasn't set up a blob store, one is
+        # configured the first time it's needed.
+        BlobStore.instance = None
+        with temp_config() as config:
+            config[Configuration.BLOB_STORE_DIRECTORY] = self.root
+            eq_("Some content", representation.content)
+            assert isinstance(BlobStore.instance, LocalBlobStore)
+            eq_(self.root, BlobStore.instance.root)
+
+        # Without a blob store, there's no way to get the content.
+        BlobStore.instance = None
+        assert_raises_regexp(
+            ValueError, "none is configured", getattr, representation,
+            "content"
+        )
+
+    def test_content_kept_in_database(self):
+        # With no blob store, content is kept in the database.
+        BlobStore.instance = None
+        representation, ignore = self._representation(
+            media_type="text/plain"
+        )
+        representation.set_fetched_content("Some content")
+        eq_("Some content", representation._content)
+        eq_(None, representation.content_hash)
+        eq_("Some content", representation.content)
+
+    def test_move_content_script(self):
+        BlobStore.instance = None
+        representations = []
+        for i in range(3):
+            representation, ignore = self._representation(
+                media_type="text/plain"
+            )
+            representation.set_fetched_content("Content %d" % i)
+            representations.append(representation)
+        no_content, ignore = self._representation()
+
+        script = MoveRepresentationContentScript(
+            self._db, store=self.store, batch_size=2
+        )
+        eq_(3, script.do_run())
+
+        BlobStore.instance = self.store
+        for i, representation in enumerate(representations):
+            eq_(None, representation._content)
+            eq_("Content %d" % i, representation.content)
+        eq_(None, no_content.content_hash)
+
+        # Running the script again does nothing.
+        eq_(0, script.do_run())
+
+        # The script can't run without a blob store.
+        BlobStore.instance = None
+        assert_raises_regexp(
+            CannotLoadConfiguration, "No blob store is configured.",
+            MoveRepresentationContentScript(self._db).do_run
+        )
@@ -1,9 +1,12 @@
 import os
-from nose.tools import eq_, set_trace
+from nose.tools import assert_raises_regexp, eq_, set_trace
 
 from testing import DatabaseTest
 
-from config import Configuration as BaseConfiguration
+from config import (
+    CannotLoadConfiguration,
+    Configuration as BaseConfiguration,
+)
 from model import ConfigurationSetting
 
 
@@ -56,3 +59,114 @@ class TestConfiguration(DatabaseTest):
         result = self.Conf.app_version()
         eq_('ba.na.na', result)
         eq_('ba.na.na', self.Conf.get(self.Conf.APP_VERSION))
+
+    def test_database_replica_url(self):
+        variable = self.Conf.DATABASE_REPLICA_ENVIRONMENT_VARIABLE
+        old_value = os.environ.pop(variable, None)
+        try:
+            # No replica is configured.
+            self.Conf.instance = dict()
+            eq_(None, self.Conf.database_replica_url())
+
+            os.environ[variable] = "postgres://replica/simplified"
+            eq_("postgres://replica/simplified",
+                self.Conf.database_replica_url())
+
+            # The site configuration takes precedence.
+            self.Conf.instance = {
+                self.Conf.INTEGRATIONS : {
+                    self.Conf.DATABASE_INTEGRATION : {
+                        self.Conf.DATABASE_REPLICA_URL :
+                        "postgres://other-replica/simplified"
+                    }
+                }
+            }
+            eq_("postgres://other-replica/simplified",
+                self.Conf.database_replica_url())
+        finally:
+            if old_value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = old_value
+
+    def test_http_session_options(self):
+        variables = self.Conf.HTTP_ENVIRONMENT_VARIABLES
+        old_environ = dict(
+            (name, os.environ.pop(name, None)) for name in variables.values()
+        )
+        try:
+            # By default, no options are set, so HTTP's defaults are
+            # used.
+            self.Conf.instance = dict()
+            eq_({}, self.Conf.http_session_options())
+
+            # Options can be set in environment variables.
+            os.environ[variables[self.Conf.HTTP_POOL_MAXSIZE]] = "20"
+            os.environ[variables[self.Conf.HTTP_RETRY_BACKOFF_FACTOR]] = "0.25"
+            eq_(dict(pool_maxsize=20, backoff_factor=0.25),
+                self.Conf.http_session_options())
+
+            # The site configuration takes precedence.
+            self.Conf.instance = {
+                self.Conf.INTEGRATIONS : {
+                    self.Conf.HTTP_INTEGRATION : {
+                        self.Conf.HTTP_POOL_MAXSIZE : 5,
+                        self.Conf.HTTP_MAX_RETRIES : 0,
+                    }
+                }
+            }
+            eq_(dict(pool_maxsize=5, max_retries=0, backoff_factor=0.25),
+                self.Conf.http_session_options())
+
+            os.environ[variables[self.Conf.HTTP_RETRY_BACKOFF_FACTOR]] = "slow"
+            assert_raises_regexp(
+                CannotLoadConfiguration, "backoff_factor must be a number",
+                self.Conf.http_session_options
+            )
+        finally:
+            for name, value in old_environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def test_database_engine_options(self):
+        variables = self.Conf.DATABASE_POOL_ENVIRONMENT_VARIABLES
+        old_environ = dict(
+            (name, os.environ.pop(name, None)) for name in variables.values()
+        )
+        try:
+            # By default, no options are set, so SQLAlchemy's defaults
+            # are used.
+            self.Conf.instance = dict()
+            eq_({}, self.Conf.database_engine_options())
+
+            # Options can be set in environment variables.
+            os.environ[variables[self.Conf.DATABASE_POOL_SIZE]] = "20"
+            os.environ[variables[self.Conf.DATABASE_POOL_PRE_PING]] = "true"
+            eq_(dict(pool_size=20, pool_pre_ping=True),
+                self.Conf.database_engine_options())
+
+            # The site configuration takes precedence.
+            self.Conf.instance = {
+                self.Conf.INTEGRATIONS : {
+                    self.Conf.DATABASE_INTEGRATION : {
+                        self.Conf.DATABASE_POOL_SIZE : 5,
+                        self.Conf.DATABASE_POOL_RECYCLE : 3600,
+                    }
+                }
+            }
+            eq_(dict(pool_size=5, pool_recycle=3600, pool_pre_ping=True),
+                self.Conf.database_engine_options())
+
+            os.environ[variables[self.Conf.DATABASE_MAX_OVERFLOW]] = "lots"
+            assert_raises_regexp(
+                CannotLoadConfiguration, "max_overflow must be a number",
+                self.Conf.database_engine_options
+            )
+        finally:
+            for name, value in old_environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
@@ -2,6 +2,7 @@ from nose.tools import (
     assert_raises_regexp,
     eq_,
 )
+from analytics import EventBuffer
 from local_analytics_provider import LocalAnalyticsProvider
 from . import DatabaseTest
 from model import (
@@ -83,3 +84,31 @@ class TestLocalAnalyticsProvider(DatabaseTest):
             "Either library or license_pool must be provided.",
             self.la.collect_event, None, None, "event", now
         )
+
+    def test_collect_event_buffered(self):
+        buffer = EventBuffer(
+            lambda events: CirculationEvent.log_batch(self._db, events)
+        )
+        old_buffer = LocalAnalyticsProvider.event_buffer
+        LocalAnalyticsProvider.event_buffer = buffer
+        try:
+            self.integration.setting(LocalAnalyticsProvider.BUFFERED).value = "true"
+            la = LocalAnalyticsProvider(self.integration)
+        finally:
+            LocalAnalyticsProvider.event_buffer = old_buffer
+        eq_(buffer, la.buffer)
+
+        pool = self._licensepool(None)
+        now = datetime.datetime.utcnow()
+        la.collect_event(
+            self._default_library, pool, CirculationEvent.CM_CHECKOUT, now,
+            old_value=2, new_value=1
+        )
+
+        # The event isn't written until the buffer is flushed.
+        qu = self._db.query(CirculationEvent)
+        eq_(0, qu.count())
+        eq_(1, buffer.flush())
+        [event] = qu.all()
+        eq_((pool, CirculationEvent.CM_CHECKOUT, now, -1),
+            (event.license_pool, event.type, event.start, event.delta))
@@ -12,8 +12,10 @@ from . import DatabaseTest
 from log import (
     UTF8Formatter,
     JSONFormatter,
+    LogglyBatchHandler,
     LogglyHandler,
     LogConfiguration,
+    QueueHandler,
     SysLogger,
     Loggly,
     Logger
@@ -49,6 +51,131 @@ class TestJSONFormatter(object):
         eq_("pathname", data['filename'])
         assert 'ValueError: fake exception' in data['traceback']
 
+    def test_format_from_queue(self):
+        # A QueueHandler formats the traceback before passing the
+        # record on, and the formatter uses what it came up with.
+        target = MockHandler()
+        handler = QueueHandler([target], start=False)
+        try:
+            raise ValueError("fake exception")
+        except ValueError, e:
+            handler.emit(logging.LogRecord(
+                "some logger", logging.ERROR, "pathname",
+                104, "A message", {}, sys.exc_info(), None
+            ))
+        handler.flush()
+        [record] = target.records
+        eq_(None, record.exc_info)
+
+        data = json.loads(JSONFormatter("some app").format(record))
+        eq_("A message", data['message'])
+        assert 'ValueError: fake exception' in data['traceback']
+
+
+class MockHandler(logging.Handler):
+
+    def __init__(self):
+        super(MockHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class MockBatchHandler(MockHandler):
+
+    def __init__(self):
+        super(MockBatchHandler, self).__init__()
+        self.batches = []
+
+    def emit_batch(self, records):
+        self.batches.append(records)
+
+
+class TestQueueHandler(object):
+
+    def record(self, message, args=(), name="some logger",
+               level=logging.INFO):
+        return logging.LogRecord(
+            name, level, "pathname", 104, message, args, None, None
+        )
+
+    def test_emit(self):
+        target = MockHandler()
+        batch_target = MockBatchHandler()
+        batch_target.setLevel(logging.WARN)
+        handler = QueueHandler(
+            [target, batch_target], batch_size=2, start=False
+        )
+
+        # The message is put together right away, but nothing is
+        # passed on to the other handlers until the queue is flushed.
+        class Unformattable(object):
+            def __repr__(self):
+                return "<Unformattable>"
+        handler.emit(self.record("Message %r", (Unformattable(),)))
+        handler.emit(self.record("Warning", level=logging.WARN))
+        handler.emit(self.record("Another message"))
+        eq_([], target.records)
+        eq_(3, handler.queue.qsize())
+
+        handler.flush()
+        eq_(["Message <Unformattable>", "Warning", "Another message"],
+            [x.getMessage() for x in target.records])
+
+        # The handler that supports batches got a single batch,
+        # containing only the record at its level.
+        eq_([["Warning"]],
+            [[x.getMessage() for x in batch] for batch in batch_target.batches])
+
+    def test_queue_full(self):
+        target = MockHandler()
+        handler = QueueHandler([target], max_size=2, start=False)
+        for i in range(5):
+            handler.emit(self.record("Message %d", (i,)))
+        eq_(3, handler.dropped)
+
+        # The next batch includes a warning about the dropped records.
+        handler.flush()
+        eq_(["Message 0", "Message 1",
+             "Dropped 3 log messages because the log queue was full."],
+            [x.getMessage() for x in target.records])
+
+        # It's only reported once.
+        handler.emit(self.record("Message 5"))
+        handler.flush()
+        eq_("Message 5", target.records[-1].getMessage())
+        eq_(4, len(target.records))
+
+    def test_sampling(self):
+        target = MockHandler()
+        handler = QueueHandler(
+            [target], sample_rates={"monitor": 3}, start=False
+        )
+        for i in range(6):
+            handler.emit(self.record("Item %d", (i,), name="monitor.items"))
+        handler.emit(self.record("Other", name="other"))
+        handler.emit(
+            self.record("Problem", name="monitor.items", level=logging.ERROR)
+        )
+        handler.flush()
+
+        # One in three of the messages from the sampled logger (or its
+        # children) were kept. Warnings and errors are never sampled.
+        eq_(["Item 0", "Item 3", "Other", "Problem"],
+            [x.getMessage() for x in target.records])
+        eq_(4, handler.sampled_out)
+
+    def test_background_thread(self):
+        target = MockHandler()
+        handler = QueueHandler([target])
+        handler.emit(self.record("A message"))
+
+        # Closing the handler handles every record that's left.
+        handler.close()
+        eq_(["A message"], [x.getMessage() for x in target.records])
+        eq_(None, handler.thread)
+
 
 class TestLogConfiguration(DatabaseTest):
 
@@ -128,6 +255,29 @@ class TestLogConfiguration(DatabaseTest):
         eq_(cls.WARN, database_log_level)
         eq_(SysLogger.DEFAULT_MESSAGE_TEMPLATE, handler.formatter._fmt)
 
+    def test_from_configuration_with_queue(self):
+        config = Configuration
+        ConfigurationSetting.sitewide(self._db, config.LOG_QUEUE).value = "true"
+        ConfigurationSetting.sitewide(self._db, config.LOG_SAMPLING).value = (
+            json.dumps({"monitor": 10})
+        )
+
+        # The queue isn't used while testing.
+        eq_((False, None),
+            LogConfiguration.queue_configuration(self._db, testing=True))
+
+        # Otherwise, the usual handlers are wrapped in a QueueHandler.
+        internal_log_level, database_log_level, [handler] = (
+            LogConfiguration.from_configuration(self._db, testing=False)
+        )
+        try:
+            assert isinstance(handler, QueueHandler)
+            [stream_handler] = handler.handlers
+            assert isinstance(stream_handler.formatter, JSONFormatter)
+            eq_({"monitor": 10}, handler.sample_rates)
+        finally:
+            handler.close()
+
     def test_defaults(self):
         cls = SysLogger
         template = SysLogger.DEFAULT_MESSAGE_TEMPLATE
@@ -199,6 +349,12 @@ class TestLogConfiguration(DatabaseTest):
         eq_(Loggly.DEFAULT_LOGGLY_URL % dict(token="a_token"),
             handler.url)
 
+        # When possible, batches of records are sent to the bulk
+        # endpoint.
+        assert isinstance(handler, LogglyBatchHandler)
+        eq_("https://logs-01.loggly.com/bulk/a_token/tag/python/",
+            handler.bulk_url)
+
     def test_interpolate_loggly_url(self):
         m = Loggly._interpolate_loggly_url
 
@@ -27,6 +27,7 @@ from metadata_layer import (
 
 import os
 from model import (
+    get_one,
     Contributor,
     CoverageRecord,
     DataSource,
@@ -35,6 +36,7 @@ from model import (
     Measurement,
     DeliveryMechanism,
     Hyperlink, 
+    PreloadedLookups,
     Representation,
     RightsStatus,
     Subject,
@@ -826,6 +828,17 @@ class TestContributorData(DatabaseTest):
         # Otherwise, we don't know.
         eq_(None, ContributorData.display_name_to_sort_name_from_existing_contributor(self._db, "Jane Doe"))
 
+        # Display names are matched after normalization, but an exact
+        # match is preferred.
+        eq_("Sort, Name", ContributorData.display_name_to_sort_name_from_existing_contributor(self._db, "JOHN DOE"))
+        exact, ignore = self._contributor(sort_name="Doe, John", display_name="JOHN DOE")
+        eq_("Doe, John", ContributorData.display_name_to_sort_name_from_existing_contributor(self._db, "JOHN DOE"))
+
+        # Jane Doe has just shown up, and the cached resolution of her
+        # name is out of date.
+        jane, ignore = self._contributor(sort_name="Doe, Jane", display_name="Jane Doe")
+        eq_("Doe, Jane", ContributorData.display_name_to_sort_name_from_existing_contributor(self._db, "Jane Doe"))
+
     def test_find_sort_name(self):
         metadata_client = DummyMetadataClient()
         metadata_client.lookups["Metadata Client Author"] = "Author, M. C."
@@ -923,6 +936,33 @@ class TestMetadata(DatabaseTest):
         metadata = Metadata.from_edition(edition)
         eq_(edition.series_position, metadata.series_position)
 
+    def test_primary_identifier_object(self):
+        # Metadata can be created with an Identifier that has already
+        # been looked up, rather than an IdentifierData.
+        identifier = self._identifier()
+        metadata = Metadata(
+            data_source=DataSource.GUTENBERG, primary_identifier=identifier
+        )
+        assert isinstance(metadata.primary_identifier, IdentifierData)
+        eq_(identifier.type, metadata.primary_identifier.type)
+        eq_(identifier.identifier, metadata.primary_identifier.identifier)
+        eq_(identifier, metadata.primary_identifier_obj)
+
+        # The Identifier is used to find or create the Edition.
+        edition, is_new = metadata.edition(self._db)
+        eq_(True, is_new)
+        eq_(identifier, edition.primary_identifier)
+        eq_(edition, metadata.edition(self._db, create_if_not_exists=False))
+
+        # If the primary identifier is changed, the old Identifier
+        # object is ignored.
+        other = self._identifier()
+        metadata.primary_identifier = IdentifierData(
+            other.type, other.identifier
+        )
+        edition, is_new = metadata.edition(self._db)
+        eq_(other, edition.primary_identifier)
+
     def test_update(self):
         # Tests that Metadata.update correctly prefers new fields to old, unless 
         # new fields aren't defined.
@@ -991,6 +1031,33 @@ class TestMetadata(DatabaseTest):
         eq_(changed, True)
         eq_(edition_new.series_position, 0)
 
+    def test_primary_identifier_from_database(self):
+        # A Metadata can be created from an Identifier that has
+        # already been looked up.
+        isbn = self._identifier(Identifier.ISBN)
+        metadata = Metadata(
+            data_source=DataSource.OVERDRIVE, primary_identifier=isbn,
+        )
+        eq_(isbn, metadata.primary_identifier_obj)
+
+        # The identifiers list only contains IdentifierData, so code
+        # that uses it works as usual.
+        [data] = metadata.identifiers
+        assert isinstance(data, IdentifierData)
+        eq_((isbn.type, isbn.identifier), (data.type, data.identifier))
+
+        metadata_client = DummyMetadataClient()
+        metadata_client.lookups["Metadata Client Author"] = "Author, M. C."
+        contributor = ContributorData(display_name="Metadata Client Author")
+        eq_("Author, M. C.",
+            contributor.display_name_to_sort_name_through_canonicalizer(
+                self._db, metadata.identifiers, metadata_client
+            ))
+
+        metadata.consolidate_identifiers()
+        [data] = metadata.identifiers
+        eq_((isbn.type, isbn.identifier), (data.type, data.identifier))
+
     def test_apply_identifier_equivalency(self):
 
         # Set up primary identifier with matching & new IdentifierData objects
@@ -1010,7 +1077,7 @@ class TestMetadata(DatabaseTest):
 
         # The primary identifier is put into the identifiers array after init
         eq_(3, len(metadata.identifiers))
-        assert primary in metadata.identifiers
+        assert metadata.primary_identifier in metadata.identifiers
 
         metadata.apply(edition, pool.collection)
         # Neither the primary edition nor the identifier data that represents
@@ -1242,6 +1309,107 @@ class TestMetadata(DatabaseTest):
 
         eq_([link2, link5, link4, link3], filtered_links)
 
+    def test_apply_batch(self):
+        collection = self._default_collection
+        existing = self._identifier(identifier_type=Identifier.OVERDRIVE_ID)
+
+        def make_metadata(identifier, i):
+            primary = IdentifierData(Identifier.OVERDRIVE_ID, identifier)
+            circulation = CirculationData(
+                DataSource.OVERDRIVE, primary, licenses_owned=i,
+                licenses_available=i,
+            )
+            return Metadata(
+                DataSource.OVERDRIVE, primary_identifier=primary,
+                title=u"Title %d" % i,
+                identifiers=[IdentifierData(Identifier.ISBN, u"978000000000%d" % i)],
+                subjects=[SubjectData(Subject.TAG, u"Tag %d" % i)],
+                links=[LinkData(Hyperlink.IMAGE, u"http://cover/%d" % i)],
+                circulation=circulation,
+            )
+
+        metadatas = [
+            make_metadata(existing.identifier, 1),
+            make_metadata(u"new-identifier", 2),
+        ]
+        results = Metadata.apply_batch(self._db, metadatas, collection)
+
+        # Each Metadata was applied to its own Edition.
+        [(edition1, changed1), (edition2, changed2)] = results
+        eq_(True, changed1)
+        eq_(True, changed2)
+        eq_(existing, edition1.primary_identifier)
+        eq_(u"new-identifier", edition2.primary_identifier.identifier)
+
+        for i, edition in enumerate([edition1, edition2], 1):
+            identifier = edition.primary_identifier
+            eq_(u"Title %d" % i, edition.title)
+            eq_([u"978000000000%d" % i],
+                [x.output.identifier for x in identifier.equivalencies])
+            eq_([u"Tag %d" % i],
+                [x.subject.identifier for x in identifier.classifications])
+            eq_([u"http://cover/%d" % i],
+                [x.resource.url for x in identifier.links])
+            [pool] = identifier.licensed_through
+            eq_(collection, pool.collection)
+            eq_(i, pool.licenses_owned)
+
+        # The lookups aren't installed once the batch is done.
+        eq_(None, PreloadedLookups.for_session(self._db))
+
+        # Applying the same batch again finds the same objects rather
+        # than creating new ones.
+        metadatas = [
+            make_metadata(existing.identifier, 1),
+            make_metadata(u"new-identifier", 2),
+        ]
+        eq_([edition1, edition2],
+            [edition for edition, changed in
+             Metadata.apply_batch(self._db, metadatas, collection)])
+        for edition in (edition1, edition2):
+            identifier = edition.primary_identifier
+            eq_(1, len(identifier.equivalencies))
+            eq_(1, len(identifier.classifications))
+            eq_(1, len(identifier.links))
+            eq_(1, len(identifier.licensed_through))
+
+    def test_preload(self):
+        edition, pool = self._edition(with_license_pool=True)
+        identifier = edition.primary_identifier
+        metadata = Metadata(
+            DataSource.OVERDRIVE,
+            primary_identifier=IdentifierData(
+                identifier.type, identifier.identifier
+            ),
+            identifiers=[IdentifierData(Identifier.ISBN, u"9780000000001")],
+        )
+        lookups = Metadata.preload(self._db, [metadata])
+
+        # The ISBN didn't exist, so it was created.
+        isbn = get_one(
+            self._db, Identifier, type=Identifier.ISBN,
+            identifier=u"9780000000001"
+        )
+        assert isbn != None
+
+        # With the lookups installed, the Identifiers and Edition are
+        # found without a query.
+        lookups.install(self._db)
+        try:
+            eq_((identifier, False), Identifier.for_foreign_id(
+                self._db, identifier.type, identifier.identifier
+            ))
+            eq_((isbn, False), Identifier.for_foreign_id(
+                self._db, Identifier.ISBN, u"9780000000001"
+            ))
+            eq_(edition, get_one(
+                self._db, Edition, data_source=edition.data_source,
+                primary_identifier=identifier
+            ))
+            eq_(3, lookups.hits)
+        finally:
+            PreloadedLookups.uninstall(self._db)
+
 
 class TestAssociateWithIdentifiersBasedOnPermanentWorkID(DatabaseTest):
 
@@ -9,6 +9,8 @@ import site
 import random
 import re
 import tempfile
+import threading
+import time
 
 from nose.tools import (
     assert_raises,
@@ -20,7 +22,10 @@ from nose.tools import (
 
 from psycopg2.extras import NumericRange
 
-from sqlalchemy import not_
+from sqlalchemy import (
+    not_,
+    select,
+)
 
 from sqlalchemy.exc import (
     IntegrityError,
@@ -55,6 +60,8 @@ from model import (
     Annotation,
     BaseCoverageRecord,
     CachedFeed,
+    CacheInvalidationListener,
+    CacheSnapshot,
     CirculationEvent,
     Classification,
     Collection,
@@ -62,11 +69,13 @@ from model import (
     Complaint,
     ConfigurationSetting,
     Contributor,
+    ContributorCache,
     CoverageRecord,
     Credential,
     CustomList,
     CustomListEntry,
     DataSource,
+    DataSourceSnapshot,
     DelegatedPatronIdentifier,
     DeliveryMechanism,
     DRMDeviceIdentifier,
@@ -84,6 +93,7 @@ from model import (
     PatronProfileStorage,
     PolicyException,
     Representation,
+    RepresentationFetch,
     Resource,
     RightsStatus,
     SessionManager,
@@ -94,9 +104,14 @@ from model import (
     WorkGenre,
     Identifier,
     Edition,
+    EquivalencyClosure,
+    EquivalentIdentifierCache,
+    PreloadedLookups,
+    PresentationBatch,
     create,
     get_one,
     get_one_or_create,
+    schemaversion,
     site_configuration_has_changed,
     tuple_to_numericrange,
 )
@@ -151,6 +166,47 @@ class TestSessionManager(DatabaseTest):
         eq_(1, fiction.size)
         eq_(0, nonfiction.size)
 
+    def test_schema_fingerprint(self):
+        fingerprint = SessionManager.schema_fingerprint()
+        eq_(32, len(fingerprint))
+        eq_(fingerprint, SessionManager.schema_fingerprint())
+
+    def test_stamp_schema(self):
+        connection = self._db.connection()
+        connection.execute(schemaversion.delete())
+        eq_(False, SessionManager.schema_is_current(connection))
+
+        SessionManager.stamp_schema(connection)
+        eq_(True, SessionManager.schema_is_current(connection))
+
+        # Stamping the schema again doesn't record the same
+        # fingerprint twice.
+        SessionManager.stamp_schema(connection)
+        eq_(1, len(list(connection.execute(schemaversion.select()))))
+
+        # A fingerprint recorded by a different version of the code
+        # doesn't count.
+        connection.execute(schemaversion.delete())
+        connection.execute(
+            schemaversion.insert(), fingerprint="an old fingerprint",
+            created=datetime.datetime.utcnow()
+        )
+        eq_(False, SessionManager.schema_is_current(connection))
+
+        # unstamp_schema() forgets every fingerprint.
+        SessionManager.stamp_schema(connection)
+        SessionManager.unstamp_schema(connection)
+        eq_([], list(connection.execute(schemaversion.select())))
+
+        # The schema isn't current if a materialized view is missing,
+        # even if the fingerprint matches.
+        SessionManager.stamp_schema(connection)
+        eq_(True, SessionManager.schema_is_current(connection))
+        connection.execute(
+            "DROP MATERIALIZED VIEW %s" % SessionManager.MATERIALIZED_VIEW_LANES
+        )
+        eq_(False, SessionManager.schema_is_current(connection))
+
 
 class TestDatabaseInterface(DatabaseTest):
 
@@ -231,11 +287,36 @@ class TestDataSource(DatabaseTest):
         eq_(key, new_source.name)
         eq_(True, new_source.offers_licenses)
 
-        # The cache was reset when the data source was created.
-        eq_(HasFullTableCache.RESET, DataSource._cache)
+        # Once it's committed, the new data source is added to the
+        # cache, without reloading the rest of the table.
+        self._db.commit()
+        eq_(new_source, DataSource._cache[key])
+        eq_(new_source, DataSource._id_cache[new_source.id])
 
         eq_((new_source, False), DataSource.by_cache_key(self._db, key, None))
         
+    def test_lookup_snapshot(self):
+        gutenberg = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        snapshot = DataSource.lookup(
+            self._db, DataSource.GUTENBERG, snapshot=True
+        )
+        assert isinstance(snapshot, DataSourceSnapshot)
+        eq_(gutenberg.id, snapshot.id)
+        eq_(gutenberg.name, snapshot.name)
+        eq_(gutenberg.uri, snapshot.uri)
+
+        # A snapshot of an object that belongs to some other session
+        # is taken from the cache; the object isn't merged into this
+        # session.
+        self._db.expunge(gutenberg)
+        eq_(snapshot, DataSource.lookup(
+            self._db, DataSource.GUTENBERG, snapshot=True
+        ))
+        assert gutenberg not in self._db
+
+        # The snapshot can't be changed.
+        assert_raises(AttributeError, setattr, snapshot, 'name', 'foo')
+
     def test_lookup_by_deprecated_name(self):
         threem = DataSource.lookup(self._db, "3M")
         eq_(DataSource.BIBLIOTHECA, threem.name)
@@ -880,6 +961,314 @@ class TestIdentifier(DatabaseTest):
         eq_(format_timestamp(even_later), entry.updated)
 
 
+class TestEquivalencyClosure(DatabaseTest):
+
+    def rows(self, identifier):
+        """The EquivalencyClosure rows for an Identifier, as
+        (equivalent, depth, strength) tuples.
+        """
+        self._db.flush()
+        table = EquivalencyClosure.__table__
+        qu = select(
+            [table.c.equivalent_id, table.c.depth, table.c.strength]
+        ).where(table.c.identifier_id==identifier.id)
+        return set(
+            (equivalent_id, depth, round(strength, 4))
+            for equivalent_id, depth, strength in self._db.execute(qu)
+        )
+
+    def test_maintained_as_equivalencies_change(self):
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        a = self._identifier()
+        b = self._identifier()
+        c = self._identifier()
+        eq_(set(), self.rows(a))
+
+        # Creating an Equivalency adds rows in both directions.
+        ab = a.equivalent_to(data_source, b, 0.5)
+        eq_(set([(b.id, 1, 0.5)]), self.rows(a))
+        eq_(set([(a.id, 1, 0.5)]), self.rows(b))
+
+        bc = b.equivalent_to(data_source, c, 0.9)
+        eq_(set([(b.id, 1, 0.5), (c.id, 2, 0.45)]), self.rows(a))
+        eq_(set([(a.id, 2, 0.45), (b.id, 1, 0.9)]), self.rows(c))
+
+        # A stronger path with more steps gets its own row.
+        a.equivalent_to(data_source, c, 0.1)
+        eq_(set([(b.id, 1, 0.5), (c.id, 1, 0.1), (c.id, 2, 0.45)]),
+            self.rows(a))
+        eq_(set([(a.id, 1, 0.1), (a.id, 2, 0.45), (b.id, 1, 0.9)]),
+            self.rows(c))
+
+        # Changing an Equivalency's strength changes the rows.
+        ab.strength = 1
+        eq_(set([(b.id, 1, 1), (c.id, 1, 0.1), (c.id, 2, 0.9)]),
+            self.rows(a))
+
+        # Deleting an Equivalency removes the paths that went through it.
+        self._db.delete(bc)
+        eq_(set([(b.id, 1, 1), (c.id, 1, 0.1)]), self.rows(a))
+        eq_(set([(a.id, 1, 0.1), (b.id, 2, 0.1)]), self.rows(c))
+
+    def test_negative_equivalencies_are_ignored(self):
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        a = self._identifier()
+        b = self._identifier()
+        a.equivalent_to(data_source, b, -1)
+        eq_(set(), self.rows(a))
+        eq_({a.id: [a.id]},
+            Identifier.recursively_equivalent_identifier_ids(
+                self._db, [a.id], levels=5, threshold=-2
+            ))
+
+    def test_deep_lookups_use_recursive_function(self):
+        # The table doesn't go deep enough for this lookup, so the
+        # recursive database function is used instead.
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        identifiers = [self._identifier() for i in range(8)]
+        for i in range(7):
+            identifiers[i].equivalent_to(
+                data_source, identifiers[i+1], 1
+            )
+        first = identifiers[0]
+        equivs = Identifier.recursively_equivalent_identifier_ids(
+            self._db, [first.id], levels=EquivalencyClosure.MAX_DEPTH
+        )
+        eq_(EquivalencyClosure.MAX_DEPTH + 1, len(equivs[first.id]))
+
+        equivs = Identifier.recursively_equivalent_identifier_ids(
+            self._db, [first.id], levels=EquivalencyClosure.MAX_DEPTH+2
+        )
+        eq_(set([x.id for x in identifiers]), set(equivs[first.id]))
+
+    def test_cutoff(self):
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        a = self._identifier()
+        strong = self._identifier()
+        weak = self._identifier()
+        a.equivalent_to(data_source, weak, 0.6)
+        a.equivalent_to(data_source, strong, 0.9)
+        self._db.flush()
+
+        # The closest, strongest equivalents are kept.
+        equivs = Identifier.recursively_equivalent_identifier_ids(
+            self._db, [a.id], levels=1, cutoff=1
+        )
+        eq_([a.id, strong.id], equivs[a.id])
+
+        query = Identifier.recursively_equivalent_identifier_ids_query(
+            a.id, levels=1, cutoff=1
+        )
+        eq_(set([a.id, strong.id]),
+            set(x[0] for x in self._db.execute(query)))
+
+
+class TestEquivalentIdentifierCache(DatabaseTest):
+
+    def test_lookups_are_cached(self):
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        a = self._identifier()
+        b = self._identifier()
+        c = self._identifier()
+        a.equivalent_to(data_source, b, 1)
+        self._db.commit()
+
+        cache = EquivalentIdentifierCache.for_session(self._db)
+        queries = cache.queries
+        saved = cache.saved
+
+        def lookup(*identifiers, **kwargs):
+            return Identifier.recursively_equivalent_identifier_ids(
+                self._db, [x.id for x in identifiers], **kwargs
+            )
+
+        # The first lookup goes to the database.
+        eq_(set([a.id, b.id]), set(lookup(a)[a.id]))
+        eq_(queries + 1, cache.queries)
+        eq_(saved, cache.saved)
+
+        # The second one doesn't.
+        eq_(set([a.id, b.id]), set(lookup(a)[a.id]))
+        eq_(queries + 1, cache.queries)
+        eq_(saved + 1, cache.saved)
+
+        # Changing the caller's copy of the result doesn't change the
+        # cache.
+        lookup(a)[a.id].append(c.id)
+        eq_(set([a.id, b.id]), set(lookup(a)[a.id]))
+
+        # Only identifiers that aren't in the cache are looked up.
+        result = lookup(a, c)
+        eq_(set([a.id, b.id]), set(result[a.id]))
+        eq_([c.id], result[c.id])
+        eq_(queries + 2, cache.queries)
+
+        # A lookup with different parameters isn't answered from the
+        # cache.
+        lookup(a, levels=1)
+        eq_(queries + 3, cache.queries)
+
+        # Creating an Equivalency invalidates the cache, even if it
+        # hasn't been flushed yet.
+        b.equivalent_to(data_source, c, 1)
+        eq_(set([a.id, b.id, c.id]), set(lookup(a)[a.id]))
+        eq_(queries + 4, cache.queries)
+
+        # So does committing the transaction, since another
+        # transaction may have changed the Equivalencies.
+        self._db.commit()
+        lookup(a)
+        eq_(queries + 5, cache.queries)
+
+    def test_calculate_presentation_uses_cache(self):
+        work = self._work(with_license_pool=True)
+        self._db.commit()
+        cache = EquivalentIdentifierCache.for_session(self._db)
+        saved = cache.saved
+        work.calculate_presentation()
+
+        # The Work's equivalent identifiers were looked up more than
+        # once, but only one of those lookups went to the database.
+        assert cache.saved > saved
+
+
+class TestPreloadedLookups(DatabaseTest):
+
+    def test_get_one(self):
+        identifier = self._identifier()
+        other = self._identifier()
+        lookups = PreloadedLookups()
+        keys = set([(identifier.type, identifier.identifier),
+                    (identifier.type, u"not-created-yet")])
+        lookups.load(
+            Identifier, ['type', 'identifier'], [identifier],
+            covers=lambda key: (key[1], key[0]) in keys
+        )
+        lookups.install(self._db)
+        try:
+            # A preloaded object is found.
+            eq_(identifier, get_one(
+                self._db, Identifier, type=identifier.type,
+                identifier=identifier.identifier
+            ))
+            eq_(1, lookups.hits)
+
+            # An object that's known not to exist isn't.
+            eq_(None, get_one(
+                self._db, Identifier, type=identifier.type,
+                identifier=u"not-created-yet"
+            ))
+            eq_(2, lookups.hits)
+
+            # Once it's created, it's found.
+            new, is_new = get_one_or_create(
+                self._db, Identifier, type=identifier.type,
+                identifier=u"not-created-yet"
+            )
+            eq_(True, is_new)
+            eq_((new, False), get_one_or_create(
+                self._db, Identifier, type=identifier.type,
+                identifier=u"not-created-yet"
+            ))
+
+            # Lookups that weren't preloaded use the database as usual.
+            hits = lookups.hits
+            eq_(other, get_one(
+                self._db, Identifier, type=other.type,
+                identifier=other.identifier
+            ))
+            eq_(hits, lookups.hits)
+
+            # A deleted object isn't found.
+            self._db.delete(identifier)
+            eq_(None, get_one(
+                self._db, Identifier, type=identifier.type,
+                identifier=identifier.identifier
+            ))
+        finally:
+            PreloadedLookups.uninstall(self._db)
+        eq_(None, PreloadedLookups.for_session(self._db))
+
+
+class TestPresentationBatch(DatabaseTest):
+
+    def test_calculate_presentation(self):
+        source = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+        works = []
+        for i in range(2):
+            work = self._work(with_license_pool=True)
+            identifier = work.license_pools[0].identifier
+            identifier.classify(source, Subject.TAG, u"Science Fiction",
+                                weight=100)
+            identifier.add_measurement(source, Measurement.RATING, 4+i)
+            identifier.add_link(
+                Hyperlink.DESCRIPTION, None, source,
+                media_type="text/plain", content="Description %d" % i
+            )
+            works.append(work)
+        self._db.commit()
+
+        def presentation(work):
+            return (
+                work.fiction, work.audience, work.quality,
+                work.summary_text,
+                sorted((wg.genre.name, wg.affinity) for wg in work.work_genres),
+                sorted((x.operation, x.status) for x in work.coverage_records),
+            )
+
+        batch = PresentationBatch(self._db, works)
+        saved = batch.calculate_presentation()
+
+        # Most of the lookups were answered from the data the batch
+        # loaded up front.
+        assert saved > 0
+        eq_(saved, batch.saved)
+        eq_(None, PresentationBatch.for_session(self._db))
+        batched = map(presentation, works)
+        assert u"Science Fiction" in [name for name, affinity in batched[0][4]]
+        eq_("Description 1", batched[1][3])
+
+        # Undo the calculation and do it again, one Work at a time.
+        for work in works:
+            for wg in work.work_genres:
+                self._db.delete(wg)
+            work.work_genres = []
+            work.fiction = None
+            work.quality = 0
+            work.set_summary(None)
+        self._db.commit()
+        for work in works:
+            work.calculate_presentation()
+
+        # The results are the same.
+        eq_(batched, map(presentation, works))
+
+    def test_loaded_data_goes_out_of_date(self):
+        work = self._work(with_license_pool=True)
+        identifier = work.license_pools[0].identifier
+        batch = PresentationBatch(self._db, [work])
+        batch.load()
+        eq_([], batch.classifications_for([identifier.id]))
+
+        # A Classification is added while the batch is running.
+        self._db.info[PresentationBatch.KEY] = batch
+        try:
+            source = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+            classification = identifier.classify(
+                source, Subject.TAG, u"Fantasy"
+            )
+
+            # Now the batch can't answer lookups about that
+            # Identifier.
+            eq_(None, batch.classifications_for([identifier.id]))
+            eq_([classification],
+                Identifier.classifications_for_identifier_ids(
+                    self._db, [identifier.id]
+                ).all())
+        finally:
+            self._db.info.pop(PresentationBatch.KEY)
+
+
 class TestGenre(DatabaseTest):
 
     def test_full_table_cache(self):
@@ -1143,6 +1532,73 @@ class TestContributor(DatabaseTest):
         eq_(bob1, bob2)
         eq_(False, new)
 
+    def test_lookups_are_cached(self):
+        cache = ContributorCache.for_session(self._db)
+        [bob], new = Contributor.lookup(self._db, sort_name=u"Jones, Bob")
+        eq_(True, new)
+        [alice], new = Contributor.lookup(self._db, sort_name=u"Adder, Alice",
+                                          viaf=u"1234")
+
+        # Looking them up again doesn't need a query.
+        eq_(([bob], False),
+            Contributor.lookup(self._db, sort_name=u"Jones, Bob"))
+        eq_(([alice], False), Contributor.lookup(self._db, viaf=u"1234"))
+        eq_(2, cache.hits)
+
+        # A new contributor with the same name makes the cached
+        # resolution out of date.
+        bob2, ignore = self._contributor()
+        bob2.sort_name = u"Jones, Bob"
+        bobs, new = Contributor.lookup(self._db, sort_name=u"Jones, Bob")
+        eq_(set([bob, bob2]), set(bobs))
+        eq_(2, cache.hits)
+
+        # So does a change of identifier.
+        alice.viaf = u"5678"
+        eq_(([], False),
+            Contributor.lookup(self._db, viaf=u"1234", create_new=False))
+
+        # Releasing a savepoint doesn't end the transaction, so the
+        # cache survives it.
+        self._db.begin_nested()
+        self._db.commit()
+        assert cache.results
+
+        # At the end of the transaction, everything is forgotten,
+        # since another process may change the contributors.
+        self._db.commit()
+        eq_({}, cache.results)
+        eq_({}, cache.keys_by_id)
+
+        # The same is true after a rollback, since contributors
+        # created during the transaction may no longer exist.
+        Contributor.lookup(self._db, sort_name=u"Jones, Bob")
+        assert cache.results
+        self._db.rollback()
+        eq_({}, cache.results)
+
+    def test_cache_is_bounded(self):
+        cache = ContributorCache(max_size=2)
+        contributors = [self._contributor()[0] for i in range(3)]
+        for contributor in contributors:
+            cache.put(ContributorCache.sort_name_key(contributor.sort_name),
+                      [contributor])
+
+        # The least recently used resolution was forgotten.
+        keys = [ContributorCache.sort_name_key(x.sort_name)
+                for x in contributors]
+        eq_(keys[1:], list(cache.results))
+        eq_(None, cache.get(self._db, keys[0]))
+        assert contributors[0].id not in cache.keys_by_id
+
+    def test_normalized_name(self):
+        contributor, ignore = self._contributor()
+        eq_(None, contributor.normalized_name)
+        contributor.display_name = u"J.R.R. Tolkien"
+        eq_(u"jrr tolkien", contributor.normalized_name)
+        contributor.display_name = None
+        eq_(None, contributor.normalized_name)
+
     def test_merge(self):
 
         # Here's Robert.
@@ -3748,6 +4204,48 @@ class TestCirculationEvent(DatabaseTest):
         # updating the dataset.
         eq_(0, event.license_pool.licenses_owned)
 
+    def test_log_batch(self):
+        pool = self._licensepool(None)
+        now = datetime.datetime.utcnow()
+        existing, ignore = CirculationEvent.log(
+            self._db, pool, CirculationEvent.DISTRIBUTOR_CHECKIN, 1, 2,
+            start=now
+        )
+        later = now + datetime.timedelta(seconds=1)
+        checkout = dict(
+            license_pool_id=pool.id, type=CirculationEvent.CM_CHECKOUT,
+            start=later, old_value=2, new_value=1
+        )
+        events = [
+            # This event has already been logged.
+            dict(license_pool_id=pool.id,
+                 type=CirculationEvent.DISTRIBUTOR_CHECKIN, start=now,
+                 old_value=1, new_value=2),
+            checkout,
+            # This event shows up twice in the batch.
+            dict(checkout),
+            # An event doesn't need a LicensePool.
+            dict(license_pool_id=None, type=CirculationEvent.NEW_PATRON,
+                 start=later),
+        ]
+        eq_(2, CirculationEvent.log_batch(self._db, events))
+
+        events = self._db.query(CirculationEvent).order_by(
+            CirculationEvent.id
+        ).all()
+        eq_(3, len(events))
+        eq_(existing, events[0])
+        eq_((pool, CirculationEvent.CM_CHECKOUT, later, later, 2, -1, 1),
+            (events[1].license_pool, events[1].type, events[1].start,
+             events[1].end, events[1].old_value, events[1].delta,
+             events[1].new_value))
+        eq_((None, CirculationEvent.NEW_PATRON, None),
+            (events[2].license_pool, events[2].type, events[2].delta))
+
+        # Logging the same batch again does nothing.
+        eq_(0, CirculationEvent.log_batch(self._db, [checkout]))
+        eq_(0, CirculationEvent.log_batch(self._db, []))
+
 
 # class TestWorkQuality(DatabaseTest):
 
@@ -5520,6 +6018,114 @@ class TestRepresentation(DatabaseTest):
             self._db, url, do_get=h.do_get)
         eq_(False, cached)
 
+    def test_get_many(self):
+        # One representation is cached and fresh.
+        fresh, ignore = self._representation(
+            "http://a.com/fresh", "text/plain", "Fresh content"
+        )
+        fresh.fetched_at = datetime.datetime.utcnow()
+        fresh.status_code = 200
+
+        # One is cached but stale, and has an ETag we can use to make
+        # a conditional request.
+        stale, ignore = self._representation(
+            "http://a.com/stale", "text/plain", "Stale content"
+        )
+        stale.fetched_at = datetime.datetime.utcnow() - datetime.timedelta(
+            days=10
+        )
+        stale.status_code = 200
+        stale.etag = "an etag"
+
+        requests = dict()
+        responses = {
+            "http://a.com/stale": (304, {"content-type": "text/plain"}, ""),
+            "http://b.com/new": (
+                200, {"content-type": "text/html"}, "New content"
+            ),
+            "http://b.com/error": (500, {}, "Oops"),
+        }
+        def do_get(url, headers):
+            requests[url] = headers
+            return responses[url]
+
+        fetches = [
+            RepresentationFetch("http://a.com/fresh"),
+            RepresentationFetch(
+                "http://a.com/stale", max_age=datetime.timedelta(days=1)
+            ),
+            RepresentationFetch(
+                "http://b.com/new", accept="text/html",
+                extra_request_headers={"X-Header": "value"}
+            ),
+            RepresentationFetch("http://b.com/error"),
+        ]
+        results = Representation.get_many(self._db, fetches, do_get=do_get)
+
+        # The results come back in the order the fetches were requested.
+        eq_([fresh, stale], [x[0] for x in results[:2]])
+        eq_([True, False, False, False], [x[1] for x in results])
+
+        # The fresh representation was never requested.
+        eq_(set(["http://a.com/stale", "http://b.com/new",
+                 "http://b.com/error"]), set(requests.keys()))
+
+        # The stale representation was requested conditionally, and
+        # the server said it hadn't changed.
+        eq_("an etag", requests["http://a.com/stale"]["If-None-Match"])
+        eq_(304, stale.status_code)
+        eq_("Stale content", stale.content)
+
+        # The new representation was requested with the headers
+        # specific to it, and stored as if by Representation.get().
+        eq_(dict(Accept="text/html", **{"X-Header": "value"}),
+            requests["http://b.com/new"])
+        new = results[2][0]
+        eq_("http://b.com/new", new.url)
+        eq_("New content", new.content)
+        eq_("text/html", new.media_type)
+
+        error = results[3][0]
+        eq_(500, error.status_code)
+        assert "got status code 500" in error.fetch_exception
+
+        # Asking again gets the new representation from the cache.
+        [(representation, cached)] = Representation.get_many(
+            self._db, [RepresentationFetch("http://b.com/new")],
+            do_get=do_get
+        )
+        eq_(new, representation)
+        eq_(True, cached)
+
+    def test_fetch_concurrently_limits_requests_per_host(self):
+        lock = threading.Lock()
+        active = dict(a=0, b=0)
+        most_active = dict(a=0, b=0)
+        def do_get(url, headers):
+            host = url[7]
+            with lock:
+                active[host] += 1
+                most_active[host] = max(most_active[host], active[host])
+            time.sleep(0.01)
+            with lock:
+                active[host] -= 1
+            return 200, {}, url
+
+        requests = []
+        for i in range(10):
+            for host in "ab":
+                url = "http://%s.com/%d" % (host, i)
+                requests.append((RepresentationFetch(url), {}))
+        responses = Representation._fetch_concurrently(
+            requests, do_get, concurrency=6, concurrency_per_host=2
+        )
+
+        # Every request was made, and the responses are in order.
+        eq_([x[0].url for x in requests], [x[1][2] for x in responses])
+
+        # No more than two requests were ever made to a given host at once.
+        eq_(dict(a=2, b=2), most_active)
+
     def test_response_reviewer_impacts_representation(self):
         h = DummyHTTPClient()
         h.queue_response(200, media_type='text/html')
@@ -7651,6 +8257,7 @@ class TestLibrary(DatabaseTest):
         library = self._default_library
         name = library.short_name
         eq_(name, library.cache_key())
+        self._db.commit()
 
         # Cache is empty.
         eq_(HasFullTableCache.RESET, Library._cache)
@@ -8043,6 +8650,48 @@ class TestConfigurationSetting(DatabaseTest):
         library_patron_prefix_conf.value = "Library-specific value"
         eq_("Library-specific value", library_patron_prefix_conf.value)
         
+    def test_snapshot(self):
+        key = "SomeKey"
+        sitewide_conf = ConfigurationSetting.sitewide(self._db, key)
+        sitewide_conf.value = "Sitewide value"
+        library = self._default_library
+        library_conf = ConfigurationSetting.for_library(key, library)
+
+        sitewide = ConfigurationSetting.sitewide(self._db, key, snapshot=True)
+        eq_((sitewide_conf.id, None, None, key, "Sitewide value"),
+            (sitewide.id, sitewide.library_id,
+             sitewide.external_integration_id, sitewide.key, sitewide.value))
+
+        # A snapshot's value takes inheritance into account.
+        snapshot = ConfigurationSetting.for_library(key, library, snapshot=True)
+        eq_(library_conf.id, snapshot.id)
+        eq_("Sitewide value", snapshot.value)
+
+        # Snapshots can interpret their values just like
+        # ConfigurationSettings.
+        sitewide_conf.value = "10"
+        snapshot = ConfigurationSetting.for_library(key, library, snapshot=True)
+        eq_(10, snapshot.int_value)
+        eq_(10.0, snapshot.float_value)
+        eq_(10, snapshot.json_value)
+        eq_(False, snapshot.bool_value)
+
+        # Once a change is committed, snapshots taken in other
+        # sessions see it.
+        self._db.commit()
+        eq_("10", sitewide_conf._cache_snapshot.value)
+
+        # If the cached object belongs to some other session, but
+        # this session has its own copy, the snapshot reflects this
+        # session's unflushed changes.
+        conf_id = sitewide_conf.id
+        self._db.expunge(sitewide_conf)
+        local_conf = self._db.query(ConfigurationSetting).get(conf_id)
+        assert local_conf is not sitewide_conf
+        local_conf.value = "20"
+        snapshot = ConfigurationSetting.for_library(key, library, snapshot=True)
+        eq_(20, snapshot.int_value)
+
     def test_duplicate(self):
         """You can't have two ConfigurationSettings for the same key,
         library, and external integration.
@@ -8299,6 +8948,7 @@ class TestSiteConfigurationHasChanged(DatabaseTest):
         self.mock.assert_was_called()
         
         ConfigurationSetting.sitewide(self._db, "setting").value = "value2"
+        self._db.flush()
         self.mock.assert_was_called()
 
     def test_lane_change_updates_configuration(self):
@@ -8359,9 +9009,9 @@ class TestCollection(DatabaseTest):
         )
         eq_(True, is_new)
 
-        # Cache was populated and then reset because we created a new
-        # Collection.
+        # Until the new Collection is committed, it's not cached.
         eq_(HasFullTableCache.RESET, Collection._cache)
+        self._db.commit()
         
         collection2, is_new = Collection.by_name_and_protocol(
             self._db, name, ExternalIntegration.OVERDRIVE
@@ -8369,7 +9019,8 @@ class TestCollection(DatabaseTest):
         eq_(collection1, collection2)
         eq_(False, is_new)
 
-        # This time the cache was not reset after being populated.
+        # Cache was populated, and the second lookup was answered
+        # from the cache.
         eq_(collection1, Collection._cache[key])
         
         # You'll get an exception if you look up an existing name
@@ -9298,9 +9949,208 @@ class TestHasFullTableCache(DatabaseTest):
         eq_({MockHasTableCache.KEY: self.mock}, temp_cache)
         eq_({MockHasTableCache.ID: self.mock}, temp_id_cache)
 
+    def test_cache_evict(self):
+        other = object()
+        self.mock_class._cache = {self.mock.KEY: self.mock, "other": other}
+        self.mock_class._id_cache = {self.mock.ID: self.mock, 2: other}
+        self.mock_class._cache_evict(self.mock.ID)
+        eq_({"other": other}, self.mock_class._cache)
+        eq_({2: other}, self.mock_class._id_cache)
+
+        # Evicting an object that isn't cached does nothing.
+        self.mock_class._cache_evict(self.mock.ID)
+        eq_({2: other}, self.mock_class._id_cache)
+
+        # If the caches are out of step, they're both reset.
+        self.mock_class._cache = HasFullTableCache.RESET
+        self.mock_class._cache_evict(2)
+        eq_(HasFullTableCache.RESET, self.mock_class._id_cache)
+
+    def test_cache_upsert(self):
+        self.mock_class._cache = {"old key": self.mock}
+        self.mock_class._id_cache = {self.mock.ID: self.mock}
+        self.mock_class._cache_upsert(self.mock)
+        eq_({self.mock.KEY: self.mock}, self.mock_class._cache)
+        eq_({self.mock.ID: self.mock}, self.mock_class._id_cache)
+
+    def test_changes_update_cache_one_object_at_a_time(self):
+        source = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        other = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+        reloads = DataSource.cache_stats()['reloads']
+
+        # When a cached object changes, its entry in the cache is
+        # evicted and the rest of the cache is left alone.
+        source.name = u"Renamed data source"
+        self._db.flush()
+        assert DataSource.GUTENBERG not in DataSource._cache
+        assert source.id not in DataSource._id_cache
+        eq_(other, DataSource._cache[DataSource.OVERDRIVE])
+
+        # Until the change is committed, this session looks up
+        # DataSources in the database, so it sees its own changes.
+        eq_(source, DataSource.lookup(self._db, u"Renamed data source"))
+        new_source = DataSource.lookup(self._db, u"New source",
+                                       autocreate=True)
+        assert u"Renamed data source" not in DataSource._cache
+        assert u"New source" not in DataSource._cache
+
+        # Once it's committed, the new versions are cached.
+        self._db.commit()
+        eq_(source, DataSource._cache[u"Renamed data source"])
+        eq_(source, DataSource._id_cache[source.id])
+        eq_(new_source, DataSource._cache[u"New source"])
+        eq_(other, DataSource._cache[DataSource.OVERDRIVE])
+
+        # A deleted object is evicted.
+        self._db.delete(new_source)
+        self._db.flush()
+        assert u"New source" not in DataSource._cache
+
+        # If the transaction is rolled back, nothing it changed is
+        # cached.
+        other.name = u"Rolled back"
+        self._db.flush()
+        self._db.rollback()
+        assert u"Rolled back" not in DataSource._cache
+        eq_(other, DataSource.lookup(self._db, DataSource.OVERDRIVE))
+
+        # None of this required reloading the table.
+        eq_(reloads, DataSource.cache_stats()['reloads'])
+
+    def test_uncommitted_changes_are_not_shared(self):
+        # Change a cached object without committing the change.
+        source = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        source.name = u"Uncommitted name"
+        self._db.flush()
+
+        # Another database connection can't see the change, and
+        # neither can a session that uses it to look up the object
+        # through the cache.
+        connection = self.engine.connect()
+        other_db = Session(connection)
+        try:
+            [[name]] = other_db.execute(
+                "select name from datasources where id=:id",
+                dict(id=source.id)
+            )
+            eq_(DataSource.GUTENBERG, name)
+            other = DataSource.lookup(other_db, DataSource.GUTENBERG)
+            eq_(source.id, other.id)
+            eq_(DataSource.GUTENBERG, other.name)
+            eq_(None, DataSource.lookup(other_db, u"Uncommitted name"))
+        finally:
+            other_db.close()
+            connection.close()
+
+        # This session sees its own change.
+        eq_(source, DataSource.lookup(self._db, u"Uncommitted name"))
+        eq_(None, DataSource.lookup(self._db, DataSource.GUTENBERG))
+
+    def test_cache_stats(self):
+        Genre.reset_cache()
+        Genre._cache_hits = Genre._cache_misses = Genre._cache_reloads = 0
+        eq_(dict(size=0, hits=0, misses=0, hit_rate=None, reloads=0),
+            Genre.cache_stats())
+
+        Genre.lookup(self._db, "Drama")
+        Genre.lookup(self._db, "Drama")
+        Genre.by_cache_key(self._db, "No such genre", lambda: (None, False))
+        stats = Genre.cache_stats()
+        eq_(self._db.query(Genre).count(), stats['size'])
+        eq_(2, stats['hits'])
+        eq_(1, stats['misses'])
+        eq_(2/3.0, stats['hit_rate'])
+        eq_(1, stats['reloads'])
+
+        eq_(stats, HasFullTableCache.all_cache_stats()['Genre'])
+
+    def test_snapshot(self):
+        class MockSnapshot(CacheSnapshot):
+            FIELDS = __slots__ = ('id', 'name')
+
+        snapshot = MockSnapshot(id=1, name="a name")
+        eq_("<MockSnapshot id=1 name='a name'>", repr(snapshot))
+        assert_raises(AttributeError, setattr, snapshot, 'name', 'foo')
+        assert_raises(AttributeError, setattr, snapshot, 'other', 'foo')
+        assert_raises(AttributeError, delattr, snapshot, 'name')
+
+        changed = snapshot.replace(name="new name")
+        eq_((1, "new name"), (changed.id, changed.name))
+        eq_("a name", snapshot.name)
+        eq_(MockSnapshot(id=1, name="a name"), snapshot)
+        assert changed != snapshot
+        eq_(1, len(set([snapshot, MockSnapshot(id=1, name="a name")])))
+
+    def test_cached_classes(self):
+        classes = HasFullTableCache.cached_classes()
+        eq_(DataSource, classes['DataSource'])
+        eq_(MockHasTableCache, classes['MockHasTableCache'])
+
     # populate_cache(), by_cache_key(), and by_id() are tested in
     # TestGenre since those methods must be backed by a real database
     # table.
 
 
+class TestCacheInvalidationListener(DatabaseTest):
+
+    def test_process(self):
+        listener = CacheInvalidationListener(None)
+        gutenberg = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        overdrive = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+        assert gutenberg.id in DataSource._id_cache
+
+        # Another process changed a DataSource. Only that DataSource
+        # is evicted from the cache.
+        listener.process("another-process DataSource %s" % gutenberg.id)
+        assert gutenberg.id not in DataSource._id_cache
+        assert DataSource.GUTENBERG not in DataSource._cache
+        eq_(overdrive, DataSource._cache[DataSource.OVERDRIVE])
+
+        # This process's own notifications are ignored.
+        listener.process("%s DataSource %s" % (
+            HasFullTableCache.process_token(), overdrive.id
+        ))
+        eq_(overdrive, DataSource._id_cache[overdrive.id])
+
+        # But a process forked from this one has the same PROCESS_TOKEN
+        # and different caches, so its notifications are processed.
+        listener.process("%s-%d DataSource %s" % (
+            HasFullTableCache.PROCESS_TOKEN, os.getpid() + 1, overdrive.id
+        ))
+        assert overdrive.id not in DataSource._id_cache
+
+        # Another process changed the site configuration.
+        with temp_config() as config:
+            listener.process(
+                "another-process site_configuration 2018-01-02T03:04:05.000006"
+            )
+            eq_(datetime.datetime(2018, 1, 2, 3, 4, 5, 6),
+                Configuration._site_configuration_last_update())
+
+            # When changes are pushed to us, the database isn't
+            # checked for site configuration changes.
+            config[Configuration.SITE_CONFIGURATION_CHANGES_PUSHED] = os.getpid()
+            Timestamp.stamp(
+                self._db, Configuration.SITE_CONFIGURATION_CHANGED, None
+            )
+            eq_(datetime.datetime(2018, 1, 2, 3, 4, 5, 6),
+                Configuration.site_configuration_last_update(
+                    self._db, timeout=0
+                ))
+
+            # A process forked from the one that's listening doesn't
+            # inherit the listener, so it checks the database.
+            config[Configuration.SITE_CONFIGURATION_CHANGES_PUSHED] = os.getpid() + 1
+            assert Configuration.site_configuration_last_update(
+                self._db, timeout=0
+            ) > datetime.datetime(2018, 1, 2, 3, 4, 5, 6)
+
+        # No listener is started while testing.
+        eq_(None, CacheInvalidationListener.start_for_engine(self._db.get_bind()))
+
+        # Garbage is ignored.
+        listener.process("garbage")
+        listener.process("another-process NoSuchClass 1")
+
+
     
@@ -370,6 +370,99 @@ class TestSweepMonitor(DatabaseTest):
         # cleanup() is only called when the sweep completes successfully.
         eq_([], monitor.cleanup_called)
 
+    def test_shard_arguments_are_validated(self):
+        assert_raises_regexp(
+            ValueError, "shard must be between 0 and 2.",
+            MockSweepMonitor, self._db, shard=3, shard_count=3
+        )
+        assert_raises_regexp(
+            ValueError, "shard must be between 0 and 2.",
+            MockSweepMonitor, self._db, shard_count=3
+        )
+        assert_raises_regexp(
+            ValueError, "shard_count must be at least 1.",
+            MockSweepMonitor, self._db, shard=0, shard_count=0
+        )
+        assert_raises_regexp(
+            ValueError, "shard_count is required when shard is set.",
+            MockSweepMonitor, self._db, shard=0
+        )
+
+    def test_shard_only_processes_its_own_items(self):
+        identifiers = [self._identifier() for i in range(5)]
+        monitor = MockSweepMonitor(self._db, shard=1, shard_count=2)
+        monitor.run()
+        eq_([x for x in identifiers if x.id % 2 == 1], monitor.processed)
+
+        # The shard tracks its progress in its own Timestamp, not the
+        # Monitor's.
+        eq_("Sweep Monitor (shard 1 of 2)",
+            monitor.progress_timestamp().service)
+        eq_(0, monitor.progress_timestamp().counter)
+        eq_(0, monitor.timestamp().counter)
+
+    def test_sharded_sweep_completes_when_every_shard_finishes(self):
+        identifiers = [self._identifier() for i in range(4)]
+        shard0 = MockSweepMonitor(self._db, shard=0, shard_count=2)
+        shard1 = MockSweepMonitor(self._db, shard=1, shard_count=2)
+        sweep_timestamp = shard0.timestamp()
+        original_sweep_time = sweep_timestamp.timestamp
+
+        # Shard 0 finishes its portion of the sweep, but the sweep
+        # is not complete, so cleanup() isn't called.
+        shard0.run()
+        eq_([], shard0.cleanup_called)
+        eq_(original_sweep_time, sweep_timestamp.timestamp)
+        eq_(True, shard0.shard_is_finished(
+            shard0.progress_timestamp(), sweep_timestamp
+        ))
+
+        # If shard 0 runs again before shard 1 finishes, it does nothing.
+        shard0.run()
+        eq_(2, len(shard0.processed))
+        eq_(2, len(shard0.batches))
+
+        # When shard 1 finishes, the sweep is complete and a new one
+        # can begin.
+        shard1.run()
+        eq_([True], shard1.cleanup_called)
+        assert sweep_timestamp.timestamp > original_sweep_time
+        eq_(identifiers,
+            sorted(shard0.processed + shard1.processed, key=lambda x: x.id))
+        for shard in (shard0, shard1):
+            eq_(False, shard.shard_is_finished(
+                shard.progress_timestamp(), sweep_timestamp
+            ))
+
+        # Now shard 0 will sweep its portion of the table again.
+        shard0.run()
+        eq_(4, len(shard0.processed))
+
+    def test_crashed_shard_resumes_from_its_own_counter(self):
+        i1, i2, i3, i4, i5, i6 = [self._identifier() for i in range(6)]
+        even = [x for x in (i1, i2, i3, i4, i5, i6) if x.id % 2 == 0]
+
+        class IHateTheLastOne(MockSweepMonitor):
+            def process_item(self, item):
+                if item is even[-1]:
+                    raise Exception("HOW DARE YOU")
+                super(IHateTheLastOne, self).process_item(item)
+
+        monitor = IHateTheLastOne(self._db, shard=0, shard_count=2)
+        monitor.run()
+
+        # The first batch of two items was processed and the shard's
+        # counter was updated. The shard is not finished.
+        progress = monitor.progress_timestamp()
+        eq_(even[1].id, progress.counter)
+        eq_(None, progress.timestamp)
+
+        # A healthy worker for the same shard picks up where the
+        # crashed one left off.
+        monitor = MockSweepMonitor(self._db, shard=0, shard_count=2)
+        monitor.run()
+        eq_(even[2:], monitor.processed)
+
 
 class TestIdentifierSweepMonitor(DatabaseTest):
 
@@ -428,6 +521,15 @@ class TestSubjectSweepMonitor(DatabaseTest):
         )
         eq_([s2], specific_tag_monitor.item_query().all())
 
+        # Subjects can be swept in shards, like anything else.
+        sharded = Mock(
+            self._db, subject_type=Subject.TAG, shard=1, shard_count=2
+        )
+        eq_(True, sharded.is_sharded)
+        eq_(1, sharded.shard)
+        eq_(2, sharded.shard_count)
+        eq_(Subject.TAG, sharded.subject_type)
+
 
 class TestCustomListEntrySweepMonitor(DatabaseTest):
 
@@ -624,7 +726,33 @@ class TestMakePresentationReadyMonitor(DatabaseTest):
             self.work.presentation_ready_exception
         )
         eq_(False, self.work.presentation_ready)
-        
+
+    def test_process_items(self):
+        # This work will fail, because its identifier is covered by
+        # the failing provider.
+        failing_work = self.work
+
+        # This one succeeds, because neither provider covers its
+        # identifier.
+        edition, pool = self._edition(
+            DataSource.OVERDRIVE, Identifier.OVERDRIVE_ID,
+            with_license_pool=True
+        )
+        work = self._work(presentation_edition=edition)
+        work.presentation_ready = False
+
+        monitor = MakePresentationReadyMonitor(
+            self._db, [self.success, self.failure]
+        )
+        monitor.process_items([failing_work, work])
+        eq_(False, failing_work.presentation_ready)
+        eq_(
+            "Provider(s) failed: %s" % self.failure.SERVICE_NAME,
+            failing_work.presentation_ready_exception
+        )
+        eq_(True, work.presentation_ready)
+        eq_(None, work.presentation_ready_exception)
+
     def test_prepare_raises_exception_with_failing_providers(self):
         monitor = MakePresentationReadyMonitor(
             self._db, [self.success, self.failure]
@@ -675,6 +803,40 @@ class TestWorkRandomnessUpdateMonitor(DatabaseTest):
         # higher that the code has broken and it's failing reliably.
         assert work.random != old_random
 
+    def test_process_batch_updates_one_id_range(self):
+        w1, w2, w3 = [self._work() for i in range(3)]
+        for w in (w1, w2, w3):
+            w.random = 0
+        self._db.commit()
+
+        # Work IDs aren't necessarily consecutive, so size the batch
+        # to cover exactly w1 and w2.
+        batch_size = w2.id - w1.id + 1
+        monitor = WorkRandomnessUpdateMonitor(
+            self._db, batch_size=batch_size
+        )
+
+        # The first batch covers w1 and w2, but not w3.
+        eq_(w1.id+batch_size, monitor.process_batch(w1.id))
+        self._db.commit()
+        self._db.expire_all()
+        assert w1.random != 0
+        assert w2.random != 0
+        eq_(0, w3.random)
+
+        # The highest Work ID was looked up once and remembered.
+        eq_(w3.id, monitor.max_work_id)
+
+        # The second batch covers w3 and finishes the sweep.
+        eq_(0, monitor.process_batch(w3.id))
+        self._db.commit()
+        self._db.expire_all()
+        assert w3.random != 0
+
+    def test_process_batch_with_no_works(self):
+        monitor = WorkRandomnessUpdateMonitor(self._db)
+        eq_(0, monitor.process_batch(0))
+
 
 class TestCustomListEntryWorkUpdateMonitor(DatabaseTest):
 
@@ -1202,6 +1202,62 @@ class TestOPDS(DatabaseTest):
         # they were cached before.
         eq_(sorted(parsed.entries), sorted(feedparser.parse(raw_groups).entries))
 
+    def test_feed_query_counts(self):
+        """Generating a feed doesn't run an extra set of queries for
+        each work in it, and serving it from the cache runs hardly any.
+        """
+        lane = self.contemporary_romance
+
+        # The feeds use the cached OPDS entries that the lane queries
+        # load.
+        class PageAnnotator(TestAnnotator):
+            opds_cache_field = Configuration.DEFAULT_OPDS_FORMAT
+        class GroupsAnnotator(TestAnnotatorWithGroup):
+            opds_cache_field = Configuration.DEFAULT_OPDS_FORMAT
+
+        def add_works(how_many):
+            works = [
+                self._work(genre=Contemporary_Romance,
+                           with_open_access_download=True)
+                for i in range(how_many)
+            ]
+            self.add_to_materialized_view(works, True)
+
+        def make_page(force_refresh=True):
+            return AcquisitionFeed.page(
+                self._db, "test", self._url, lane, PageAnnotator,
+                force_refresh=force_refresh
+            )
+
+        def make_groups():
+            return AcquisitionFeed.groups(
+                self._db, "test", self._url, self.fiction,
+                GroupsAnnotator(), force_refresh=True
+            )
+
+        def count_queries(make_feed):
+            with self.count_queries() as profile:
+                make_feed()
+            return profile.count
+
+        # The first feeds fill some caches, so they aren't counted.
+        add_works(1)
+        make_page()
+        make_groups()
+
+        # Once there are twice as many works, generating the feeds
+        # runs the same number of queries.
+        add_works(2)
+        page_queries = count_queries(make_page)
+        groups_queries = count_queries(make_groups)
+        add_works(4)
+        eq_(page_queries, count_queries(make_page))
+        eq_(groups_queries, count_queries(make_groups))
+
+        # A cached feed takes hardly any queries to serve.
+        with self.assert_max_queries(5):
+            make_page(force_refresh=False)
+
     def test_groups_feed_with_empty_sublanes_is_page_feed(self):
         """Test that a page feed is returned when the requested groups
         feed has no books in the groups.
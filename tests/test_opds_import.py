@@ -684,6 +684,108 @@ class TestOPDSImporter(OPDSImporterTest):
         eq_(True, failure.transient)
         assert "Utter failure!" in failure.exception
 
+    def test_extract_data_from_stream(self):
+        data_source = DataSource.lookup(self._db, DataSource.OA_CONTENT_SERVER)
+        values, failures = OPDSImporter.extract_data_from_stream(
+            self.content_server_mini_feed, data_source
+        )
+
+        # We get the same data from one pass over the document that
+        # we'd get from parsing it once with feedparser and once
+        # with lxml.
+        fp_values, fp_failures = OPDSImporter.extract_data_from_feedparser(
+            self.content_server_mini_feed, data_source
+        )
+        xml_values, xml_failures = OPDSImporter.extract_metadata_from_elementtree(
+            self.content_server_mini_feed, data_source
+        )
+        eq_(sorted(fp_values.keys()), sorted(values.keys()))
+        for urn, (fp_detail, xml_detail) in values.items():
+            for key in ('title', 'subtitle', 'language', 'publisher',
+                        'data_source_last_updated'):
+                eq_(fp_values[urn][key], fp_detail[key])
+            eq_(fp_values[urn]['circulation']['data_source'],
+                fp_detail['circulation']['data_source'])
+            eq_([x.content for x in fp_values[urn]['links']],
+                [x.content for x in fp_detail['links']])
+
+            eq_(xml_values[urn]['medium'], xml_detail['medium'])
+            eq_([x.sort_name for x in xml_values[urn]['contributors']],
+                [x.sort_name for x in xml_detail['contributors']])
+            eq_([x.href for x in xml_values[urn]['links']],
+                [x.href for x in xml_detail['links']])
+
+        # The <simplified:message> tag became a CoverageFailure.
+        eq_(xml_failures.keys(), failures.keys())
+        failure = failures['http://www.gutenberg.org/ebooks/1984']
+        assert failure.exception.startswith('202')
+
+        # A feed that's already been decoded works just as well.
+        unicode_values, unicode_failures = OPDSImporter.extract_data_from_stream(
+            self.content_server_mini_feed.decode("utf8"), data_source
+        )
+        eq_(sorted(values.keys()), sorted(unicode_values.keys()))
+        eq_(failures.keys(), unicode_failures.keys())
+
+    def test_extract_data_from_stream_handles_exception(self):
+        class DoomedElementtreeOPDSImporter(OPDSImporter):
+            @classmethod
+            def _detail_for_elementtree_entry(cls, *args, **kwargs):
+                raise Exception("Utter failure!")
+
+        data_source = DataSource.lookup(self._db, DataSource.OA_CONTENT_SERVER)
+        values, failures = DoomedElementtreeOPDSImporter.extract_data_from_stream(
+            self.content_server_mini_feed, data_source
+        )
+
+        # No metadata was extracted, because one half of the work
+        # failed for every <entry>.
+        eq_({}, values)
+        eq_(3, len(failures))
+        failure = failures['urn:librarysimplified.org/terms/id/Gutenberg%20ID/10441']
+        assert "Utter failure!" in failure.exception
+
+    def test_feedparser_entry_from_tag(self):
+        # The dictionary built from an lxml <entry> tag has the values
+        # feedparser would have found in the same place.
+        parser = OPDSXMLParser()
+        root = etree.parse(StringIO(self.content_server_feed))
+        entry_tags = parser._xpath(root, '/atom:feed/atom:entry')
+        fp_entries = feedparser.parse(self.content_server_feed)['entries']
+        eq_(len(fp_entries), len(entry_tags))
+
+        for fp_entry, entry_tag in zip(fp_entries, entry_tags):
+            entry = OPDSImporter.feedparser_entry_from_tag(parser, entry_tag)
+            for key in ('id', 'title', 'schema_alternativeheadline',
+                        'publisher', 'language', 'rights'):
+                eq_(fp_entry.get(key), entry.get(key))
+            eq_(tuple(fp_entry['updated_parsed']),
+                tuple(entry['updated_parsed']))
+            if 'summary_detail' in fp_entry:
+                eq_(fp_entry['summary_detail']['value'],
+                    entry['summary_detail']['value'])
+                eq_(fp_entry['summary_detail']['type'],
+                    entry['summary_detail']['type'])
+
+    def test_top_level_tags(self):
+        atom = OPDSXMLParser.NAMESPACES['atom']
+        tag_names = ['{%s}entry' % atom, '{%s}link' % atom]
+        feed = self.content_server_mini_feed
+        seen = []
+        for tag in OPDSImporter._top_level_tags(feed, tag_names):
+            # <link> tags inside an <entry> are not yielded on their
+            # own.
+            root = tag.getparent()
+            eq_('{%s}feed' % atom, root.tag)
+            seen.append(tag.tag)
+        eq_(3, seen.count('{%s}link' % atom))
+        eq_(2, seen.count('{%s}entry' % atom))
+
+        # Each tag was cleared out once it had been processed, and
+        # everything before it was removed from the tree.
+        [last] = root
+        eq_({}, dict(last.attrib))
+
     def test_import_exception_if_unable_to_parse_feed(self):
         feed = "I am not a feed."
         importer = OPDSImporter(self._db, collection=None)
@@ -1184,6 +1286,62 @@ class TestOPDSImporter(OPDSImporterTest):
         importer.build_identifier_mapping([isbn1])
         eq_(None, importer.identifier_mapping)
 
+    def test_identifiers_for_urns(self):
+        importer = OPDSImporter(self._db, None)
+        existing = self._identifier(identifier_type=Identifier.ISBN,
+                                    foreign_id="9781449358068")
+        new_urn = "urn:librarysimplified.org/terms/id/Gutenberg%20ID/12345"
+
+        # An ISBN-10 URN finds the ISBN-13 Identifier it corresponds to.
+        isbn10_urn = "urn:isbn:1449358063"
+        bad_urn = "not a urn"
+
+        # Without autocreate, only existing Identifiers are found.
+        found = importer.identifiers_for_urns(
+            [isbn10_urn, new_urn, bad_urn], autocreate=False
+        )
+        eq_({isbn10_urn: existing}, found)
+
+        # With autocreate, missing Identifiers are created.
+        found = importer.identifiers_for_urns([isbn10_urn, new_urn, bad_urn])
+        eq_(existing, found[isbn10_urn])
+        new_identifier = found[new_urn]
+        eq_(Identifier.GUTENBERG_ID, new_identifier.type)
+        eq_("12345", new_identifier.identifier)
+        assert bad_urn not in found
+
+        # The Identifiers are kept around, so looking them up again
+        # doesn't touch the database.
+        eq_(existing, importer.identifiers_by_urn[isbn10_urn])
+        eq_(new_identifier, importer.identifier_for_urn(new_urn))
+
+        # An Identifier that wasn't looked up in bulk is looked up on
+        # its own.
+        other = self._identifier()
+        eq_(other, importer.identifier_for_urn(other.urn))
+        eq_(other, importer.identifiers_by_urn[other.urn])
+
+    def test_extract_feed_data_looks_up_identifiers_in_bulk(self):
+        importer = OPDSImporter(
+            self._db, collection=self._default_collection
+        )
+        metadata, failures = importer.extract_feed_data(
+            self.content_server_mini_feed
+        )
+
+        # Every URN in the feed was looked up at once, and the
+        # Identifiers were handed on to the Metadata and
+        # CirculationData objects.
+        eq_(3, len(importer.identifiers_by_urn))
+        looked_up = importer.identifiers_by_urn.values()
+        eq_(2, len(metadata))
+        for urn, m in metadata.items():
+            identifier = m.primary_identifier_obj
+            eq_(urn, identifier.urn)
+            assert identifier in looked_up
+            if m.circulation:
+                eq_(identifier, m.circulation.primary_identifier(self._db))
+
     def test_update_work_for_edition_having_multiple_license_pools(self):
         # There are two collections with a LicensePool associated with
         # this Edition.
@@ -2007,35 +2165,136 @@ class TestOPDSImportMonitor(OPDSImporterTest):
         assert "Utter failure!" in failure.exception
 
 
-    def test_run_once(self):
+    def test_feed_updated_since(self):
+        monitor = OPDSImportMonitor(
+            self._db, collection=self._default_collection,
+            import_class=OPDSImporter
+        )
+        # Both entries in this feed were updated on January 2, 2015.
+        feed = self.content_server_mini_feed
+        eq_(True, monitor.feed_updated_since(feed, None))
+        eq_(True, monitor.feed_updated_since(
+            feed, datetime.datetime(2015, 1, 1)
+        ))
+        eq_(False, monitor.feed_updated_since(
+            feed, datetime.datetime(2016, 1, 1)
+        ))
+
+    def _mock_feed_page(self, title, next_links=[],
+                        updated="2018-07-01T00:00:00Z"):
+        """Create a tiny OPDS feed with one entry."""
+        links = "".join(
+            '<link rel="next" href="%s"/>' % link for link in next_links
+        )
+        return (
+            '<feed xmlns="http://www.w3.org/2005/Atom"><title>%s</title>%s'
+            '<entry><id>urn:isbn:9781449358068</id><updated>%s</updated>'
+            '</entry></feed>'
+        ) % (title, links, updated)
+
+    def _mock_crawling_monitor(self, pages):
         class MockOPDSImportMonitor(OPDSImportMonitor):
             def __init__(self, *args, **kwargs):
                 super(MockOPDSImportMonitor, self).__init__(*args, **kwargs)
-                self.responses = []
+                self.fetched = []
                 self.imports = []
 
-            def queue_response(self, response):
-                self.responses.append(response)
+            def fetch_one_link(self, link, do_get=None):
+                self.fetched.append(link)
+                page = pages[link]
+                if isinstance(page, Exception):
+                    raise page
+                return page
 
-            def follow_one_link(self, link, cutoff_date=None, do_get=None):
-                return self.responses.pop()
+            def feed_contains_new_data(self, feed):
+                return feed['feed']['title'] != 'old'
 
             def import_one_feed(self, feed):
-                self.imports.append(feed)
+                self.imports.append(feedparser.parse(feed)['feed']['title'])
 
-        monitor = MockOPDSImportMonitor(
+        self._default_collection.external_account_id = "http://first/"
+        return MockOPDSImportMonitor(
             self._db, collection=self._default_collection,
             import_class=OPDSImporter
         )
-        
-        monitor.queue_response([[], "last page"])
-        monitor.queue_response([["second next link"], "second page"])
-        monitor.queue_response([["next link"], "first page"])
 
+    def test_run_once(self):
+        pages = {
+            "http://first/": self._mock_feed_page(
+                "first", ["http://second/"]
+            ),
+            "http://second/": self._mock_feed_page(
+                "second", ["http://third-a/", "http://third-b/"]
+            ),
+            "http://third-a/": self._mock_feed_page(
+                "old", ["http://never/"], updated="2018-01-01T00:00:00Z"
+            ),
+            "http://third-b/": self._mock_feed_page(
+                "last", ["http://first/"]
+            ),
+        }
+        monitor = self._mock_crawling_monitor(pages)
+        monitor.run_once(datetime.datetime(2018, 6, 1), None)
+
+        # Feeds are imported in the order they're crawled. The two
+        # pages linked from the second page were downloaded in
+        # parallel, so they may have been handled in either order.
+        eq_(["first", "second"], monitor.imports[:2])
+        eq_(["last"], monitor.imports[2:])
+        eq_(["http://first/", "http://second/"], monitor.fetched[:2])
+        eq_(set(["http://third-a/", "http://third-b/"]),
+            set(monitor.fetched[2:]))
+
+        # The 'old' page had no new data and hadn't been updated since
+        # the last run, so its next link was not followed. The link
+        # from the last page back to the first page was ignored,
+        # since that page had already been seen.
+        eq_(4, len(monitor.fetched))
+
+    def test_run_once_follows_pages_updated_since_last_run(self):
+        # The first page of this feed was imported in a previous run
+        # that crashed while getting the second page, so it contains
+        # nothing new. But it was updated since the last successful
+        # run, so we keep going.
+        pages = {
+            "http://first/": self._mock_feed_page(
+                "old", ["http://second/"], updated="2018-07-01T00:00:00Z"
+            ),
+            "http://second/": self._mock_feed_page("second"),
+        }
+        monitor = self._mock_crawling_monitor(pages)
+        monitor.run_once(datetime.datetime(2018, 6, 1), None)
+        eq_(["second"], monitor.imports)
+
+        # If we've never had a successful run, we keep going no
+        # matter what.
+        monitor = self._mock_crawling_monitor(pages)
         monitor.run_once(None, None)
+        eq_(["second"], monitor.imports)
+
+        # But if the first page hasn't changed since the last
+        # successful run, there's no need to go on.
+        monitor = self._mock_crawling_monitor(pages)
+        monitor.run_once(datetime.datetime(2018, 8, 1), None)
+        eq_([], monitor.imports)
+        eq_(["http://first/"], monitor.fetched)
+
+    def test_run_once_stops_on_error(self):
+        pages = {
+            "http://first/": self._mock_feed_page(
+                "first", ["http://second/"]
+            ),
+            "http://second/": BadResponseException(
+                "http://second/", "Oops"
+            ),
+        }
+        monitor = self._mock_crawling_monitor(pages)
+        assert_raises_regexp(
+            BadResponseException, "Oops", monitor.run_once, None, None
+        )
 
-        # Feeds are imported in reverse order
-        eq_(["last page", "second page", "first page"], monitor.imports)
+        # The first page was imported before the error happened.
+        eq_(["first"], monitor.imports)
 
     def test_update_headers(self):
         """Test the _update_headers helper method."""
@@ -346,3 +346,86 @@ class TestS3Uploader(S3UploaderTest):
         eq_(Representation.PNG_MEDIA_TYPE, args['ContentType'])
         assert 'PNG' in data
         assert 'svg' not in data
+
+    def test_mirror_batch(self):
+        edition, pool = self._edition(with_license_pool=True)
+        epubs = []
+        for i in range(5):
+            link, ignore = pool.add_link(
+                Hyperlink.OPEN_ACCESS_DOWNLOAD, self._url,
+                edition.data_source, Representation.EPUB_MEDIA_TYPE,
+                content="epub %d" % i
+            )
+            epubs.append(link.resource.representation)
+
+        # This one is big enough to be uploaded in parts.
+        big_epub = epubs[0]
+        big_epub.content = "a" * 25
+
+        # Uploading this one will fail with a transient error.
+        transient_epub = epubs[1]
+
+        # Uploading this one will fail with an error worth recording.
+        broken_epub = epubs[2]
+
+        no_content, ignore = self._representation(
+            media_type=Representation.EPUB_MEDIA_TYPE
+        )
+
+        # Getting the content of this one will fail.
+        unreadable, ignore = self._representation(
+            media_type=Representation.EPUB_MEDIA_TYPE
+        )
+        def external_content():
+            raise IOError("disk on fire")
+        unreadable.external_content = external_content
+
+        s3 = self._uploader(MockS3Client)
+        s3.MULTIPART_THRESHOLD = 20
+        s3.MULTIPART_CHUNKSIZE = 10
+        s3.client.fail_for["1.epub"] = BotoCoreError()
+        s3.client.fail_for["2.epub"] = Exception("crash!")
+
+        destinations = dict(
+            (epub, "http://books-go/%d.epub" % i)
+            for i, epub in enumerate(epubs)
+        )
+        destinations[no_content] = "http://books-go/nothing.epub"
+        destinations[unreadable] = "http://books-go/unreadable.epub"
+        s3.mirror_batch(
+            epubs + [no_content, unreadable], mirror_to=destinations.get,
+            concurrency=3
+        )
+
+        # The successful uploads were recorded.
+        for i in (0, 3, 4):
+            epub = epubs[i]
+            eq_("https://s3.amazonaws.com/books-go/%d.epub" % i,
+                epub.mirror_url)
+            assert epub.mirrored_at != None
+            eq_(None, epub.mirror_exception)
+        eq_(set(["0.epub", "3.epub", "4.epub"]),
+            set(x[2] for x in s3.client.uploads))
+
+        # The big one was uploaded in three parts.
+        eq_([("books-go", "0.epub", [10, 10, 5])],
+            s3.client.multipart_uploads)
+        [big_upload] = [x for x in s3.client.uploads if x[2] == "0.epub"]
+        eq_("a" * 25, big_upload[0])
+        eq_(Representation.EPUB_MEDIA_TYPE, big_upload[3]['ContentType'])
+
+        # The transient failure wasn't recorded, so the upload will
+        # be tried again later.
+        eq_(None, transient_epub.mirrored_at)
+        eq_(None, transient_epub.mirror_exception)
+
+        # The other failures were recorded.
+        eq_(None, broken_epub.mirrored_at)
+        assert "crash!" in broken_epub.mirror_exception
+        eq_("Representation has no content to mirror.",
+            no_content.mirror_exception)
+
+        # The content that couldn't be read didn't stop the rest of
+        # the batch.
+        eq_(None, unreadable.mirrored_at)
+        assert "disk on fire" in unreadable.mirror_exception
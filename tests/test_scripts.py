@@ -37,18 +37,24 @@ from model import (
     CustomList,
     DataSource,
     Edition,
+    EquivalencyClosure,
     ExternalIntegration,
     Hyperlink,
     Identifier,
     Library,
     LicensePool,
+    Representation,
     RightsStatus,
+    SessionManager,
     Timestamp, 
     Work,
+    schemaversion,
 )
 from lane import Lane
 from metadata_layer import LinkData
 from oneclick import MockOneClickAPI
+from s3 import MockS3Uploader
+from thumbnailer import Thumbnailer
 
 from scripts import (
     AddClassificationScript,
@@ -66,6 +72,7 @@ from scripts import (
     Explain,
     IdentifierInputScript,
     FixInvisibleWorksScript,
+    ImportTimeScript,
     LaneSweeperScript,
     LibraryInputScript,
     ListCollectionMetadataIdentifiersScript,
@@ -79,13 +86,16 @@ from scripts import (
     RunMonitorScript,
     RunMultipleMonitorsScript,
     RunReaperMonitorsScript,
+    RunShardedSweepMonitorScript,
     RunThreadedCollectionCoverageProviderScript,
+    RebuildEquivalencyClosureScript,
     RunWorkCoverageProviderScript,
     Script,
     ShowCollectionsScript,
     ShowIntegrationsScript,
     ShowLanesScript,
     ShowLibrariesScript,
+    ThumbnailCoversScript,
     WorkClassificationScript,
     WorkProcessingScript,
 )
@@ -98,8 +108,10 @@ from testing import(
 from monitor import (
     Monitor,
     CollectionMonitor,
+    IdentifierSweepMonitor,
     ReaperMonitor,
 )
+from util.http import HTTP
 from util.opds_writer import (
     OPDSFeed,
 )
@@ -123,6 +135,29 @@ class TestScript(DatabaseTest):
 
         assert_raises(ValueError, Script.parse_time, "201601-01")
 
+    def test_load_configuration_configures_http_sessions(self):
+        old_values = (
+            HTTP.POOL_MAXSIZE, HTTP.MAX_RETRIES, HTTP.RETRY_BACKOFF_FACTOR
+        )
+        try:
+            with temp_config() as config:
+                config[Configuration.LOADED_FROM_DATABASE] = True
+                config[Configuration.INTEGRATIONS] = {
+                    Configuration.HTTP_INTEGRATION : {
+                        Configuration.HTTP_POOL_MAXSIZE : 3,
+                        Configuration.HTTP_RETRY_BACKOFF_FACTOR : 2,
+                    }
+                }
+                Script(self._db).load_configuration()
+
+            # The configured settings were applied; the unconfigured
+            # one was left alone.
+            eq_(3, HTTP.POOL_MAXSIZE)
+            eq_(2.0, HTTP.RETRY_BACKOFF_FACTOR)
+            eq_(old_values[1], HTTP.MAX_RETRIES)
+        finally:
+            HTTP.configure_sessions(*old_values)
+
 
 class TestCheckContributorNamesInDB(DatabaseTest):
     def test_process_contribution_local(self):
@@ -557,6 +592,46 @@ class TestRunCoverageProviderScript(DatabaseTest):
         eq_(identifier.type, parsed.identifier_type)
 
 
+class TestRunShardedSweepMonitorScript(DatabaseTest):
+
+    def test_run(self):
+        class Mock(IdentifierSweepMonitor):
+            SERVICE_NAME = "Mock sweep"
+            processed = []
+            def process_item(self, item):
+                self.processed.append(item.id)
+
+        class MockPool(object):
+            def __init__(self):
+                self.jobs = []
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def put(self, job):
+                self.jobs.append(job)
+
+        script = RunShardedSweepMonitorScript(
+            Mock, shard_count=3, _db=self._db, batch_size=7
+        )
+        eq_(3, script.shard_count)
+        pool = MockPool()
+        script.run(pool=pool)
+
+        # One job was queued for each shard.
+        eq_([0, 1, 2], [job.shard for job in pool.jobs])
+        for job in pool.jobs:
+            eq_(Mock, job.monitor_class)
+            eq_(3, job.shard_count)
+            eq_(dict(batch_size=7), job.monitor_kwargs)
+
+        # Running all the jobs sweeps the entire table.
+        identifiers = [self._identifier() for i in range(5)]
+        for job in pool.jobs:
+            job.run(self._db)
+        eq_(sorted([x.id for x in identifiers]), sorted(Mock.processed))
+
+
 class TestRunThreadedCollectionCoverageProviderScript(DatabaseTest):
 
     def test_run(self):
@@ -1180,11 +1255,17 @@ class TestDatabaseMigrationScript(DatabaseMigrationScriptTest):
         eq_(self.timestamp.counter, 3)
 
     def test_all_migration_files_are_run(self):
+        SessionManager.stamp_schema(self._db.connection())
         self.script.run(
             test_db=self._db, test=True,
             cmd_args=["--last-run-date", "2010-01-01"]
         )
 
+        # The schema is no longer assumed to be current, so the next
+        # process to start up will recreate anything the migrations
+        # dropped.
+        eq_([], self._db.execute(schemaversion.select()).fetchall())
+
         # There are two test timestamps in the database, confirming that
         # the test SQL files created by self._create_test_migration_files()
         # have been run.
@@ -2687,6 +2768,116 @@ class TestMirrorResourcesScript(DatabaseTest):
         eq_(thumb_link.resource.url, attempt['link'].href)
 
 
+class TestRebuildEquivalencyClosureScript(DatabaseTest):
+
+    def test_do_run(self):
+        data_source = DataSource.lookup(self._db, DataSource.MANUAL)
+        a = self._identifier()
+        b = self._identifier()
+        c = self._identifier()
+        a.equivalent_to(data_source, b, 1)
+        b.equivalent_to(data_source, c, 1)
+        self._db.flush()
+
+        # Empty out the table, and put in a row for an Identifier
+        # that has no Equivalencies.
+        table = EquivalencyClosure.__table__
+        self._db.execute(table.delete())
+        unrelated = self._identifier()
+        self._db.execute(table.insert(), dict(
+            identifier_id=unrelated.id, equivalent_id=a.id, depth=1,
+            strength=1
+        ))
+
+        RebuildEquivalencyClosureScript(self._db, batch_size=2).do_run()
+        rows = set(
+            (x.identifier_id, x.equivalent_id, x.depth)
+            for x in self._db.execute(table.select())
+        )
+        eq_(set([
+            (a.id, b.id, 1), (a.id, c.id, 2),
+            (b.id, a.id, 1), (b.id, c.id, 1),
+            (c.id, a.id, 2), (c.id, b.id, 1),
+        ]), rows)
+
+
+class TestImportTimeScript(object):
+
+    def test_run(self):
+        output = StringIO()
+        script = ImportTimeScript(output=output)
+        results = script.run(
+            cmd_args=["util.median", "--repetitions", "2"]
+        )
+
+        # The module was imported twice, in separate processes.
+        eq_(["util.median"], results.keys())
+        timings = results["util.median"]
+        eq_(2, len(timings))
+        assert all(x >= 0 for x in timings)
+        assert output.getvalue().startswith("util.median")
+
+    def test_import_failure(self):
+        script = ImportTimeScript(output=StringIO())
+        assert_raises(
+            Exception, script.time_import, "no_such_module"
+        )
+
+
+class TestThumbnailCoversScript(DatabaseTest):
+
+    def test_do_run(self):
+        edition, pool = self._edition(with_license_pool=True)
+        content = open(self.sample_cover_path("test-book-cover.png")).read()
+
+        # This cover needs a thumbnail.
+        big, ignore = pool.add_link(
+            Hyperlink.IMAGE, "http://example.com/big.png",
+            edition.data_source, Representation.PNG_MEDIA_TYPE,
+            content=content
+        )
+        big = big.resource.representation
+
+        # This cover is already small enough.
+        small, ignore = pool.add_link(
+            Hyperlink.IMAGE, "http://example.com/small.png",
+            edition.data_source, Representation.PNG_MEDIA_TYPE,
+            content=content
+        )
+        small = small.resource.representation
+        small.image_width, small.image_height = (100, 150)
+
+        # This representation isn't a cover at all.
+        not_a_cover, ignore = self._representation(
+            media_type=Representation.PNG_MEDIA_TYPE, content=content
+        )
+
+        mirror = MockS3Uploader()
+        script = ThumbnailCoversScript(
+            self._db, mirror=mirror, thumbnailer=Thumbnailer(),
+            batch_size=1
+        )
+        eq_([big], script.needs_thumbnail(Thumbnailer.DEFAULT_SIZES).all())
+        eq_(1, script.do_run())
+
+        # A thumbnail was created and mirrored to the place
+        # Metadata would have put it.
+        [thumbnail] = big.thumbnails
+        eq_([thumbnail], mirror.uploaded)
+        expect = u'https://s3.amazonaws.com/test.cover.bucket/scaled/300/%s/%s/%s/big.png' % (
+            edition.data_source.name, edition.primary_identifier.type,
+            edition.primary_identifier.identifier
+        )
+        eq_(expect.replace(" ", "+"), thumbnail.mirror_url)
+        assert thumbnail.mirrored_at != None
+        eq_((Edition.MAX_THUMBNAIL_WIDTH, Edition.MAX_THUMBNAIL_HEIGHT),
+            (thumbnail.image_width, thumbnail.image_height))
+
+        # Now that the cover has a thumbnail, running the script
+        # again does nothing.
+        eq_(0, script.do_run())
+
+
 class TestWorkConsolidationScript(object):
     """TODO"""
     pass
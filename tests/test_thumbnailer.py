@@ -0,0 +1,124 @@
+import os
+from StringIO import StringIO
+from PIL import Image
+from nose.tools import (
+    assert_raises_regexp,
+    eq_,
+    set_trace,
+)
+from . import DatabaseTest
+from model import Representation
+from thumbnailer import (
+    Thumbnailer,
+    scale_image,
+)
+
+
+class TestScaleImage(object):
+
+    def jpeg(self, width, height):
+        output = StringIO()
+        Image.new('RGB', (width, height), (255, 0, 0)).save(output, 'jpeg')
+        return output.getvalue()
+
+    def test_several_sizes(self):
+        job = (
+            "key", self.jpeg(2000, 3000), Representation.JPEG_MEDIA_TYPE,
+            [(200, 300), (100, 150), (4000, 4000)], "png"
+        )
+        key, size, thumbnails, exception = scale_image(job)
+        eq_("key", key)
+        eq_(None, exception)
+
+        # The size of the original image is reported.
+        eq_((2000, 3000), size)
+
+        # The image was scaled to the two smaller sizes. It's already
+        # smaller than the largest size, so no thumbnail was created
+        # for that one.
+        large, small, none = thumbnails
+        eq_(None, none)
+        for (content, width, height), expect in (
+            (large, (200, 300)), (small, (100, 150))
+        ):
+            eq_(expect, (width, height))
+            image = Image.open(StringIO(content))
+            eq_("PNG", image.format)
+            eq_(expect, image.size)
+
+    def test_small_image(self):
+        path = os.path.join(
+            os.path.split(__file__)[0], "files", "covers",
+            "tiny-image-cover.png"
+        )
+        content = open(path).read()
+        job = (1, content, Representation.PNG_MEDIA_TYPE, [(300, 300)], "png")
+        eq_((1, (200, 200), [None], None), scale_image(job))
+
+    def test_failure(self):
+        job = (1, "not an image", Representation.PNG_MEDIA_TYPE,
+               [(300, 300)], "png")
+        key, size, thumbnails, exception = scale_image(job)
+        eq_(None, size)
+        eq_(None, thumbnails)
+        assert "cannot identify image file" in exception
+
+
+class TestThumbnailer(DatabaseTest):
+
+    def test_constructor(self):
+        assert_raises_regexp(
+            ValueError, "Unsupported destination media type: text/plain",
+            Thumbnailer, media_type="text/plain"
+        )
+        thumbnailer = Thumbnailer()
+        eq_(Thumbnailer.DEFAULT_SIZES, thumbnailer.sizes)
+        eq_("png", thumbnailer.pil_format)
+
+    def test_thumbnail_batch(self):
+        big = self.sample_cover_representation("test-book-cover.png")
+        tiny = self.sample_cover_representation("tiny-image-cover.png")
+        broken, ignore = self._representation(
+            media_type="image/png", content="not an image"
+        )
+
+        # There's already a thumbnail at one of the URLs we'll be
+        # using. It will be reused.
+        existing, ignore = self._representation(
+            "http://thumbnails/%s/450" % big.url, Representation.PNG_MEDIA_TYPE
+        )
+        existing.mirrored_at = existing.scaled_at = None
+
+        def destination_url(representation, size):
+            return "http://thumbnails/%s/%s" % (representation.url, size[1])
+
+        # The tiny image already fits within both sizes.
+        thumbnailer = Thumbnailer(sizes=[(300, 450), (200, 300)])
+        thumbnails = thumbnailer.thumbnail_batch(
+            self._db, [big, tiny, broken], destination_url
+        )
+
+        # Two thumbnails were made of the big image; none of the tiny
+        # image.
+        eq_(set(thumbnails), set(big.thumbnails))
+        eq_([], tiny.thumbnails)
+        large, small = thumbnails
+        eq_(existing, large)
+        eq_((300, 450), (large.image_width, large.image_height))
+        eq_((200, 300), (small.image_width, small.image_height))
+        eq_("http://thumbnails/%s/300" % big.url, small.url)
+        for thumbnail in thumbnails:
+            eq_(Representation.PNG_MEDIA_TYPE, thumbnail.media_type)
+            assert thumbnail.scaled_at != None
+            eq_(None, thumbnail.mirrored_at)
+            eq_(big, thumbnail.thumbnail_of)
+            eq_((thumbnail.image_width, thumbnail.image_height),
+                thumbnail.as_image().size)
+
+        # The sizes of the original images were recorded.
+        eq_((400, 600), (big.image_width, big.image_height))
+        eq_((200, 200), (tiny.image_width, tiny.image_height))
+
+        # The broken image couldn't be scaled.
+        assert "cannot identify image file" in broken.scale_exception
+        assert broken.fetch_exception.startswith("Error found while scaling")
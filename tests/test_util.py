@@ -23,8 +23,10 @@ from util import (
     MetadataSimilarity,
     MoneyUtility,
     TitleProcessor,
+    batched_query,
     fast_query_count,
-    slugify
+    slugify,
+    stream_query,
 )
 from util.median import median
 
@@ -483,6 +485,45 @@ class TestFastQueryCount(DatabaseTest):
         eq_(qu3.count(), fast_query_count(qu3))
 
 
+class TestBatchedQuery(DatabaseTest):
+
+    def test_batches(self):
+        identifiers = sorted(
+            [self._identifier() for x in range(5)], key=lambda x: x.id
+        )
+        qu = self._db.query(Identifier).order_by(Identifier.id.desc())
+        batches = list(batched_query(qu, Identifier.id, 2))
+
+        # The query's own ordering was replaced with an ordering by
+        # the batch column.
+        eq_([identifiers[0:2], identifiers[2:4], identifiers[4:]], batches)
+
+    def test_items_that_stop_matching_are_not_skipped(self):
+        editions = sorted(
+            [self._edition(title="Untitled") for x in range(4)],
+            key=lambda x: x.id
+        )
+        qu = self._db.query(Edition).filter(Edition.title=="Untitled")
+        seen = []
+        for batch in batched_query(qu, Edition.id, 2):
+            for edition in batch:
+                # Once an Edition is processed, it no longer matches
+                # the query. With OFFSET, this would cause the second
+                # batch to skip over two Editions.
+                edition.title = "Titled"
+                seen.append(edition)
+            self._db.flush()
+        eq_(editions, seen)
+
+
+class TestStreamQuery(DatabaseTest):
+
+    def test_stream_query(self):
+        identifiers = set(self._identifier() for x in range(3))
+        qu = self._db.query(Identifier)
+        eq_(identifiers, set(stream_query(qu, 2)))
+
+
 class TestSlugify(object):
 
     def test_slugify(self):
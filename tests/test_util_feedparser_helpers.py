@@ -0,0 +1,39 @@
+# encoding: utf-8
+import time
+
+from nose.tools import (
+    eq_,
+    set_trace,
+)
+
+from util.feedparser_helpers import (
+    parse_date,
+    sanitize_html,
+)
+
+
+class TestFeedparserHelpers(object):
+
+    def test_parse_date(self):
+        parsed = parse_date(u"2015-01-02T16:56:40Z")
+        eq_((2015, 1, 2, 16, 56, 40), tuple(parsed)[:6])
+
+        # Other common date formats are understood, and times are
+        # converted to UTC.
+        eq_(parse_date(u"2015-01-02T16:56:40Z"),
+            parse_date(u"Fri, 02 Jan 2015 11:56:40 -0500"))
+
+        eq_(None, parse_date(u"not a date"))
+
+    def test_sanitize_html(self):
+        value = sanitize_html(
+            u'<p onclick="evil()">Caf\xe9 <script>evil()</script></p>',
+            "text/html"
+        )
+        eq_(u"<p>Caf\xe9 </p>", value)
+
+        value = sanitize_html(
+            u'<b>Bold</b><iframe src="http://example.com/"></iframe>',
+            "application/xhtml+xml"
+        )
+        eq_(u"<b>Bold</b>", value)
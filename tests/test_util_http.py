@@ -219,6 +219,82 @@ class TestHTTP(object):
         eq_(error, m(error, allowed_response_codes=["400"]))
         eq_(error, m(error, allowed_response_codes=['4xx']))
 
+class TestHTTPSessions(object):
+
+    def setup(self):
+        HTTP.reset_sessions()
+
+    def teardown(self):
+        HTTP.configure_sessions(
+            pool_maxsize=10, max_retries=3, backoff_factor=0.5
+        )
+
+    def test_session_for(self):
+        # Each host gets its own session, which is reused for
+        # every request to that host.
+        session = HTTP.session_for("https://example.com/foo")
+        eq_(session, HTTP.session_for("https://example.com/bar?baz"))
+        assert session != HTTP.session_for("http://example.com/foo")
+        assert session != HTTP.session_for("https://example.org/foo")
+
+        # The session is configured to pool connections and retry
+        # idempotent requests.
+        adapter = session.get_adapter("https://example.com/")
+        eq_(HTTP.POOL_MAXSIZE, adapter._pool_maxsize)
+        retries = adapter.max_retries
+        eq_(HTTP.MAX_RETRIES, retries.total)
+        eq_(HTTP.RETRY_BACKOFF_FACTOR, retries.backoff_factor)
+        eq_(True, retries.is_retry("GET", 503))
+        eq_(False, retries.is_retry("POST", 503))
+
+        # Since the session is shared, it doesn't keep cookies.
+        request = requests.Request("GET", "https://example.com/").prepare()
+        cookie = requests.cookies.create_cookie(
+            "session", "secret", domain="example.com"
+        )
+        eq_(False, session.cookies._policy.set_ok(
+            cookie, requests.cookies.MockRequest(request)
+        ))
+
+    def test_configure_sessions(self):
+        old_session = HTTP.session_for("https://example.com/")
+        HTTP.configure_sessions(pool_maxsize=2, max_retries=0)
+
+        # The old session was discarded, and new sessions use the
+        # new configuration.
+        session = HTTP.session_for("https://example.com/")
+        assert session != old_session
+        adapter = session.get_adapter("https://example.com/")
+        eq_(2, adapter._pool_maxsize)
+        eq_(0, adapter.max_retries.total)
+
+    def test_request_with_timeout_uses_session(self):
+        class MockSession(requests.Session):
+            def request(self, method, url, **kwargs):
+                self.last_request = (method, url)
+                if 'fail' in url:
+                    raise requests.exceptions.ConnectionError("Nope")
+                return MockRequestsResponse(200, content="Success!")
+
+        session = MockSession()
+        HTTP.session_for("http://example.com/")
+        HTTP._sessions["http://example.com"] = session
+
+        response = HTTP.get_with_timeout("http://example.com/a")
+        eq_("Success!", response.content)
+        eq_(("GET", "http://example.com/a"), session.last_request)
+        assert_raises_regexp(
+            RequestNetworkException, "Nope",
+            HTTP.post_with_timeout, "http://example.com/fail", "data"
+        )
+
+        # Requests and errors are counted per host.
+        stats = HTTP.connection_stats()["http://example.com"]
+        eq_(2, stats['requests'])
+        eq_(1, stats['errors'])
+        eq_(0, stats['connections'])
+
+
 class TestRemoteIntegrationException(object):
 
     def test_with_service_name(self):
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+from nose.tools import (
+    assert_raises,
+    assert_raises_regexp,
+    eq_,
+    set_trace,
+)
+
+from util.metrics import (
+    Histogram,
+    MetricsRegistry,
+)
+
+
+class TestMetricsRegistry(object):
+
+    def setup(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter("things_total", "Some things.")
+        eq_("simplified_things_total", counter.name)
+        counter.increment()
+        counter.increment(2, kind="red")
+        counter.increment(kind="red")
+        eq_(1, counter.value())
+        eq_(3, counter.value(kind="red"))
+
+        # Asking for the same metric again gets the same object.
+        eq_(counter, self.registry.counter("things_total"))
+
+        # But a name can only be used for one kind of metric.
+        assert_raises_regexp(
+            ValueError, "simplified_things_total is a counter, not a gauge",
+            self.registry.gauge, "things_total"
+        )
+
+        eq_(
+            '# HELP simplified_things_total Some things.\n'
+            '# TYPE simplified_things_total counter\n'
+            'simplified_things_total 1.0\n'
+            'simplified_things_total{kind="red"} 3.0\n',
+            self.registry.prometheus_text()
+        )
+
+    def test_histogram(self):
+        histogram = self.registry.histogram(
+            "size", "How big things are.", buckets=[10, 1]
+        )
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value, kind='a "quoted" kind')
+        eq_((4, 56.5), histogram.value(kind='a "quoted" kind'))
+        eq_((0, 0), histogram.value())
+
+        labels = 'kind="a \\"quoted\\" kind"'
+        eq_(
+            '# HELP simplified_size How big things are.\n'
+            '# TYPE simplified_size histogram\n'
+            'simplified_size_bucket{%(labels)s,le="1.0"} 2.0\n'
+            'simplified_size_bucket{%(labels)s,le="10.0"} 3.0\n'
+            'simplified_size_bucket{%(labels)s,le="+Inf"} 4.0\n'
+            'simplified_size_sum{%(labels)s} 56.5\n'
+            'simplified_size_count{%(labels)s} 4.0\n' % dict(labels=labels),
+            self.registry.prometheus_text()
+        )
+
+    def test_timed(self):
+        @self.registry.timed("an operation")
+        def operation(fail=False):
+            if fail:
+                raise ValueError()
+            return "result"
+
+        eq_("result", operation())
+        assert_raises(ValueError, operation, fail=True)
+        with self.registry.timer("another operation") as timer:
+            pass
+        assert timer.duration >= 0
+
+        histogram = self.registry.histogram(MetricsRegistry.OPERATION_SECONDS)
+        eq_(2, histogram.value(operation="an operation")[0])
+        eq_(1, histogram.value(operation="another operation")[0])
+
+        # Failures are counted separately.
+        errors = self.registry.counter(MetricsRegistry.OPERATION_ERRORS)
+        eq_(1, errors.value(operation="an operation"))
+        eq_(0, errors.value(operation="another operation"))
+
+        self.registry.reset()
+        eq_((0, 0), histogram.value(operation="an operation"))
+
+    def test_collectors(self):
+        def collector(registry):
+            registry.gauge("cache_size", "How big the cache is.").set(
+                10, cache="a cache"
+            )
+        self.registry.add_collector(collector)
+        self.registry.add_collector(collector)
+        eq_([collector], self.registry.collectors)
+
+        # The collector is called when the metrics are exported.
+        assert (
+            'simplified_cache_size{cache="a cache"} 10.0'
+            in self.registry.prometheus_text()
+        )
+
+    def test_dump(self):
+        self.registry.counter("things_total").increment()
+        directory = tempfile.mkdtemp()
+        old_value = os.environ.pop(
+            MetricsRegistry.METRICS_FILE_ENVIRONMENT_VARIABLE, None
+        )
+        try:
+            # By default, nothing is written.
+            eq_(None, self.registry.dump())
+
+            path = os.path.join(directory, "metrics.prom")
+            os.environ[MetricsRegistry.METRICS_FILE_ENVIRONMENT_VARIABLE] = path
+            eq_(path, self.registry.dump())
+            eq_(self.registry.prometheus_text(), open(path).read())
+            eq_(["metrics.prom"], os.listdir(directory))
+        finally:
+            os.environ.pop(
+                MetricsRegistry.METRICS_FILE_ENVIRONMENT_VARIABLE, None
+            )
+            if old_value:
+                os.environ[MetricsRegistry.METRICS_FILE_ENVIRONMENT_VARIABLE] = old_value
+            shutil.rmtree(directory)
@@ -0,0 +1,68 @@
+from nose.tools import (
+    assert_raises_regexp,
+    eq_,
+    set_trace,
+)
+
+from . import DatabaseTest
+from util.query_profiler import (
+    QueryProfile,
+    QueryProfiler,
+)
+
+
+class TestQueryProfiler(DatabaseTest):
+
+    def setup(self):
+        super(TestQueryProfiler, self).setup()
+        self.profiler = QueryProfiler.for_bind(self._db.get_bind())
+
+    def test_for_bind(self):
+        # There's one profiler per engine, whether it's looked up
+        # through the engine or one of its connections.
+        bind = self._db.get_bind()
+        eq_(self.profiler, QueryProfiler.for_bind(bind.engine))
+        eq_(bind.engine, self.profiler.engine)
+
+    def test_profile(self):
+        self._db.execute("select 1")
+        with self.profiler.profile(slowest=2) as outer:
+            self._db.execute("select 2")
+            with self.profiler.profile() as inner:
+                self._db.execute("select 3")
+                self._db.execute("select 4")
+        self._db.execute("select 5")
+
+        # Queries are recorded in every active profile.
+        eq_(3, outer.count)
+        eq_(2, inner.count)
+        assert outer.duration >= inner.duration
+
+        # Only the slowest queries are kept, along with where they
+        # came from.
+        eq_(2, len(outer.slowest))
+        for query in outer.slowest:
+            assert query.statement in ("select 2", "select 3", "select 4")
+            assert "test_util_query_profiler.py" in query.stack[-1]
+            assert "in test_profile" in query.stack[-1]
+            assert not any("sqlalchemy" in frame for frame in query.stack)
+
+        eq_("2", inner.headers["X-SQL-Query-Count"])
+        report = outer.report("a title")
+        assert report.startswith("a title: 3 SQL queries in ")
+        assert "test_util_query_profiler.py" in report
+
+    def test_assert_max_queries(self):
+        with self.assert_max_queries(2) as profile:
+            self._db.execute("select 1")
+            self._db.execute("select 2")
+        eq_(2, profile.count)
+
+        def too_many():
+            with self.assert_max_queries(1):
+                self._db.execute("select 1")
+                self._db.execute("select 2")
+        assert_raises_regexp(
+            AssertionError, "Expected no more than 1 queries, got 2.",
+            too_many
+        )
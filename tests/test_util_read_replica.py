@@ -0,0 +1,128 @@
+import time
+
+from nose.tools import (
+    eq_,
+    set_trace,
+)
+from sqlalchemy import create_engine
+
+from . import DatabaseTest
+from model import Identifier
+from util.read_replica import (
+    ReplicaRoutingSession,
+    read_replica,
+)
+
+
+class TestReplicaRoutingSession(DatabaseTest):
+
+    def setup(self):
+        super(TestReplicaRoutingSession, self).setup()
+
+        # The 'replica' is a separate engine for the test database.
+        # It can't see anything the test hasn't committed, which makes
+        # it easy to tell where a query went.
+        self.replica = create_engine(self.engine.url)
+        self.session = ReplicaRoutingSession(
+            self.connection, replica_bind=self.replica
+        )
+
+    def teardown(self):
+        self.session.close()
+        self.replica.dispose()
+        super(TestReplicaRoutingSession, self).teardown()
+
+    def lookup(self, identifier):
+        return self.session.query(Identifier).filter(
+            Identifier.identifier==identifier
+        ).all()
+
+    def test_queries_in_block_go_to_replica(self):
+        identifier = self._identifier()
+
+        # Ordinarily, queries go to the primary.
+        eq_(1, len(self.lookup(identifier.identifier)))
+
+        # Inside a reading_from_replica() block, they go to the
+        # replica, which hasn't seen the new Identifier.
+        with self.session.reading_from_replica():
+            eq_([], self.lookup(identifier.identifier))
+
+        # read_replica() does the same thing.
+        with read_replica(self.session) as _db:
+            eq_(self.session, _db)
+            eq_([], self.lookup(identifier.identifier))
+
+        eq_(0, self.session.replica_depth)
+
+    def test_writes_go_to_primary(self):
+        with self.session.reading_from_replica():
+            self.session.add(
+                Identifier(type=Identifier.GUTENBERG_ID, identifier=u"1234")
+            )
+
+            # The Identifier was written to the primary when the
+            # session was flushed before the query. Since then, the
+            # session has stuck to the primary, so it can see its own
+            # write.
+            eq_(1, len(self.lookup(u"1234")))
+            eq_(True, self.session.wrote_in_transaction)
+
+            # Once the write is committed, the session remembers where
+            # the primary's write-ahead log was, so it can tell when
+            # the replica has caught up.
+            self.session.commit()
+            eq_(False, self.session.wrote_in_transaction)
+            position = self.session.unreplicated_write
+            assert position is not None
+            eq_(True, self.session.replica_has_replayed(position))
+
+    def test_replica_is_usable(self):
+        session = self.session
+
+        # The test database isn't a standby, so it's never behind.
+        eq_(0, session.current_replication_lag())
+        eq_(True, session.replica_is_usable())
+
+        # A replica that's too far behind isn't used.
+        session.lag_checked_at = time.time()
+        session.replication_lag = session.max_replication_lag + 1
+        eq_(False, session.replica_is_usable())
+
+        # Neither is one whose lag can't be measured.
+        session.replication_lag = None
+        eq_(False, session.replica_is_usable())
+
+        # If the replica hasn't replayed this session's last write,
+        # it isn't used.
+        session.replication_lag = 5
+        session.unreplicated_write = session.current_wal_position()
+        session.replica_has_replayed = lambda position: False
+        eq_(False, session.replica_is_usable())
+
+        # Once it has, it's used, and there's no need to check again.
+        del session.replica_has_replayed
+        eq_(True, session.replica_is_usable())
+        eq_(None, session.unreplicated_write)
+
+        # If there's no way to tell where the last write was, the
+        # replica isn't used.
+        session.unreplicated_write = session.UNKNOWN_POSITION
+        eq_(False, session.replica_is_usable())
+        session.unreplicated_write = None
+
+        # It can never see a write that hasn't been committed.
+        session.wrote_in_transaction = True
+        eq_(False, session.replica_is_usable())
+
+        # A session with no replica never uses it.
+        no_replica = ReplicaRoutingSession(self.connection)
+        eq_(False, no_replica.replica_is_usable())
+        no_replica.close()
+
+    def test_read_replica_without_replica(self):
+        # An ordinary session just runs its queries as usual.
+        identifier = self._identifier()
+        with read_replica(self._db) as _db:
+            eq_(self._db, _db)
+            eq_([identifier], _db.query(Identifier).all())
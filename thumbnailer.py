@@ -0,0 +1,208 @@
+from nose.tools import set_trace
+from cStringIO import StringIO
+import datetime
+import logging
+import traceback
+
+from model import (
+    Edition,
+    Representation,
+)
+
+
+def scale_image(job):
+    """Decode an image once and scale it down to any number of sizes.
+
+    This is run in a worker process, so it can't use the database.
+
+    :param job: A 5-tuple (key, content, media_type, sizes,
+        pil_format). `sizes` is a list of 2-tuples (max_width,
+        max_height).
+
+    :return: A 4-tuple (key, size, thumbnails, exception). `size`
+        is the 2-tuple (width, height) of the original image. For
+        each of `sizes`, `thumbnails` contains either a 3-tuple
+        (content, width, height) or None, if the original image is
+        already small enough. If the image couldn't be scaled,
+        `exception` is a traceback and everything else is None.
+    """
+    # This is only needed in processes that actually scale images.
+    from PIL import Image
+
+    key, content, media_type, sizes, pil_format = job
+    try:
+        if media_type == Representation.SVG_MEDIA_TYPE:
+            import cairosvg
+            content = cairosvg.svg2png(content)
+
+        # Opening an image only reads its header, so this doesn't
+        # decode the bitmap.
+        image = Image.open(StringIO(content))
+        size = width, height = image.size
+
+        needed = [
+            (max_width, max_height) for max_width, max_height in sizes
+            if media_type == Representation.SVG_MEDIA_TYPE
+            or width > max_width or height > max_height
+        ]
+        if needed:
+            # A JPEG can be scaled down by a power of two while it's
+            # being decoded, which is much faster than decoding it at
+            # full size. This never goes below the largest size we
+            # need.
+            image.draft('RGB', (max(x[0] for x in needed),
+                                max(x[1] for x in needed)))
+            image.load()
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+        thumbnails = []
+        for max_size in sizes:
+            if max_size not in needed:
+                thumbnails.append(None)
+                continue
+            thumbnail = image.copy()
+            thumbnail.thumbnail(max_size, Image.ANTIALIAS)
+            output = StringIO()
+            thumbnail.save(output, pil_format)
+            thumbnail_width, thumbnail_height = thumbnail.size
+            thumbnails.append(
+                (output.getvalue(), thumbnail_width, thumbnail_height)
+            )
+        return key, size, thumbnails, None
+    except Exception, e:
+        return key, None, None, traceback.format_exc()
+
+
+class Thumbnailer(object):
+    """Scale cover images to one or more thumbnail sizes, a batch at
+    a time.
+
+    The images are decoded and scaled by scale_image(), which can run
+    in a pool of worker processes. Only the results are written to
+    the database.
+    """
+
+    DEFAULT_SIZES = [
+        (Edition.MAX_THUMBNAIL_WIDTH, Edition.MAX_THUMBNAIL_HEIGHT)
+    ]
+
+    log = logging.getLogger("Thumbnailer")
+
+    def __init__(self, sizes=None,
+                 media_type=Representation.PNG_MEDIA_TYPE, pool=None):
+        """Constructor.
+
+        :param sizes: A list of 2-tuples (max_width, max_height).
+            Every image will be scaled to fit each of these sizes.
+
+        :param media_type: Thumbnails will be created in this format.
+
+        :param pool: A multiprocessing.Pool to run scale_image() in.
+            If this is not provided, images will be scaled in this
+            process.
+        """
+        self.sizes = sizes or self.DEFAULT_SIZES
+        if media_type not in Representation.pil_format_for_media_type:
+            raise ValueError(
+                "Unsupported destination media type: %s" % media_type
+            )
+        self.media_type = media_type
+        self.pil_format = Representation.pil_format_for_media_type[media_type]
+        self.pool = pool
+
+    def thumbnail_batch(self, _db, originals, destination_url):
+        """Scale a batch of images and store the thumbnails.
+
+        :param originals: A list of image Representations.
+
+        :param destination_url: A function that takes a Representation
+            and a 2-tuple (max_width, max_height) and returns the URL
+            the corresponding thumbnail will (eventually) be mirrored to.
+
+        :return: A list of the thumbnail Representations that were
+            created or changed. These will need to be mirrored.
+        """
+        jobs = []
+        for i, original in enumerate(originals):
+            fh = None
+            try:
+                fh = original.content_fh()
+                content = fh.read()
+            except Exception, e:
+                self._record_failure(original, traceback.format_exc())
+                continue
+            finally:
+                if fh:
+                    fh.close()
+            jobs.append(
+                (i, content, original.clean_media_type, self.sizes,
+                 self.pil_format)
+            )
+
+        if self.pool:
+            results = self.pool.map(scale_image, jobs)
+        else:
+            results = map(scale_image, jobs)
+
+        # Look up all of the existing thumbnails at once.
+        destinations = dict()
+        for i, size, thumbnails, exception in results:
+            for max_size, thumbnail in zip(self.sizes, thumbnails or []):
+                if thumbnail:
+                    destinations[(i, max_size)] = destination_url(
+                        originals[i], max_size
+                    )
+        existing = dict()
+        if destinations:
+            qu = _db.query(Representation).filter(
+                Representation.url.in_(set(destinations.values()))
+            ).filter(Representation.media_type==self.media_type)
+            existing = dict((x.url, x) for x in qu)
+
+        now = datetime.datetime.utcnow()
+        changed = []
+        for i, size, thumbnails, exception in results:
+            original = originals[i]
+            if exception:
+                self._record_failure(original, exception)
+                continue
+            original.image_width, original.image_height = size
+            for max_size, thumbnail in zip(self.sizes, thumbnails):
+                if not thumbnail:
+                    # The image is already small enough.
+                    continue
+                content, width, height = thumbnail
+                url = destinations[(i, max_size)]
+                representation = existing.get(url)
+                if not representation:
+                    representation = Representation(
+                        url=url, media_type=self.media_type
+                    )
+                    _db.add(representation)
+                    existing[url] = representation
+                representation.thumbnail_of = original
+                representation.content = content
+                representation.image_width = width
+                representation.image_height = height
+                representation.scale_exception = None
+                representation.scaled_at = now
+
+                # Because the thumbnail has changed, it will need to
+                # be mirrored again.
+                representation.mirrored_at = None
+                representation.mirror_exception = None
+                changed.append(representation)
+        return changed
+
+    def _record_failure(self, original, exception):
+        """Record the fact that an image couldn't be scaled, the same
+        way Representation.scale() does.
+        """
+        self.log.error("Error found while scaling %r: %s", original, exception)
+        original.scale_exception = exception
+        original.scaled_at = None
+        # This most likely indicates an error during the fetch phase.
+        original.fetch_exception = (
+            "Error found while scaling: %s" % exception
+        )
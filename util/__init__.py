@@ -12,6 +12,8 @@ import string
 from sqlalchemy import distinct
 from sqlalchemy.sql.functions import func
 
+from read_replica import read_replica
+
 def batch(iterable, size=1):
     """Split up `iterable` into batches of size `size`."""
 
@@ -34,13 +36,52 @@ def fast_query_count(query):
         # itself by setting it to its default value, False.
         statement._distinct = False
     count_q = statement.with_only_columns(new_columns).order_by(None)
-    count = query.session.execute(count_q).scalar()
+    with read_replica(query.session):
+        count = query.session.execute(count_q).scalar()
 
     if query._limit and query._limit < count:
         return query._limit
 
     return count
 
+def stream_query(query, batch_size=1000):
+    """Iterate over the results of a large query while only holding
+    `batch_size` of them in memory.
+
+    The results come from a server-side cursor, so the session can't
+    be committed until the iteration is finished. Eager loading is
+    turned off, since a server-side cursor can't be used to load
+    collections; relationships are loaded as they're needed instead.
+    If you need to commit as you go, use batched_query().
+    """
+    return query.enable_eagerloads(False).yield_per(batch_size)
+
+def batched_query(query, column, batch_size=1000):
+    """Run a query one batch at a time, in order by `column`.
+
+    Each batch picks up where the last one left off by filtering on
+    `column` rather than by using OFFSET, so every batch takes about
+    the same time to fetch, the session can be committed between
+    batches, and items that stop matching the query while it's being
+    processed don't cause other items to be skipped.
+
+    :param column: A unique column of the entity being queried,
+        usually its primary key.
+
+    :yield: Lists of up to `batch_size` items.
+    """
+    query = query.order_by(None).order_by(column)
+    last_value = None
+    while True:
+        qu = query
+        if last_value is not None:
+            qu = qu.filter(column > last_value)
+        items = qu.limit(batch_size).all()
+        if not items:
+            break
+        yield items
+        last_value = getattr(items[-1], column.key)
+
 def slugify(text, length_limit=None):
     """Takes a string and turns it into a slug.
 
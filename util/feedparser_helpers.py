@@ -0,0 +1,31 @@
+"""Parts of feedparser's behavior that are used without running
+feedparser over a whole feed.
+
+These use functions that aren't part of feedparser's public API, and
+were renamed in feedparser 6. requirements.txt pins feedparser to the
+5.x line; if that changes, this is the only module that needs to.
+"""
+from nose.tools import set_trace
+import feedparser
+
+
+def parse_date(value):
+    """Parse a date the way feedparser parses the dates in a feed.
+
+    :return: A time.struct_time in UTC, or None.
+    """
+    return feedparser._parse_date(value)
+
+
+def sanitize_html(value, media_type):
+    """Sanitize HTML the way feedparser sanitizes the HTML in an Atom
+    text construct.
+
+    :param value: A Unicode string.
+    :param media_type: "text/html" or "application/xhtml+xml".
+    """
+    value = feedparser._sanitizeHTML(value, "utf-8", media_type)
+    if isinstance(value, str):
+        # feedparser decodes this before putting it in a parsed feed.
+        value = value.decode("utf-8")
+    return value
@@ -1,6 +1,11 @@
 import logging
+from collections import Counter
+from cookielib import DefaultCookiePolicy
 from nose.tools import set_trace
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from threading import RLock
 import urlparse
 from flask_babel import lazy_gettext as _
 from problem_detail import (
@@ -168,6 +173,133 @@ class RequestTimedOut(RequestNetworkException, requests.exceptions.Timeout):
 class HTTP(object):
     """A helper for the `requests` module."""
 
+    # Requests to a given host share a requests.Session, so that
+    # connections are kept alive and reused rather than opened anew
+    # for every request. These control each host's connection pool.
+    POOL_MAXSIZE = 10
+    MAX_RETRIES = 3
+    RETRY_BACKOFF_FACTOR = 0.5
+
+    # A request that failed partway through is only retried if it's
+    # safe to send it again.
+    IDEMPOTENT_METHODS = frozenset(
+        ['HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS', 'TRACE']
+    )
+
+    # These status codes mean the server is temporarily unable to
+    # handle an idempotent request, which is worth retrying.
+    RETRY_STATUS_CODES = frozenset([502, 503, 504])
+
+    _sessions = {}
+    _stats = {}
+    _sessions_lock = RLock()
+
+    @classmethod
+    def configure_sessions(cls, pool_maxsize=None, max_retries=None,
+                           backoff_factor=None):
+        """Change how connections are pooled and retried.
+
+        Sessions that already exist are closed, so the new settings
+        apply to every request from now on.
+        """
+        with cls._sessions_lock:
+            if pool_maxsize is not None:
+                cls.POOL_MAXSIZE = pool_maxsize
+            if max_retries is not None:
+                cls.MAX_RETRIES = max_retries
+            if backoff_factor is not None:
+                cls.RETRY_BACKOFF_FACTOR = backoff_factor
+            cls.reset_sessions()
+
+    @classmethod
+    def reset_sessions(cls):
+        """Close every pooled session and forget its statistics."""
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions = {}
+            cls._stats = {}
+
+    @classmethod
+    def host_for(cls, url):
+        """The part of a URL that determines which session to use."""
+        parsed = urlparse.urlparse(url)
+        return "%s://%s" % (parsed.scheme, parsed.netloc)
+
+    @classmethod
+    def session_for(cls, url):
+        """Find or create the pooled requests.Session for the host
+        of the given URL.
+        """
+        host = cls.host_for(url)
+        with cls._sessions_lock:
+            session = cls._sessions.get(host)
+            if not session:
+                session = cls._new_session()
+                cls._sessions[host] = session
+                cls._stats[host] = Counter()
+            return session
+
+    @classmethod
+    def _new_session(cls):
+        retry = Retry(
+            total=cls.MAX_RETRIES,
+            method_whitelist=cls.IDEMPOTENT_METHODS,
+            status_forcelist=cls.RETRY_STATUS_CODES,
+            backoff_factor=cls.RETRY_BACKOFF_FACTOR,
+            # If the retries run out, hand over the last response
+            # rather than raising an exception.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=cls.POOL_MAXSIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # The session is shared by every caller in the process, so it
+        # mustn't remember cookies one caller received and send them
+        # along with another caller's requests. Only the connection
+        # pool is shared. (Cookies set during a redirect are still
+        # sent on the rest of that request's redirects, since requests
+        # keeps those in a separate jar.)
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    @classmethod
+    def _record(cls, url, key):
+        host = cls.host_for(url)
+        with cls._sessions_lock:
+            if host in cls._stats:
+                cls._stats[host][key] += 1
+
+    @classmethod
+    def connection_stats(cls):
+        """Report how each host's connection pool has been used.
+
+        :return: A dictionary mapping each host to a dictionary with
+            the number of requests made, the number that failed with
+            a network error, and the number of connections opened to
+            make them.
+        """
+        stats = {}
+        with cls._sessions_lock:
+            for host, session in cls._sessions.items():
+                adapter = session.get_adapter(host + "/")
+                pools = adapter.poolmanager.pools
+                connections = sum(
+                    pools[key].num_connections for key in pools.keys()
+                )
+                host_stats = cls._stats[host]
+                stats[host] = dict(
+                    requests=host_stats['requests'],
+                    errors=host_stats['errors'],
+                    connections=connections,
+                )
+        return stats
+
     @classmethod
     def get_with_timeout(cls, url, *args, **kwargs):
         """Make a GET request with timeout handling."""
@@ -187,12 +319,18 @@ class HTTP(object):
 
     @classmethod
     def request_with_timeout(cls, http_method, url, *args, **kwargs):
-        """Call requests.request and turn a timeout into a RequestTimedOut
-        exception.
+        """Make a request through the pooled session for the URL's
+        host, and turn a timeout into a RequestTimedOut exception.
         """
-        return cls._request_with_timeout(
-            url, requests.request, http_method, url, *args, **kwargs
-        )
+        session = cls.session_for(url)
+        cls._record(url, 'requests')
+        try:
+            return cls._request_with_timeout(
+                url, session.request, http_method, url, *args, **kwargs
+            )
+        except RequestNetworkException, e:
+            cls._record(url, 'errors')
+            raise
 
     @classmethod
     def _request_with_timeout(cls, url, m, *args, **kwargs):
@@ -0,0 +1,298 @@
+"""Lightweight timers, counters and histograms for finding out where
+time goes, exportable in the Prometheus text format.
+"""
+from nose.tools import set_trace
+import os
+import time
+from functools import wraps
+from threading import Lock
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape(value)) for name, value in items
+    )
+
+
+def _escape(value):
+    if isinstance(value, unicode):
+        value = value.encode("utf8")
+    return str(value).replace('\\', '\\\\').replace(
+        '\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric(object):
+    """A named value, or one value for each combination of labels."""
+
+    TYPE = None
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.lock = Lock()
+        self.values = dict()
+
+    def reset(self):
+        with self.lock:
+            self.values = dict()
+
+    def samples(self):
+        """Yield a 3-tuple (name, labels, value) for every value of
+        this metric. `labels` is a sorted tuple of 2-tuples.
+        """
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, key, value
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP %s %s" % (self.name, _escape(self.description)),
+            "# TYPE %s %s" % (self.name, self.TYPE),
+        ]
+        for name, key, value in self.samples():
+            lines.append(
+                "%s%s %s" % (name, _format_labels(key), _format_value(value))
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    TYPE = 'counter'
+
+    def increment(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+
+class Gauge(Metric):
+    """A value that can go up or down."""
+
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels))
+
+
+class Histogram(Metric):
+    """Count observations, such as how long something took, in
+    buckets.
+    """
+
+    TYPE = 'histogram'
+
+    # Suitable for durations in seconds.
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+    )
+
+    def __init__(self, name, description, buckets=None):
+        super(Histogram, self).__init__(name, description)
+        self.buckets = sorted(buckets or self.DEFAULT_BUCKETS) + [float('inf')]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            data = self.values.get(key)
+            if not data:
+                data = self.values[key] = dict(
+                    counts=[0] * len(self.buckets), sum=0, count=0
+                )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data['counts'][i] += 1
+                    break
+            data['sum'] += value
+            data['count'] += 1
+
+    def value(self, **labels):
+        """Return a 2-tuple (count, sum) for the given labels."""
+        data = self.values.get(_label_key(labels))
+        if not data:
+            return 0, 0
+        return data['count'], data['sum']
+
+    def samples(self):
+        with self.lock:
+            values = sorted(
+                (key, dict(counts=list(data['counts']), sum=data['sum'],
+                           count=data['count']))
+                for key, data in self.values.items()
+            )
+        for key, data in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data['counts']):
+                cumulative += count
+                le = ('le', _format_value(bound))
+                yield self.name + '_bucket', key + (le,), cumulative
+            yield self.name + '_sum', key, data['sum']
+            yield self.name + '_count', key, data['count']
+
+
+class MetricsRegistry(object):
+    """Keep track of every metric in this process."""
+
+    # Every metric name starts with this.
+    PREFIX = 'simplified_'
+
+    # The duration of every timed operation goes into this histogram,
+    # labeled with the name of the operation.
+    OPERATION_SECONDS = 'operation_seconds'
+    OPERATION_ERRORS = 'operation_errors_total'
+
+    # If this environment variable is set, scripts write their
+    # metrics to the named file when they finish.
+    METRICS_FILE_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_METRICS_FILE'
+
+    PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.lock = Lock()
+        self.metrics = dict()
+        self.collectors = []
+
+    def _metric(self, cls, name, description, **kwargs):
+        name = self.PREFIX + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if not metric:
+                metric = cls(name, description, **kwargs)
+                self.metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(
+                "%s is a %s, not a %s" % (name, metric.TYPE, cls.TYPE)
+            )
+        return metric
+
+    def counter(self, name, description=''):
+        return self._metric(Counter, name, description)
+
+    def gauge(self, name, description=''):
+        return self._metric(Gauge, name, description)
+
+    def histogram(self, name, description='', buckets=None):
+        return self._metric(Histogram, name, description, buckets=buckets)
+
+    def add_collector(self, collector):
+        """Register a function that will be called to update some
+        metrics just before they're exported.
+
+        This is for numbers that are kept track of somewhere else,
+        like cache sizes.
+
+        :param collector: A function that takes this registry as its
+            only argument.
+        """
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def observe_operation(self, operation, duration, failed=False):
+        self.histogram(
+            self.OPERATION_SECONDS, "How long an operation took."
+        ).observe(duration, operation=operation)
+        if failed:
+            self.counter(
+                self.OPERATION_ERRORS, "How often an operation failed."
+            ).increment(operation=operation)
+
+    def timer(self, operation):
+        """A context manager that records how long a block of code
+        takes to run.
+        """
+        return Timer(self, operation)
+
+    def timed(self, operation):
+        """A decorator that records how long a function takes to
+        run.
+        """
+        def decorator(f):
+            @wraps(f)
+            def timed_function(*args, **kwargs):
+                with Timer(self, operation):
+                    return f(*args, **kwargs)
+            return timed_function
+        return decorator
+
+    def reset(self):
+        """Zero out every metric."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def prometheus_text(self):
+        """Export every metric in the Prometheus text format."""
+        for collector in self.collectors:
+            collector(self)
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        return "".join(
+            metric.prometheus_text() + "\n" for name, metric in metrics
+        )
+
+    def dump(self, path=None):
+        """Write every metric, in the Prometheus text format, to a file.
+
+        :param path: Write to this file. By default, the file named in
+            METRICS_FILE_ENVIRONMENT_VARIABLE is used, and if that's
+            not set nothing happens.
+
+        :return: The path written to, if any.
+        """
+        path = path or os.environ.get(self.METRICS_FILE_ENVIRONMENT_VARIABLE)
+        if not path:
+            return None
+        # Write the file atomically so a collector never sees half of
+        # it.
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary, 'w') as fh:
+            fh.write(self.prometheus_text())
+        os.rename(temporary, path)
+        return path
+
+
+class Timer(object):
+    """Time a block of code and record it in a MetricsRegistry."""
+
+    def __init__(self, registry, operation):
+        self.registry = registry
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.duration = time.time() - self.start
+        self.registry.observe_operation(
+            self.operation, self.duration, failed=type is not None
+        )
+
+
+# The registry for this process.
+registry = MetricsRegistry()
+timer = registry.timer
+timed = registry.timed
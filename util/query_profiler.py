@@ -0,0 +1,185 @@
+"""Count and time the SQL queries run by a block of code, such as the
+handling of a single web request.
+"""
+from nose.tools import set_trace
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class SlowQuery(object):
+    """A query that was one of the slowest in a QueryProfile."""
+
+    def __init__(self, duration, statement, stack):
+        self.duration = duration
+        self.statement = statement
+        self.stack = stack
+
+    def __repr__(self):
+        return "<SlowQuery %.1fms %s>" % (
+            self.duration * 1000, self.statement[:60]
+        )
+
+
+class QueryProfile(object):
+    """The number of queries run, how long they took, and which ones
+    were the slowest.
+    """
+
+    # Keep track of this many of the slowest queries.
+    SLOWEST = 5
+
+    # Keep this many frames of the stack that led up to a slow query.
+    STACK_DEPTH = 8
+
+    # Frames from files in these directories don't say anything about
+    # where the query came from.
+    IGNORED_PATHS = [
+        os.sep + 'sqlalchemy' + os.sep,
+        os.path.splitext(__file__)[0],
+    ]
+
+    def __init__(self, slowest=None):
+        self.max_slowest = slowest or self.SLOWEST
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if (len(self.slowest) < self.max_slowest
+            or duration > self.slowest[-1].duration):
+            # Getting the stack is relatively expensive, so it's only
+            # done for queries that make the list.
+            self.slowest.append(
+                SlowQuery(duration, statement, self.call_site())
+            )
+            self.slowest.sort(key=lambda x: -x.duration)
+            del self.slowest[self.max_slowest:]
+
+    @classmethod
+    def call_site(cls):
+        """Describe the code that caused the current query to be run.
+
+        :return: A list of strings, innermost frame last.
+        """
+        frames = [
+            frame for frame in traceback.extract_stack()
+            if not any(path in frame[0] for path in cls.IGNORED_PATHS)
+        ]
+        return [
+            "%s:%s in %s" % (filename, line, function)
+            for filename, line, function, text in frames[-cls.STACK_DEPTH:]
+        ]
+
+    @property
+    def headers(self):
+        """Summarize the profile as HTTP response headers."""
+        return {
+            "X-SQL-Query-Count": str(self.count),
+            "X-SQL-Query-Time": "%.1f" % (self.duration * 1000),
+        }
+
+    def report(self, title=None):
+        """Summarize the profile, including the slowest queries and
+        where they came from, as a string suitable for a log message.
+        """
+        lines = [
+            "%s%d SQL queries in %.1fms" % (
+                (title + ": ") if title else "", self.count,
+                self.duration * 1000
+            )
+        ]
+        for query in self.slowest:
+            lines.append(
+                "  %.1fms: %s" % (query.duration * 1000,
+                                  " ".join(query.statement.split()))
+            )
+            for frame in query.stack:
+                lines.append("    " + frame)
+        return "\n".join(lines)
+
+
+class QueryProfiler(object):
+    """Listen to the SQL statements run by a database engine, and
+    record them in whichever QueryProfiles are active in the thread
+    that ran them.
+
+    When no profile is active, this costs very little per query.
+    """
+
+    START_TIMES_KEY = 'query_profiler_start_times'
+
+    _profilers = dict()
+    _profilers_lock = threading.Lock()
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.local = threading.local()
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+
+    @classmethod
+    def for_bind(cls, bind):
+        """Find or create the QueryProfiler for a database Engine.
+
+        :param bind: An Engine, or a Connection to one.
+        """
+        engine = getattr(bind, 'engine', bind)
+        with cls._profilers_lock:
+            profiler = cls._profilers.get(engine)
+            if not profiler:
+                profiler = cls(engine)
+                cls._profilers[engine] = profiler
+        return profiler
+
+    @property
+    def active_profiles(self):
+        if not hasattr(self.local, 'profiles'):
+            self.local.profiles = []
+        return self.local.profiles
+
+    def start(self, profile=None):
+        """Start recording queries run in this thread.
+
+        :return: A QueryProfile.
+        """
+        profile = profile or QueryProfile()
+        self.active_profiles.append(profile)
+        return profile
+
+    def stop(self, profile):
+        """Stop recording queries in `profile`."""
+        if profile in self.active_profiles:
+            self.active_profiles.remove(profile)
+        return profile
+
+    @contextmanager
+    def profile(self, **kwargs):
+        """Record the queries run inside a `with` block."""
+        profile = self.start(QueryProfile(**kwargs))
+        try:
+            yield profile
+        finally:
+            self.stop(profile)
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        if not getattr(self.local, 'profiles', None):
+            return
+        conn.info.setdefault(self.START_TIMES_KEY, []).append(time.time())
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        start_times = conn.info.get(self.START_TIMES_KEY)
+        if not start_times:
+            # Profiling started while this query was running.
+            return
+        duration = time.time() - start_times.pop()
+        for profile in getattr(self.local, 'profiles', []):
+            profile.record(statement, duration)
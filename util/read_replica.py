@@ -0,0 +1,250 @@
+"""Send some read-only queries to a read replica of the database,
+rather than to the primary.
+"""
+from nose.tools import set_trace
+import logging
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import (
+    event,
+    text,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.session import Session
+
+
+class ReplicaRoutingSession(Session):
+    """A database session that sends the queries run inside a
+    `reading_from_replica()` block to a read replica. Everything else,
+    including every write, goes to the primary database.
+
+    Queries only go to the replica when it's safe:
+
+    * The replica must not be too far behind the primary, so changes
+      made by other sessions are at most MAX_REPLICATION_LAG seconds
+      out of date.
+    * Once this session has committed a write, its queries go to the
+      primary until the replica has replayed the primary's
+      write-ahead log up to the point where the write was committed,
+      so the session always sees its own changes.
+
+    Only use this for queries that can tolerate that: anything that
+    has to see another session's latest changes should stay on the
+    primary.
+    """
+
+    # If the replica is further behind the primary than this many
+    # seconds, queries go to the primary instead.
+    MAX_REPLICATION_LAG = 30
+
+    # Measure how far behind the replica is at most this often.
+    LAG_CHECK_INTERVAL = 10
+
+    # On a standby server this is how many seconds behind the primary
+    # it is, or NULL if it hasn't replayed anything yet. A server that
+    # isn't a standby, such as a second database used for testing,
+    # is never behind.
+    REPLICATION_LAG_SQL = (
+        "select case when pg_is_in_recovery() "
+        "then extract(epoch from now() - pg_last_xact_replay_timestamp()) "
+        "else 0 end"
+    )
+
+    # Where the primary is in its write-ahead log, and whether a
+    # standby has replayed its log up to a given point. A server that
+    # isn't a standby is always up to date. Postgres 10 renamed these
+    # functions.
+    WAL_POSITION_SQL = "select %(current)s()"
+    WAL_REPLAYED_SQL = (
+        "select case when pg_is_in_recovery() "
+        "then %(diff)s(%(replayed)s(), :position) >= 0 "
+        "else true end"
+    )
+    WAL_FUNCTIONS = dict(
+        current="pg_current_wal_lsn", replayed="pg_last_wal_replay_lsn",
+        diff="pg_wal_lsn_diff",
+    )
+    XLOG_FUNCTIONS = dict(
+        current="pg_current_xlog_location",
+        replayed="pg_last_xlog_replay_location",
+        diff="pg_xlog_location_diff",
+    )
+
+    UNKNOWN_POSITION = object()
+
+    log = logging.getLogger("Read replica")
+
+    def __init__(self, bind=None, replica_bind=None,
+                 max_replication_lag=None, **kwargs):
+        """Constructor.
+
+        :param bind: An Engine or Connection for the primary database.
+        :param replica_bind: An Engine or Connection for the replica.
+        :param max_replication_lag: Override MAX_REPLICATION_LAG.
+        """
+        super(ReplicaRoutingSession, self).__init__(bind=bind, **kwargs)
+        self.replica_bind = replica_bind
+        if max_replication_lag is None:
+            max_replication_lag = self.MAX_REPLICATION_LAG
+        self.max_replication_lag = max_replication_lag
+        self.replica_depth = 0
+
+        # Keep track of writes the replica may not have seen yet.
+        # `unreplicated_write` is the primary's write-ahead log
+        # position after the last commit that included a write, or
+        # UNKNOWN_POSITION if that couldn't be found out.
+        self.wrote_in_transaction = False
+        self.unreplicated_write = None
+
+        self.replication_lag = None
+        self.lag_checked_at = None
+
+    @contextmanager
+    def reading_from_replica(self):
+        """Send the queries run inside a `with` block to the replica,
+        if it's safe.
+        """
+        self.replica_depth += 1
+        try:
+            yield self
+        finally:
+            self.replica_depth -= 1
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.replica_depth and self.replica_is_usable():
+            return self.replica_bind
+        return super(ReplicaRoutingSession, self).get_bind(
+            mapper=mapper, clause=clause
+        )
+
+    def replica_is_usable(self):
+        """Is it safe to send a query to the replica right now?"""
+        if self.replica_bind is None or self._flushing:
+            return False
+        if self.wrote_in_transaction:
+            # The replica can't see changes that haven't been
+            # committed.
+            return False
+        lag = self.current_replication_lag()
+        if lag is None or lag > self.max_replication_lag:
+            return False
+        if self.unreplicated_write is not None:
+            if not self.replica_has_replayed(self.unreplicated_write):
+                # The replica hasn't caught up with our last write yet.
+                return False
+            self.unreplicated_write = None
+        return True
+
+    def _wal_sql(self, sql):
+        # A standby runs the same major version of Postgres as its
+        # primary.
+        primary = super(ReplicaRoutingSession, self).get_bind()
+        version = primary.dialect.server_version_info
+        if version and version < (10,):
+            functions = self.XLOG_FUNCTIONS
+        else:
+            functions = self.WAL_FUNCTIONS
+        return sql % functions
+
+    def current_wal_position(self):
+        """Find the primary's current position in its write-ahead log.
+
+        :return: A log position, or UNKNOWN_POSITION.
+        """
+        primary = super(ReplicaRoutingSession, self).get_bind()
+        if isinstance(primary, Engine):
+            connection = primary.connect()
+        else:
+            connection = primary
+        try:
+            # This runs once the session's transaction is over, so it
+            # needs a transaction of its own.
+            with connection.begin():
+                return connection.execute(
+                    self._wal_sql(self.WAL_POSITION_SQL)
+                ).scalar()
+        except DBAPIError, e:
+            self.log.error(
+                "Could not find the primary's log position: %s", e
+            )
+            return self.UNKNOWN_POSITION
+        finally:
+            if connection is not primary:
+                connection.close()
+
+    def replica_has_replayed(self, position):
+        """Has the replica replayed the primary's write-ahead log up to
+        `position`?
+        """
+        if position is self.UNKNOWN_POSITION:
+            # There's no way to tell, so assume it hasn't.
+            return False
+        try:
+            return bool(self.replica_bind.execute(
+                text(self._wal_sql(self.WAL_REPLAYED_SQL)),
+                position=position
+            ).scalar())
+        except DBAPIError, e:
+            self.log.error(
+                "Could not check the replica, using the primary: %s", e
+            )
+            return False
+
+    def current_replication_lag(self):
+        """How many seconds behind the primary is the replica?
+
+        :return: A number of seconds, or None if it's not known.
+        """
+        now = time.time()
+        if (self.lag_checked_at is None
+            or now - self.lag_checked_at > self.LAG_CHECK_INTERVAL):
+            self.lag_checked_at = now
+            try:
+                self.replication_lag = self.replica_bind.execute(
+                    self.REPLICATION_LAG_SQL
+                ).scalar()
+            except DBAPIError, e:
+                self.log.error(
+                    "Could not check the replica, using the primary: %s", e
+                )
+                self.replication_lag = None
+        return self.replication_lag
+
+
+def _outermost_transaction(session):
+    transaction = session.transaction
+    return transaction is None or not transaction.nested
+
+@event.listens_for(ReplicaRoutingSession, 'after_flush')
+def _record_write(session, flush_context):
+    session.wrote_in_transaction = True
+
+@event.listens_for(ReplicaRoutingSession, 'after_commit')
+def _record_commit(session):
+    if session.wrote_in_transaction and _outermost_transaction(session):
+        session.wrote_in_transaction = False
+        session.unreplicated_write = session.current_wal_position()
+
+@event.listens_for(ReplicaRoutingSession, 'after_rollback')
+def _record_rollback(session):
+    if _outermost_transaction(session):
+        session.wrote_in_transaction = False
+
+
+@contextmanager
+def read_replica(_db):
+    """Send the queries run inside a `with` block to `_db`'s read
+    replica, if it has one and it's safe to do so. Otherwise, this
+    does nothing.
+    """
+    session = _db
+    if hasattr(session, 'registry'):
+        # This is a scoped session.
+        session = session.registry()
+    if isinstance(session, ReplicaRoutingSession):
+        with session.reading_from_replica():
+            yield _db
+    else:
+        yield _db
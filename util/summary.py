@@ -1,6 +1,4 @@
 import logging
-from textblob import TextBlob
-from textblob.exceptions import MissingCorpusError
 from collections import Counter
 from nose.tools import set_trace
 from . import (
@@ -73,6 +71,10 @@ class SummaryEvaluator(object):
             self.bad_phrases = bad_phrases
 
     def add(self, summary, parser=None):
+        # TextBlob takes a long time to import, and most processes
+        # never evaluate a summary.
+        from textblob import TextBlob
+        from textblob.exceptions import MissingCorpusError
         parser_class = parser or TextBlob
         if isinstance(summary, str):
             summary = summary.decode("utf8")